@@ -0,0 +1,17 @@
+"""
+ASGI entry point, for running under uvicorn workers:
+
+    gunicorn agroconnect.asgi -k uvicorn_worker.UvicornWorker
+
+The polled and read-heavy endpoints are async views, so a worker keeps
+serving other connections while they wait on the database or cache.
+"""
+import os
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'agroconnect.settings')
+# Sync code runs in per-request threads under ASGI, and persistent
+# connections held by those threads are never closed; open one per request.
+os.environ.setdefault('DB_CONN_MAX_AGE', '0')
+
+application = get_asgi_application()
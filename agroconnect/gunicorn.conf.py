@@ -0,0 +1,49 @@
+"""
+Gunicorn settings for production (`gunicorn agroconnect.wsgi -c agroconnect/gunicorn.conf.py`).
+
+The app is imported once in the master and the caches are warmed there
+(core/warmup.py) before workers are forked. Threaded workers are recycled
+after a jittered number of requests so they restart at different times.
+Every value can be overridden with an environment variable or on the command line.
+Module-level names are read as settings, hence ``decouple.config`` rather
+than importing ``config``, which is a gunicorn setting.
+"""
+import multiprocessing
+import os
+import decouple
+
+bind = f"0.0.0.0:{decouple.config('PORT', default='8000')}"
+
+preload_app = decouple.config('GUNICORN_PRELOAD', default=True, cast=bool)
+worker_class = 'gthread'
+# One worker per core keeps the GIL from being shared; threads cover requests waiting on I/O
+workers = decouple.config('WEB_CONCURRENCY', default=max(2, multiprocessing.cpu_count()), cast=int)
+threads = decouple.config('GUNICORN_THREADS', default=4, cast=int)
+
+# Restart each worker after max_requests plus up to max_requests_jitter requests
+max_requests = decouple.config('GUNICORN_MAX_REQUESTS', default=1000, cast=int)
+max_requests_jitter = decouple.config('GUNICORN_MAX_REQUESTS_JITTER', default=200, cast=int)
+
+timeout = decouple.config('GUNICORN_TIMEOUT', default=30, cast=int)  # a silent worker is killed after this
+graceful_timeout = decouple.config('GUNICORN_GRACEFUL_TIMEOUT', default=30, cast=int)  # to finish requests on restart
+keepalive = 5
+
+# Worker heartbeats go to a tmpfs where there is one, so a slow disk cannot get workers killed
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+accesslog = '-'
+errorlog = '-'
+
+
+def when_ready(server):
+    # Runs in the master once the preloaded app is imported, before any worker is forked
+    if server.cfg.preload_app:
+        from core.warmup import warm_caches
+        warm_caches()
+
+
+def post_worker_init(worker):
+    if not worker.cfg.preload_app:
+        from core.warmup import warm_caches
+        warm_caches()
@@ -1,5 +1,13 @@
+from django import forms
 from django.contrib import admin
-from .models import UserProfile, FarmerProfile, CompanyProfile, WasteProduct, Order, PriceBargain
+from django.core.exceptions import ValidationError
+from . import shards
+from .concurrency import VersionConflict, expect_version
+from .pricing import UNPRICED
+from .models import (
+    UserProfile, FarmerProfile, CompanyProfile, WasteProduct, Order, PriceBargain, NotificationEvent, Notification, Job,
+    ArchivedWasteProduct, ArchivedOrder, ArchivedBargain, ChangeLogEntry
+)
 
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
@@ -9,7 +17,8 @@ class UserProfileAdmin(admin.ModelAdmin):
 
 @admin.register(FarmerProfile)
 class FarmerProfileAdmin(admin.ModelAdmin):
-    list_display = ['user_profile', 'farm_size']
+    list_display = ['user_profile', 'farm_size', 'region']
+    list_filter = ['region']
     search_fields = ['user_profile__user__username']
 
 @admin.register(CompanyProfile)
@@ -17,22 +26,168 @@ class CompanyProfileAdmin(admin.ModelAdmin):
     list_display = ['company_name', 'registration_number', 'user_profile']
     search_fields = ['company_name', 'registration_number']
 
+class ShardListFilter(admin.SimpleListFilter):
+    """Which shard's rows the change list shows (core.shards); default until another is picked."""
+    title = 'shard'
+    parameter_name = 'shard'
+
+    def lookups(self, request, model_admin):
+        return [(alias, alias) for alias in shards.aliases()]
+
+    def value(self):
+        value = super().value()
+        return value if value in shards.aliases() else None
+
+    def choices(self, changelist):
+        # No "All" entry: a change list pages through one database
+        for lookup, title in self.lookup_choices:
+            yield {
+                'selected': (self.value() or 'default') == lookup,
+                'query_string': changelist.get_query_string({self.parameter_name: lookup}),
+                'display': title,
+            }
+
+    def queryset(self, request, queryset):
+        return queryset.using(self.value() or 'default')
+
+
+class ShardedAdmin(admin.ModelAdmin):
+    """Admin for sharded models: lists one shard at a time and opens rows from any shard."""
+
+    def get_list_filter(self, request):
+        list_filter = super().get_list_filter(request)
+        return [ShardListFilter, *list_filter] if shards.enabled() else list_filter
+
+    def get_object(self, request, object_id, from_field=None):
+        queryset = self.get_queryset(request)
+        model = queryset.model
+        field = model._meta.pk if from_field is None else model._meta.get_field(from_field)
+        try:
+            object_id = field.to_python(object_id)
+        except (ValidationError, ValueError):
+            return None
+        obj = shards.find(queryset.filter(**{field.name: object_id}))
+        if obj is not None:
+            # Related listings offered on the form come from the same shard
+            request.shard_alias = obj._state.db
+        return obj
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.related_model._meta.label_lower in shards.SHARDED:
+            kwargs.setdefault('using', getattr(request, 'shard_alias', None))
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+
+class VersionedAdminForm(forms.ModelForm):
+    """Carries the row version the admin loaded, so a stale edit is refused instead of overwriting."""
+    # Not named ``version``: the admin refuses form fields named after non-editable model fields
+    loaded_version = forms.IntegerField(widget=forms.HiddenInput, required=False)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk:
+            self.fields['loaded_version'].initial = self.instance.version
+
+    def clean(self):
+        cleaned_data = super().clean()
+        seen = cleaned_data.get('loaded_version')
+        if self.instance.pk and seen is not None and seen != self.instance.version:
+            raise ValidationError(
+                'Someone else changed this record while you were editing it. '
+                'Reload the page to see their changes, then make yours again.'
+            )
+        return cleaned_data
+
+
+class VersionedAdmin(ShardedAdmin):
+    """Saves edits with a version check, writing only the fields the admin changed."""
+    form = VersionedAdminForm
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            return super().save_model(request, obj, form, change)
+        expect_version(obj, form.cleaned_data.get('loaded_version'))
+        obj.save(update_fields=[name for name in form.changed_data if name != 'loaded_version'])
+
 @admin.register(WasteProduct)
-class WasteProductAdmin(admin.ModelAdmin):
-    list_display = ['crop_name', 'quantity', 'admin_price_per_ton', 'farmer', 'status', 'created_at']
+class WasteProductAdmin(VersionedAdmin):
+    list_display = ['crop_name', 'quantity', 'admin_price_per_ton', 'suggested_price_per_ton', 'farmer', 'status', 'created_at']
     list_filter = ['crop_name', 'status', 'created_at']
     search_fields = ['farmer__user_profile__user__username']
-    fields = ['farmer', 'crop_name', 'quantity', 'admin_price_per_ton', 'location', 'description', 'photo', 'status']
+    fields = ['farmer', 'crop_name', 'quantity', 'admin_price_per_ton', 'suggested_price_per_ton', 'location', 'description', 'photo', 'status', 'loaded_version']
+    readonly_fields = ['suggested_price_per_ton']
+    actions = ['apply_suggested_prices']
+
+    @admin.action(description='Set the admin price of selected unpriced listings to the suggestion')
+    def apply_suggested_prices(self, request, queryset):
+        updated = 0
+        for listing in queryset.filter(admin_price_per_ton__lte=UNPRICED, suggested_price_per_ton__isnull=False):
+            listing.admin_price_per_ton = listing.suggested_price_per_ton
+            try:
+                listing.save(update_fields=['admin_price_per_ton'])
+            except VersionConflict:
+                continue
+            updated += 1
+        self.message_user(request, f'Priced {updated} listings from their suggestion.')
     
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(VersionedAdmin):
     list_display = ['id', 'company', 'waste_product', 'quantity_ordered', 'company_price_per_ton', 'total_price', 'status', 'created_at']
     list_filter = ['status', 'created_at']
     search_fields = ['company__company_name']
     readonly_fields = ['total_price']
 
 @admin.register(PriceBargain)
-class PriceBargainAdmin(admin.ModelAdmin):
+class PriceBargainAdmin(VersionedAdmin):
     list_display = ['waste_product', 'farmer_proposed_price', 'status', 'created_at']
     list_filter = ['status', 'created_at']
-    search_fields = ['waste_product__crop_name']
\ No newline at end of file
+    search_fields = ['waste_product__crop_name']
+
+class ArchivedAdmin(ShardedAdmin):
+    """Archived rows (core.archive) are history: viewable, never edited."""
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(ArchivedWasteProduct)
+class ArchivedWasteProductAdmin(ArchivedAdmin):
+    list_display = ['id', 'crop_name', 'quantity', 'admin_price_per_ton', 'farmer', 'status', 'created_at', 'archived_at']
+    list_filter = ['crop_name', 'created_at']
+    search_fields = ['farmer__user_profile__user__username']
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(ArchivedAdmin):
+    list_display = ['id', 'company', 'crop_name', 'quantity_ordered', 'total_price', 'status', 'created_at', 'archived_at']
+    list_filter = ['status', 'crop_name', 'created_at']
+    search_fields = ['company__company_name']
+
+@admin.register(ArchivedBargain)
+class ArchivedBargainAdmin(ArchivedAdmin):
+    list_display = ['id', 'waste_product_id', 'crop_name', 'farmer_proposed_price', 'status', 'created_at', 'archived_at']
+    list_filter = ['status', 'crop_name']
+
+@admin.register(NotificationEvent)
+class NotificationEventAdmin(admin.ModelAdmin):
+    list_display = ['id', 'event_type', 'subject', 'created_at', 'dispatched_at', 'emailed_at', 'email_attempts']
+    list_filter = ['event_type', 'dispatched_at', 'emailed_at']
+
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = ['recipient', 'subject', 'is_read', 'created_at']
+    list_filter = ['is_read', 'created_at']
+    search_fields = ['recipient__username', 'subject']
+
+@admin.register(ChangeLogEntry)
+class ChangeLogEntryAdmin(admin.ModelAdmin):
+    list_display = ['id', 'resource', 'object_id', 'action', 'version', 'created_at']
+    list_filter = ['resource', 'action']
+    search_fields = ['=object_id']
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'task', 'queue', 'status', 'attempts', 'run_at', 'finished_at']
+    list_filter = ['status', 'queue', 'task']
+    search_fields = ['task', 'idempotency_key']
+    readonly_fields = ['created_at', 'locked_at', 'locked_by', 'last_error']
@@ -0,0 +1,253 @@
+"""
+Daily fact tables for the admin analytics page.
+
+``refresh_facts`` rolls orders, listings and bargains up into one row per
+(created date, crop, status) in OrderFact, ListingFact and BargainFact. The
+analytics view only reads these tables, so its cost depends on the number of
+days shown rather than on how many orders exist.
+
+Loads are incremental. A FactWatermark per table remembers when it was last
+loaded; the next run finds the source rows updated since then through the
+``updated_at`` index and rebuilds only the days those rows were created on.
+Deleted rows leave no trace in ``updated_at``, so run with ``full=True``
+(``build_facts --full``) now and then, e.g. weekly, to rebuild everything.
+Every day is aggregated over the hot table and its archive (core.archive)
+together, so moving rows to the archive leaves the facts unchanged, and over
+every shard (core.shards), whose per-day totals add up.
+"""
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, time, timedelta
+from itertools import chain
+from django.db import transaction
+from django.db.models import Case, Count, ExpressionWrapper, F, FloatField, Q, Sum, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from . import shards
+from .counters import SOLD_ORDER_STATUSES
+from .models import (
+    WasteProduct, Order, PriceBargain, ArchivedWasteProduct, ArchivedOrder, ArchivedBargain,
+    OrderFact, ListingFact, BargainFact, FactWatermark
+)
+
+# Rows committed shortly before a load started may carry an older updated_at
+# than the watermark; re-read this much history on every incremental run.
+WATERMARK_OVERLAP = timedelta(minutes=10)
+
+FUNNEL_STAGES = [
+    ('placed', 'Placed', None),
+    ('reviewed', 'Sent to farmer', ('sent_to_farmer', 'accepted_by_farmer', 'rejected_by_farmer',
+                                    'approved_by_admin', 'completed')),
+    ('accepted', 'Accepted by farmer', ('accepted_by_farmer', 'approved_by_admin', 'completed')),
+    ('approved', 'Final approval', SOLD_ORDER_STATUSES),
+    ('completed', 'Completed', ('completed',)),
+]
+
+
+@dataclass(frozen=True)
+class FactSource:
+    name: str
+    model: type
+    archive: type
+    fact: type
+    listing: str  # lookup prefix from a hot row to its listing's columns
+    measures: callable
+
+    def tables(self):
+        """(rows, listing prefix) for the hot table and the archive, which copies the listing columns."""
+        return ((self.model.objects.all(), self.listing), (self.archive.objects.all(), ''))
+
+
+def _order_measures(listing):
+    return {'orders': Count('id'), 'tons': Sum('quantity_ordered'), 'value': Sum('total_price')}
+
+
+def _listing_measures(listing):
+    return {
+        'listings': Count('id'),
+        'tons': Sum('quantity'),
+        'value': Sum(F('quantity') * F('admin_price_per_ton')),
+    }
+
+
+def _bargain_measures(listing):
+    countered = Q(admin_counter_price__isnull=False)
+    discount = ExpressionWrapper(
+        (F('farmer_proposed_price') - F('admin_counter_price')) * 100.0 / F('farmer_proposed_price'),
+        output_field=FloatField()
+    )
+    return {
+        'bargains': Count('id'),
+        'tons': Sum(f'{listing}quantity'),
+        'countered': Count('id', filter=countered),
+        'discount_pct_total': Sum(Case(When(countered, then=discount), default=0.0, output_field=FloatField())),
+    }
+
+
+SOURCES = [
+    FactSource('orders', Order, ArchivedOrder, OrderFact, 'waste_product__', _order_measures),
+    FactSource('listings', WasteProduct, ArchivedWasteProduct, ListingFact, '', _listing_measures),
+    FactSource('bargains', PriceBargain, ArchivedBargain, BargainFact, 'waste_product__', _bargain_measures),
+]
+
+
+def week_start(day):
+    return day - timedelta(days=day.weekday())
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def date_runs(days):
+    """Collapse a set of dates into sorted (first, last) runs of consecutive days."""
+    runs = []
+    for day in sorted(days):
+        if runs and day - runs[-1][1] == timedelta(days=1):
+            runs[-1][1] = day
+        else:
+            runs.append([day, day])
+    return [tuple(run) for run in runs]
+
+
+def _aggregate(source, **filters):
+    totals = defaultdict(lambda: defaultdict(int))
+    for rows, listing in source.tables():
+        grouped = rows.filter(**filters).annotate(day=TruncDate('created_at')).values(
+            'day', 'status', crop=F(f'{listing}crop_name')
+        ).annotate(**source.measures(listing)).order_by()
+        for row in chain.from_iterable(shards.each_shard(lambda alias: list(grouped.using(alias)))):
+            measures = totals[(row.pop('day'), row.pop('crop'), row.pop('status'))]
+            for key, value in row.items():
+                measures[key] += value or 0
+    return [
+        source.fact(date=day, week=week_start(day), crop_name=crop, status=status, **measures)
+        for (day, crop, status), measures in totals.items()
+    ]
+
+
+def changed_days(source, since):
+    """Creation dates of the source rows updated at or after ``since``."""
+    days = source.model.objects.filter(updated_at__gte=since).annotate(
+        day=TruncDate('created_at')
+    ).values_list('day', flat=True).distinct().order_by()
+    return set(chain.from_iterable(shards.each_shard(lambda alias: list(days.using(alias)))))
+
+
+def rebuild(source, days=None):
+    """Replace the facts for ``days`` (every day if None). Returns the number of fact rows written."""
+    written = 0
+    with transaction.atomic():
+        if days is None:
+            source.fact.objects.all().delete()
+            facts = _aggregate(source)
+            source.fact.objects.bulk_create(facts, batch_size=1000)
+            return len(facts)
+        for first, last in date_runs(days):
+            source.fact.objects.filter(date__range=(first, last)).delete()
+            facts = _aggregate(
+                source, created_at__gte=_day_start(first), created_at__lt=_day_start(last + timedelta(days=1))
+            )
+            source.fact.objects.bulk_create(facts, batch_size=1000)
+            written += len(facts)
+    return written
+
+
+def refresh_facts(full=False):
+    """
+    Bring every fact table up to date. Returns {table name: (days rebuilt or
+    None for all, fact rows written)}.
+    """
+    results = {}
+    for source in SOURCES:
+        started = timezone.now()
+        watermark = FactWatermark.objects.filter(name=source.name).first()
+        days = None
+        if not full and watermark is not None:
+            days = changed_days(source, watermark.loaded_until - WATERMARK_OVERLAP)
+        written = rebuild(source, days) if days is None or days else 0
+        FactWatermark.objects.update_or_create(name=source.name, defaults={'loaded_until': started})
+        results[source.name] = (None if days is None else len(days), written)
+    return results
+
+
+def weekly_tonnage(since):
+    """Sold tons per week and crop: ([week, ...], {crop: [tons per week]}, [total per week])."""
+    first_week = week_start(since)
+    rows = OrderFact.objects.filter(date__gte=first_week, status__in=SOLD_ORDER_STATUSES).values(
+        'week', 'crop_name'
+    ).annotate(sold=Sum('tons')).order_by()
+    weeks = []
+    week = first_week
+    while week <= timezone.localdate():
+        weeks.append(week)
+        week += timedelta(days=7)
+    index = {week: i for i, week in enumerate(weeks)}
+    by_crop = defaultdict(lambda: [0] * len(weeks))
+    for row in rows:
+        by_crop[row['crop_name']][index[row['week']]] += row['sold'] or 0
+    totals = [sum(values[i] for values in by_crop.values()) for i in range(len(weeks))]
+    return weeks, dict(by_crop), totals
+
+
+def order_funnel(since):
+    """Orders placed since ``since`` by the furthest stage they reached, with the share of placed."""
+    by_status = dict(
+        OrderFact.objects.filter(date__gte=since).values('status').annotate(
+            placed=Sum('orders')
+        ).order_by().values_list('status', 'placed')
+    )
+    placed = sum(by_status.values())
+    funnel = []
+    for key, label, statuses in FUNNEL_STAGES:
+        count = placed if statuses is None else sum(by_status.get(status, 0) for status in statuses)
+        funnel.append({
+            'key': key,
+            'label': label,
+            'orders': count,
+            'percent': round(count * 100 / placed, 1) if placed else 0,
+        })
+    return funnel
+
+
+def bargain_discounts(since):
+    """Per crop: bargains, how many were countered, acceptance rate and average counter discount."""
+    rows = BargainFact.objects.filter(date__gte=since).values('crop_name').annotate(
+        total=Sum('bargains'),
+        accepted=Sum('bargains', filter=Q(status='accepted')),
+        countered_total=Sum('countered'),
+        discount_total=Sum('discount_pct_total'),
+    ).order_by('crop_name')
+    crops = dict(WasteProduct.CROP_CHOICES)
+    result = []
+    for row in rows:
+        total, countered = row['total'], row['countered_total']
+        result.append({
+            'crop': crops.get(row['crop_name'], row['crop_name']),
+            'bargains': total,
+            'countered': countered,
+            'accepted_percent': round((row['accepted'] or 0) * 100 / total, 1) if total else 0,
+            'avg_discount': round(row['discount_total'] / countered, 1) if countered else None,
+        })
+    return result
+
+
+def listing_totals(since):
+    """Listed tons and value per crop."""
+    crops = dict(WasteProduct.CROP_CHOICES)
+    rows = ListingFact.objects.filter(date__gte=since).values('crop_name').annotate(
+        total_listings=Sum('listings'), total_tons=Sum('tons'), total_value=Sum('value')
+    ).order_by('-total_tons')
+    return [
+        {
+            'crop': crops.get(row['crop_name'], row['crop_name']),
+            'listings': row['total_listings'],
+            'tons': row['total_tons'],
+            'value': row['total_value'],
+        }
+        for row in rows
+    ]
+
+
+def last_loaded():
+    return FactWatermark.objects.order_by('loaded_until').values_list('loaded_until', flat=True).first()
@@ -0,0 +1,482 @@
+"""
+Versioned JSON API (/api/v1/) for waste products, orders, bargains and market summaries.
+
+A deliberately small implementation on top of plain Django views:
+- ``?fields=a,b`` selects a sparse fieldset; only the joins those fields need
+  are added with ``select_related`` so serialization never issues extra queries.
+- List endpoints use keyset (cursor) pagination on ``id`` for stable, O(limit) pages;
+  ids are unique across shards, so each shard returns one page and the
+  newest ``limit`` are kept (core.shards).
+- Responses carry a strong ETag and honour ``If-None-Match`` with 304.
+- ``/api/changes/`` serves the change feed (core.changes) so partners can
+  sync incrementally, long-polling with ``?wait=`` (under ASGI) while nothing changes.
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.core.exceptions import ValidationError
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q, Sum, Avg, Count
+from django.http import HttpResponse, JsonResponse
+from django.utils.http import quote_etag, parse_etags
+from django.views.decorators.http import require_http_methods
+from .async_utils import alogin_required, arequire_http_methods
+from .concurrency import VersionConflict, expect_version
+from .models import WasteProduct, Order, PriceBargain
+from . import changes, pricing, shards
+from .forms import WasteProductForm, OrderForm
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class Field:
+    """A serializable field: how to read it and which relations it needs."""
+
+    def __init__(self, getter, related=None):
+        self.getter = getter if callable(getter) else (lambda obj, attr=getter: getattr(obj, attr))
+        self.related = related
+
+
+class Resource:
+    fields = {}
+    default_fields = None
+
+    def __init__(self, request):
+        self.request = request
+        requested = request.GET.get('fields')
+        if requested:
+            names = [name.strip() for name in requested.split(',') if name.strip()]
+            unknown = [name for name in names if name not in self.fields]
+            if unknown:
+                raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+        else:
+            names = list(self.default_fields or self.fields)
+        self.selected = names
+
+    def queryset(self):
+        raise NotImplementedError
+
+    def prepared_queryset(self):
+        related = {self.fields[name].related for name in self.selected if self.fields[name].related}
+        queryset = self.queryset()
+        if related:
+            queryset = queryset.select_related(*sorted(related))
+        return queryset
+
+    def serialize(self, obj):
+        return {name: self.fields[name].getter(obj) for name in self.selected}
+
+
+def _photo_url(obj):
+    return obj.photo.url if obj.photo else None
+
+
+class WasteProductResource(Resource):
+    fields = {
+        'id': Field('id'),
+        'crop_name': Field('crop_name'),
+        'crop_label': Field('crop_label'),
+        'quantity': Field('quantity'),
+        'admin_price_per_ton': Field('admin_price_per_ton'),
+        'farmer_price_per_ton': Field('farmer_price_per_ton'),
+        'effective_price': Field('effective_price'),
+        'location': Field('location'),
+        'description': Field('description'),
+        'status': Field('status'),
+        'photo': Field(_photo_url),
+        'farmer': Field(lambda obj: obj.farmer.user_profile.user.username, 'farmer__user_profile__user'),
+        'created_at': Field('created_at'),
+        'updated_at': Field('updated_at'),
+        'version': Field('version'),
+    }
+
+    def queryset(self):
+        user = self.request.user
+        queryset = WasteProduct.objects.with_values()
+        if not user.is_superuser:
+            queryset = queryset.filter(Q(status='available') | Q(farmer__user_profile__user=user))
+        for param in ('status', 'crop_name'):
+            value = self.request.GET.get(param)
+            if value:
+                queryset = queryset.filter(**{param: value})
+        return queryset
+
+
+class OrderResource(Resource):
+    fields = {
+        'id': Field('id'),
+        'waste_product': Field('waste_product_id'),
+        'crop_name': Field(lambda obj: obj.waste_product.crop_name, 'waste_product'),
+        'company': Field(lambda obj: obj.company.company_name, 'company'),
+        'farmer': Field(
+            lambda obj: obj.waste_product.farmer.user_profile.user.username,
+            'waste_product__farmer__user_profile__user'
+        ),
+        'quantity_ordered': Field('quantity_ordered'),
+        'company_price_per_ton': Field('company_price_per_ton'),
+        'total_price': Field('total_price'),
+        'status': Field('status'),
+        'status_label': Field(lambda obj: obj.get_status_display()),
+        'notes': Field('notes'),
+        'admin_notes': Field('admin_notes'),
+        'created_at': Field('created_at'),
+        'updated_at': Field('updated_at'),
+        'version': Field('version'),
+    }
+
+    def queryset(self):
+        user = self.request.user
+        queryset = Order.objects.all()
+        if not user.is_superuser:
+            queryset = queryset.filter(
+                Q(company__user_profile__user=user) | Q(waste_product__farmer__user_profile__user=user)
+            )
+        status = self.request.GET.get('status')
+        if status:
+            queryset = queryset.filter(status=status)
+        return queryset
+
+
+class BargainResource(Resource):
+    fields = {
+        'id': Field('id'),
+        'waste_product': Field('waste_product_id'),
+        'crop_name': Field(lambda obj: obj.waste_product.crop_name, 'waste_product'),
+        'current_price': Field(lambda obj: obj.waste_product.admin_price_per_ton, 'waste_product'),
+        'farmer': Field(
+            lambda obj: obj.waste_product.farmer.user_profile.user.username,
+            'waste_product__farmer__user_profile__user'
+        ),
+        'farmer_proposed_price': Field('farmer_proposed_price'),
+        'admin_counter_price': Field('admin_counter_price'),
+        'farmer_message': Field('farmer_message'),
+        'admin_message': Field('admin_message'),
+        'status': Field('status'),
+        'created_at': Field('created_at'),
+        'updated_at': Field('updated_at'),
+        'version': Field('version'),
+    }
+
+    def queryset(self):
+        user = self.request.user
+        queryset = PriceBargain.objects.all()
+        if not user.is_superuser:
+            queryset = queryset.filter(waste_product__farmer__user_profile__user=user)
+        status = self.request.GET.get('status')
+        if status:
+            queryset = queryset.filter(status=status)
+        return queryset
+
+
+def encode_cursor(last_id):
+    return base64.urlsafe_b64encode(str(last_id).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    padded = cursor + '=' * (-len(cursor) % 4)
+    return int(base64.urlsafe_b64decode(padded.encode()).decode())
+
+
+def error_response(message, status):
+    return JsonResponse({'success': False, 'error': message}, status=status)
+
+
+def etag_response(request, payload, status=200):
+    """Serialize payload once, attach a strong ETag and short-circuit matching If-None-Match."""
+    body = json.dumps(payload, cls=DjangoJSONEncoder, separators=(',', ':'))
+    etag = quote_etag(hashlib.md5(body.encode(), usedforsecurity=False).hexdigest())
+    if status == 200 and etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        response = HttpResponse(status=304)
+    else:
+        response = HttpResponse(body, status=status, content_type='application/json')
+    response['ETag'] = etag
+    response['Vary'] = 'Cookie'
+    return response
+
+
+def _role(user):
+    if user.is_superuser:
+        return 'admin'
+    profile = getattr(user, 'userprofile', None)
+    return profile.role if profile else None
+
+
+def list_resource(request, resource_class):
+    try:
+        resource = resource_class(request)
+        limit = min(int(request.GET.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+        cursor = request.GET.get('cursor')
+        before_id = decode_cursor(cursor) if cursor else None
+    except (ValueError, TypeError) as e:
+        return error_response(str(e) or 'Invalid query parameters', 400)
+    if limit < 1:
+        return error_response('limit must be positive', 400)
+
+    queryset = resource.prepared_queryset().order_by('-id')
+    if before_id is not None:
+        queryset = queryset.filter(id__lt=before_id)
+    rows = shards.gather(queryset, limit=limit + 1)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    next_url = None
+    if has_more:
+        params = request.GET.copy()
+        params['cursor'] = encode_cursor(rows[-1].id)
+        next_url = f"{request.path}?{params.urlencode()}"
+
+    return etag_response(request, {
+        'success': True,
+        'results': [resource.serialize(obj) for obj in rows],
+        'next': next_url,
+    })
+
+
+def detail_resource(request, resource_class, pk):
+    try:
+        resource = resource_class(request)
+    except ValueError as e:
+        return error_response(str(e), 400)
+    obj = shards.find(resource.prepared_queryset().filter(pk=pk))
+    if obj is None:
+        return error_response('Not found', 404)
+    return etag_response(request, {'success': True, 'result': resource.serialize(obj)})
+
+
+def created_response(request, resource_class, instance):
+    """Re-read a new row through the resource so it serializes exactly like a GET would."""
+    resource = resource_class(request)
+    obj = resource.prepared_queryset().using(instance._state.db).get(pk=instance.pk)
+    return etag_response(request, {'success': True, 'result': resource.serialize(obj)}, status=201)
+
+
+def _waste_product_id(data):
+    """The ``waste_product`` id of a POST body, or None if it is not an integer."""
+    try:
+        return int(data.get('waste_product'))
+    except (ValueError, TypeError):
+        return None
+
+
+def _json_body(request):
+    try:
+        data = json.loads(request.body or b'{}')
+    except json.JSONDecodeError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def _form_errors(form):
+    return JsonResponse({'success': False, 'errors': form.errors.get_json_data()}, status=400)
+
+
+@login_required
+@require_http_methods(["GET", "POST"])
+def waste_products(request):
+    if request.method == 'GET':
+        return list_resource(request, WasteProductResource)
+
+    if _role(request.user) != 'farmer':
+        return error_response('Only farmers can create waste products', 403)
+    data = _json_body(request)
+    if data is None:
+        return error_response('Invalid JSON data', 400)
+    form = WasteProductForm(data)
+    if not form.is_valid():
+        return _form_errors(form)
+    product = form.save(commit=False)
+    product.farmer = request.user.userprofile.farmerprofile
+    product.admin_price_per_ton = pricing.UNPRICED  # Admin will set the price later
+    product.suggested_price_per_ton = pricing.suggested_price(product)
+    product.save()
+    return created_response(request, WasteProductResource, product)
+
+
+@login_required
+@require_http_methods(["GET"])
+def waste_product_detail(request, pk):
+    return detail_resource(request, WasteProductResource, pk)
+
+
+@login_required
+@require_http_methods(["GET", "POST"])
+def orders(request):
+    if request.method == 'GET':
+        return list_resource(request, OrderResource)
+
+    if _role(request.user) != 'company':
+        return error_response('Only companies can place orders', 403)
+    data = _json_body(request)
+    if data is None:
+        return error_response('Invalid JSON data', 400)
+    waste_product_id = _waste_product_id(data)
+    if waste_product_id is None:
+        return error_response('waste_product must be an integer id', 400)
+
+    waste_product = shards.find(WasteProduct.objects.filter(id=waste_product_id, status='available'))
+    if waste_product is None:
+        return error_response('Waste product not found or not available', 404)
+    # Optional: the listing version the client priced its order against
+    if 'version' in data:
+        expect_version(waste_product, data['version'])
+    form = OrderForm(data, waste_product=waste_product)
+    if not form.is_valid():
+        return _form_errors(form)
+    try:
+        with shards.atomic(waste_product._state.db):
+            order = form.save(commit=False)
+            order.company = request.user.userprofile.companyprofile
+            order.waste_product = waste_product
+            order.total_price = form.cleaned_data['quantity_ordered'] * form.cleaned_data['company_price_per_ton']
+            order.save()
+            # Compare-and-swap on the listing's version instead of a row lock:
+            # if another order reserved it first this raises and rolls back
+            waste_product.status = 'reserved'
+            waste_product.save(update_fields=['status'])
+    except VersionConflict:
+        return error_response('Waste product was changed by another request; fetch it again and retry', 409)
+
+    return created_response(request, OrderResource, order)
+
+
+@login_required
+@require_http_methods(["GET"])
+def order_detail(request, pk):
+    return detail_resource(request, OrderResource, pk)
+
+
+@login_required
+@require_http_methods(["GET", "POST"])
+def bargains(request):
+    if request.method == 'GET':
+        return list_resource(request, BargainResource)
+
+    if _role(request.user) != 'farmer':
+        return error_response('Only farmers can create bargains', 403)
+    data = _json_body(request)
+    if data is None:
+        return error_response('Invalid JSON data', 400)
+    waste_product_id = _waste_product_id(data)
+    if waste_product_id is None:
+        return error_response('waste_product must be an integer id', 400)
+
+    waste_product = shards.find(WasteProduct.objects.filter(
+        id=waste_product_id, farmer__user_profile__user=request.user
+    ))
+    if waste_product is None:
+        return error_response('Waste product not found', 404)
+
+    bargain = PriceBargain(
+        waste_product=waste_product,
+        farmer_proposed_price=data.get('proposed_price'),
+        farmer_message=data.get('message') or ''
+    )
+    try:
+        bargain.full_clean()
+    except ValidationError as e:
+        return JsonResponse({'success': False, 'errors': e.message_dict}, status=400)
+    bargain.save()
+    return created_response(request, BargainResource, bargain)
+
+
+@login_required
+@require_http_methods(["GET"])
+def bargain_detail(request, pk):
+    return detail_resource(request, BargainResource, pk)
+
+
+@login_required
+@require_http_methods(["GET"])
+def price_suggestion(request):
+    crop_name = request.GET.get('crop_name')
+    if crop_name not in dict(WasteProduct.CROP_CHOICES):
+        return error_response('crop_name must be one of the crop choices', 400)
+    try:
+        quantity = float(request.GET.get('quantity', 0))
+    except ValueError:
+        return error_response('quantity must be a number', 400)
+    suggestion = pricing.suggest(crop_name, request.GET.get('location', ''), quantity)
+    if suggestion is None:
+        return error_response('No accepted trades for this crop yet', 404)
+    return JsonResponse({'success': True, 'suggestion': suggestion.as_dict()}, encoder=DjangoJSONEncoder)
+
+
+@alogin_required
+@arequire_http_methods(["GET"])
+async def market_summary(request):
+    labels = dict(WasteProduct.CROP_CHOICES)
+    rows = await sync_to_async(shards.grouped)(
+        WasteProduct.objects.filter(status='available'), 'crop_name', ordering=('crop_name',),
+        total_quantity=Sum('quantity'),
+        avg_price=Avg('admin_price_per_ton'),
+        listings=Count('id')
+    )
+    return etag_response(request, {
+        'success': True,
+        'results': [
+            {
+                'crop_name': row['crop_name'],
+                'crop_label': labels.get(row['crop_name'], row['crop_name']),
+                'total_quantity': row['total_quantity'],
+                'avg_price': round(row['avg_price'], 2) if row['avg_price'] is not None else None,
+                'listings': row['listings'],
+            }
+            for row in rows
+        ],
+    })
+
+
+@alogin_required
+@arequire_http_methods(["GET"])
+async def change_feed(request):
+    """
+    Changes after ``?since=<cursor>``, at most ``?limit=`` per page, waiting up
+    to ``?wait=`` seconds for the first one. Without ``since`` the response
+    only carries the cursor for the current end of the feed. ``wait`` only
+    applies under ASGI: a WSGI worker would hold a thread for the whole wait.
+    """
+    since = request.GET.get('since') or None
+    try:
+        limit = min(int(request.GET.get('limit', settings.CHANGE_FEED_PAGE_SIZE)), settings.CHANGE_FEED_MAX_PAGE_SIZE)
+        wait = min(int(request.GET.get('wait', 0)), settings.CHANGE_FEED_MAX_WAIT)
+    except ValueError:
+        return error_response('limit and wait must be numbers', 400)
+    if limit < 1:
+        return error_response('limit must be positive', 400)
+    if not isinstance(request, ASGIRequest):
+        wait = 0
+    visible = await sync_to_async(changes.visible_to)(request.user)
+    if visible is None:
+        return error_response('The change feed is for farmers, companies and admins', 403)
+
+    deadline = time.monotonic() + wait
+    while True:
+        try:
+            entries, next_cursor, has_more = await sync_to_async(changes.read_changes)(visible, since, limit)
+        except changes.CursorExpired:
+            return error_response('Cursor expired; download the data again and start from a new cursor', 410)
+        except ValueError:
+            return error_response('Invalid cursor', 400)
+        remaining = deadline - time.monotonic()
+        if entries or since is None or remaining <= 0:
+            break
+        # An empty page still moves the cursor forward, so it does not expire while the feed is quiet
+        since = next_cursor
+        await asyncio.sleep(min(settings.CHANGE_FEED_POLL_INTERVAL, remaining))
+
+    return JsonResponse({
+        'success': True,
+        'changes': [changes.serialize(entry) for entry in entries],
+        'next': next_cursor,
+        'has_more': has_more,
+    }, encoder=DjangoJSONEncoder)
@@ -1,5 +1,18 @@
 from django.apps import AppConfig
+from django.contrib.staticfiles.apps import StaticFilesConfig
 
 class CoreConfig(AppConfig):
+    # Two AppConfig subclasses live here, so Django needs to be told which one is the app
+    default = True
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'core'
\ No newline at end of file
+    name = 'core'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+
+class AgroStaticFilesConfig(StaticFilesConfig):
+    # Skip the Font Awesome sources we never reference; they are tens of
+    # thousands of files that would otherwise be hashed and compressed.
+    ignore_patterns = StaticFilesConfig.ignore_patterns + [
+        'svgs', 'sprites', 'less', 'scss', 'otfs', 'js-packages', 'fontawesomefree/js/*',
+    ]
\ No newline at end of file
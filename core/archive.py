@@ -0,0 +1,193 @@
+"""
+Hot/cold archival of finished trades.
+
+Completed or rejected orders and sold listings never change again, yet every
+dashboard, list and counter query has to step over them. ``archive_rows``
+moves the ones not updated for ``ARCHIVE_AFTER_DAYS`` into ArchivedOrder,
+ArchivedWasteProduct and ArchivedBargain, keeping their ids:
+
+1. finished orders, with the crop, location and farmer of their listing;
+2. sold listings with no orders left in the hot table and no pending
+   bargain, together with their bargains.
+
+Each chunk of ``ARCHIVE_BATCH_SIZE`` rows is locked, copied and deleted in its
+own transaction, so a run never holds locks for long and can be stopped and
+resumed at any point. The archive lives in the same database as the hot
+tables, i.e. on their shard (core.shards), so it keeps its foreign keys to
+farmers and companies; each shard is archived in turn.
+
+Archived rows still count: dashboard counters are left alone during the move
+(``counters.suspended``) and ``compute_counters``, the analytics facts and the
+pricing history read both tables. Pages that show past trades read through
+``order_history`` and ``find_listing``.
+"""
+from datetime import timedelta
+from itertools import chain
+from operator import attrgetter
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef
+from django.utils import timezone
+from . import changes, counters, shards
+from .models import (
+    WasteProduct, Order, PriceBargain, ArchivedWasteProduct, ArchivedOrder, ArchivedBargain, crop_label
+)
+import logging
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_ORDER_STATUSES = ('completed', 'rejected_by_farmer')
+TERMINAL_LISTING_STATUSES = ('sold',)
+
+ORDER_COLUMNS = (
+    'id', 'company_id', 'waste_product_id', 'quantity_ordered', 'company_price_per_ton', 'total_price',
+    'status', 'notes', 'admin_notes', 'version', 'created_at', 'updated_at',
+)
+LISTING_COLUMNS = (
+    'id', 'farmer_id', 'crop_name', 'quantity', 'admin_price_per_ton', 'farmer_price_per_ton',
+    'suggested_price_per_ton', 'location', 'description', 'photo', 'status', 'version', 'created_at', 'updated_at',
+)
+BARGAIN_COLUMNS = (
+    'id', 'waste_product_id', 'farmer_proposed_price', 'admin_counter_price', 'farmer_message',
+    'admin_message', 'status', 'version', 'created_at', 'updated_at',
+)
+LISTING_RELATED = 'farmer__user_profile__user'
+
+
+def archivable_orders(cutoff):
+    return Order.objects.filter(status__in=TERMINAL_ORDER_STATUSES, updated_at__lt=cutoff)
+
+
+def archivable_listings(cutoff):
+    return WasteProduct.objects.filter(status__in=TERMINAL_LISTING_STATUSES, updated_at__lt=cutoff).exclude(
+        Exists(Order.objects.filter(waste_product=OuterRef('pk')))
+    ).exclude(
+        Exists(PriceBargain.objects.filter(waste_product=OuterRef('pk'), status='pending'))
+    )
+
+
+def _move_orders(cutoff, batch_size, alias):
+    """Move one chunk of finished orders on shard ``alias``. Returns the number moved."""
+    with transaction.atomic(using=alias):
+        rows = list(
+            archivable_orders(cutoff).using(alias).select_for_update(of=('self',)).order_by('pk').values(
+                *ORDER_COLUMNS,
+                farmer_id=F('waste_product__farmer_id'),
+                crop_name=F('waste_product__crop_name'),
+                location=F('waste_product__location'),
+            )[:batch_size]
+        )
+        if rows:
+            ArchivedOrder.objects.using(alias).bulk_create([ArchivedOrder(**row) for row in rows])
+            with counters.suspended(), changes.suspended():
+                Order.objects.using(alias).filter(pk__in=[row['id'] for row in rows]).delete()
+    return len(rows)
+
+
+def _move_listings(cutoff, batch_size, alias):
+    """Move one chunk of sold listings and their bargains on shard ``alias``. Returns (listings, bargains) moved."""
+    with transaction.atomic(using=alias):
+        rows = list(
+            archivable_listings(cutoff).using(alias).select_for_update(of=('self',)).order_by('pk').values(
+                *LISTING_COLUMNS
+            )[:batch_size]
+        )
+        if not rows:
+            return 0, 0
+        ids = [row['id'] for row in rows]
+        bargains = list(
+            PriceBargain.objects.using(alias).filter(waste_product_id__in=ids).select_for_update(of=('self',)).values(
+                *BARGAIN_COLUMNS,
+                crop_name=F('waste_product__crop_name'),
+                location=F('waste_product__location'),
+                quantity=F('waste_product__quantity'),
+            )
+        )
+        ArchivedWasteProduct.objects.using(alias).bulk_create([ArchivedWasteProduct(**row) for row in rows])
+        ArchivedBargain.objects.using(alias).bulk_create([ArchivedBargain(**row) for row in bargains])
+        with counters.suspended(), changes.suspended():
+            # Cascades to the bargains just copied
+            WasteProduct.objects.using(alias).filter(pk__in=ids).delete()
+    return len(rows), len(bargains)
+
+
+def archive_rows(days=None, batch_size=None, dry_run=False):
+    """
+    Move finished orders and sold listings last updated more than ``days``
+    ago (``ARCHIVE_AFTER_DAYS`` by default) into the archive tables. Returns
+    {'orders': n, 'listings': n, 'bargains': n}; with ``dry_run`` only counts
+    the orders and listings that would move now.
+    """
+    days = settings.ARCHIVE_AFTER_DAYS if days is None else days
+    batch_size = batch_size or settings.ARCHIVE_BATCH_SIZE
+    cutoff = timezone.now() - timedelta(days=days)
+    if dry_run:
+        # Listings whose orders are about to move are not counted yet
+        return {
+            'orders': shards.count(archivable_orders(cutoff)), 'listings': shards.count(archivable_listings(cutoff))
+        }
+
+    moved = {'orders': 0, 'listings': 0, 'bargains': 0}
+    for alias in shards.aliases():
+        while True:
+            count = _move_orders(cutoff, batch_size, alias)
+            moved['orders'] += count
+            if count < batch_size:
+                break
+        while True:
+            listings, bargains = _move_listings(cutoff, batch_size, alias)
+            moved['listings'] += listings
+            moved['bargains'] += bargains
+            if listings < batch_size:
+                break
+    if any(moved.values()):
+        logger.info(
+            "Archived %s orders, %s listings and %s bargains older than %s days",
+            moved['orders'], moved['listings'], moved['bargains'], days
+        )
+    return moved
+
+
+def find_listing(pk):
+    """The listing with id ``pk``, hot or archived, on any shard, or None."""
+    return (
+        shards.find(WasteProduct.objects.select_related(LISTING_RELATED).filter(pk=pk))
+        or shards.find(ArchivedWasteProduct.objects.select_related(LISTING_RELATED).filter(pk=pk))
+    )
+
+
+def attach_listings(orders):
+    """Load the listings of archived ``orders`` in two queries per shard at most."""
+    by_shard = {}
+    for order in orders:
+        by_shard.setdefault(order._state.db, set()).add(order.waste_product_id)
+    listings = {}
+    for alias, ids in by_shard.items():
+        # An archived order's listing is on its shard
+        found = WasteProduct.objects.using(alias).select_related(LISTING_RELATED).in_bulk(ids)
+        missing = ids - found.keys()
+        if missing:
+            found.update(ArchivedWasteProduct.objects.using(alias).select_related(LISTING_RELATED).in_bulk(missing))
+        listings.update(found)
+    for order in orders:
+        order._waste_product = listings.get(order.waste_product_id)
+    return orders
+
+
+def order_history(company=None, farmer=None, status=None):
+    """
+    Orders of ``company`` or ``farmer`` (everyone's if both are None), hot
+    and archived, newest first. Archived orders have the same attributes
+    templates use on Order, including ``waste_product``.
+    """
+    hot = Order.objects.with_values().select_related('company__user_profile__user', f'waste_product__{LISTING_RELATED}')
+    cold = ArchivedOrder.objects.annotate(crop_label=crop_label()).select_related('company__user_profile__user')
+    if company is not None:
+        hot, cold = hot.filter(company=company), cold.filter(company=company)
+    if farmer is not None:
+        hot, cold = hot.filter(waste_product__farmer=farmer), cold.filter(farmer=farmer)
+    if status:
+        hot = hot.filter(status=status)
+        cold = cold.filter(status=status) if status in TERMINAL_ORDER_STATUSES else cold.none()
+    archived = attach_listings(shards.gather(cold))
+    return sorted(chain(shards.gather(hot), archived), key=attrgetter('created_at'), reverse=True)
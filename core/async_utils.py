@@ -0,0 +1,44 @@
+"""
+Helpers for async views and middleware under ASGI (agroconnect/asgi.py).
+
+Django 4.2's ``login_required`` and ``require_http_methods`` only wrap sync
+views, and ``request.user`` is a lazy object that queries the database the
+first time it is touched, which is not allowed on the event loop. These are
+the async counterparts used by the async endpoints in core.views, core.api
+and core.middleware.
+"""
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.contrib.auth.views import redirect_to_login
+from django.http import HttpResponseNotAllowed
+
+
+async def aget_user(request):
+    """Return ``request.user``, loading it in a worker thread the first time."""
+    if not hasattr(request, '_cached_user'):
+        # AuthenticationMiddleware caches the resolved user on the request
+        await sync_to_async(lambda: request.user.is_authenticated, thread_sensitive=True)()
+    return request.user
+
+
+def alogin_required(view_func):
+    """``login_required`` for ``async def`` views."""
+    @wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        user = await aget_user(request)
+        if not user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        return await view_func(request, *args, **kwargs)
+    return wrapper
+
+
+def arequire_http_methods(methods):
+    """``require_http_methods`` for ``async def`` views."""
+    def decorator(view_func):
+        @wraps(view_func)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return HttpResponseNotAllowed(methods)
+            return await view_func(request, *args, **kwargs)
+        return wrapper
+    return decorator
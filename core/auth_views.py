@@ -41,12 +41,12 @@ class ConcurrentLoginView(LoginView):
                 self.store_session_metadata(user, session_id)
                 
                 # Log successful concurrent login
-                logger.info(f"Concurrent login successful for user {user.username} with session {session_id[:8]}")
+                logger.info("Concurrent login successful for user %s with session %s", user.username, session_id[:8])
                 
                 messages.success(self.request, f"Welcome back, {user.get_full_name() or user.username}!")
                 
         except Exception as e:
-            logger.error(f"Error during concurrent login for user {user.username}: {e}")
+            logger.error("Error during concurrent login for user %s: %s", user.username, e)
             messages.error(self.request, "Login failed due to system error. Please try again.")
             return self.form_invalid(form)
         
@@ -110,6 +110,32 @@ def get_user_active_sessions(user):
     return active_sessions
 
 
+async def aget_user_active_sessions(user):
+    """
+    Async version of get_user_active_sessions for the polled sessions API.
+    Checks every session in one query and only writes the cache back when
+    something expired.
+    """
+    if not user.is_authenticated:
+        return []
+
+    cache_key = f"user_sessions_{user.id}"
+    sessions = await cache.aget(cache_key, [])
+    if not sessions:
+        return []
+
+    live = {
+        key async for key in Session.objects.filter(
+            session_key__in=[info['session_key'] for info in sessions],
+            expire_date__gt=timezone.now(),
+        ).values_list('session_key', flat=True)
+    }
+    active_sessions = [info for info in sessions if info['session_key'] in live]
+    if len(active_sessions) != len(sessions):
+        await cache.aset(cache_key, active_sessions, timeout=3600)
+    return active_sessions
+
+
 def cleanup_user_sessions(user, keep_current=True, current_session_key=None):
     """
     Clean up old/expired sessions for a user.
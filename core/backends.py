@@ -0,0 +1,58 @@
+"""
+Authentication backend that loads the user together with its profiles.
+"""
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import User
+from django.core.cache import cache
+
+from .models import UserProfile
+
+PROFILE_RELATED = ('farmerprofile', 'companyprofile')
+# Cached for users without a UserProfile (e.g. a superuser made by createsuperuser)
+NO_PROFILE = 'none'
+
+
+def user_context_cache_key(user_id):
+    return f"user_context_{user_id}"
+
+
+def invalidate_user_context(user_id):
+    cache.delete(user_context_cache_key(user_id))
+
+
+class ProfileModelBackend(ModelBackend):
+    """
+    ModelBackend whose get_user() attaches the UserProfile and its
+    FarmerProfile/CompanyProfile, fetched in one joined query and cached for
+    USER_CONTEXT_CACHE_TIMEOUT seconds.
+
+    Views, middleware and templates then read ``request.user.userprofile`` and
+    its role-specific profile from the instance cache without further queries.
+    The User row itself is loaded on every request, so a deactivation or a
+    password change (the session auth hash) applies at once. The cached
+    profiles are dropped whenever one of them is saved (see core.signals);
+    other processes see the change once their entry expires.
+    """
+
+    def get_user(self, user_id):
+        try:
+            user = User._default_manager.get(pk=user_id)
+        except User.DoesNotExist:
+            return None
+        if not self.user_can_authenticate(user):
+            return None
+        timeout = getattr(settings, 'USER_CONTEXT_CACHE_TIMEOUT', settings.SESSION_COOKIE_AGE)
+        cache_key = user_context_cache_key(user_id)
+        profile = cache.get(cache_key) if timeout else None
+        if profile is None:
+            profile = UserProfile.objects.select_related(*PROFILE_RELATED).filter(user_id=user_id).first()
+            if timeout:
+                cache.set(cache_key, profile or NO_PROFILE, timeout=timeout)
+        if profile == NO_PROFILE:
+            profile = None
+        # Caches the reverse accessor both ways; a cached None makes ``user.userprofile`` raise DoesNotExist
+        User.userprofile.related.set_cached_value(user, profile)
+        if profile is not None:
+            UserProfile.user.field.set_cached_value(profile, user)
+        return user
@@ -0,0 +1,255 @@
+"""
+Change feed for partner integrations (``/api/changes/``).
+
+Every save or delete of a WasteProduct, Order or PriceBargain appends a
+ChangeLogEntry on ``default`` holding the row's synced columns and version.
+Partners keep a cursor and read the entries after it, so a sync costs
+O(changes) instead of a download of every listing page:
+
+- The entry is inserted after the write commits (on its shard, then on
+  ``default``), as a single autocommit statement. Ids are handed out at
+  insert, so a lower id can still commit just after a higher one; readers
+  stop at entries younger than ``CHANGE_FEED_SETTLE`` seconds so they do
+  not step past it. This is a heuristic, not a guarantee: an insert that
+  takes longer than the settle time to commit (a stalled connection, lock
+  waits) lands behind a cursor that has already moved on, and clients never
+  see that entry. The row's next change is recorded as usual.
+- A page keeps only the last entry per object, and ``compact_changes``
+  deletes superseded entries from the table, so an object edited many
+  times costs one entry. Clients apply a ``saved`` entry if its version is
+  newer than theirs (a row moved between shards keeps its version) and a
+  ``deleted`` one always.
+- Entries older than ``CHANGE_LOG_RETENTION_DAYS`` are deleted and cursors
+  that old are refused with CursorExpired: the client downloads again.
+
+Writes that bypass the model signals (``QuerySet.update``) are not recorded;
+imports call ``record_created`` after ``bulk_create``. Archive and shard
+moves (core.archive, core.shards) run under ``suspended()``, since the rows
+do not change. An entry is lost if the process dies between the commit and
+its insert.
+"""
+import base64
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from functools import partial
+from itertools import takewhile
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, models, transaction
+from django.db.models import Exists, Max, OuterRef, Q
+from django.utils import timezone
+from .models import ChangeLogEntry, WasteProduct, Order, PriceBargain
+import logging
+
+logger = logging.getLogger(__name__)
+
+RESOURCES = {WasteProduct: 'listing', Order: 'order', PriceBargain: 'bargain'}
+
+# Columns (by attname) a partner needs to mirror each resource
+SYNCED_FIELDS = {
+    WasteProduct: (
+        'crop_name', 'quantity', 'admin_price_per_ton', 'farmer_price_per_ton', 'location', 'status', 'farmer_id'
+    ),
+    Order: ('waste_product_id', 'company_id', 'quantity_ordered', 'company_price_per_ton', 'total_price', 'status'),
+    PriceBargain: ('waste_product_id', 'farmer_proposed_price', 'admin_counter_price', 'status'),
+}
+
+_suspended = ContextVar('changes_suspended', default=False)
+
+
+class CursorExpired(Exception):
+    """The cursor is older than the retention window; entries after it may be gone."""
+
+
+@contextmanager
+def suspended():
+    """Record nothing for saves and deletes inside the block, e.g. rows moved to the archive."""
+    token = _suspended.set(True)
+    try:
+        yield
+    finally:
+        _suspended.reset(token)
+
+
+def _farmer_id(instance):
+    if isinstance(instance, WasteProduct):
+        return instance.farmer_id
+    cached = instance._state.fields_cache.get('waste_product')
+    if cached is not None and cached.pk == instance.waste_product_id:
+        return cached.farmer_id
+    return WasteProduct._base_manager.using(instance._state.db).filter(
+        pk=instance.waste_product_id
+    ).values_list('farmer_id', flat=True).first()
+
+
+def _value(instance, name):
+    field = instance._meta.get_field(name)
+    value = getattr(instance, name)
+    if isinstance(field, models.DecimalField) and value is not None:
+        # As stored, e.g. '5.00' for a listing created with quantity=5
+        return field.to_python(value).quantize(Decimal(1).scaleb(-field.decimal_places))
+    return value
+
+
+def _entry(instance, action):
+    model = type(instance)
+    data = {name: _value(instance, name) for name in SYNCED_FIELDS[model]} if action == 'saved' else None
+    return ChangeLogEntry(
+        resource=RESOURCES[model],
+        object_id=instance.pk,
+        action=action,
+        version=instance.version,
+        data=data,
+        farmer_id=_farmer_id(instance),
+        company_id=getattr(instance, 'company_id', None),
+    )
+
+
+def _append(entries):
+    try:
+        ChangeLogEntry.objects.bulk_create(entries)
+    except DatabaseError:
+        logger.exception("Could not record %s change feed entries", len(entries))
+
+
+def _after_commit(entries, using):
+    """Insert ``entries`` once the write on ``using``, and any open transaction on default, has committed."""
+    transaction.on_commit(
+        lambda: transaction.on_commit(partial(_append, entries), using=DEFAULT_DB_ALIAS),
+        using=using,
+    )
+
+
+def _tracks(sender, update_fields):
+    return update_fields is None or any(
+        sender._meta.get_field(name).name in update_fields for name in SYNCED_FIELDS[sender]
+    )
+
+
+def record_saved(sender, instance, created, raw=False, using=DEFAULT_DB_ALIAS, update_fields=None, **kwargs):
+    """post_save receiver for WasteProduct, Order and PriceBargain."""
+    if raw or _suspended.get() or not _tracks(sender, update_fields):
+        return
+    _after_commit([_entry(instance, 'saved')], using)
+
+
+def record_deleted(sender, instance, using=DEFAULT_DB_ALIAS, **kwargs):
+    """post_delete receiver for WasteProduct, Order and PriceBargain."""
+    if _suspended.get():
+        return
+    _after_commit([_entry(instance, 'deleted')], using)
+
+
+def record_created(instances, using=DEFAULT_DB_ALIAS):
+    """Record rows inserted with ``bulk_create``, which sends no signals."""
+    if instances and not _suspended.get():
+        _after_commit([_entry(instance, 'saved') for instance in instances], using)
+
+
+def encode_cursor(entry_id, at):
+    return base64.urlsafe_b64encode(f'{entry_id}.{int(at.timestamp())}'.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(last entry id, time) from a feed cursor. Raises ValueError if it is malformed."""
+    padded = cursor + '=' * (-len(cursor) % 4)
+    entry_id, stamp = base64.urlsafe_b64decode(padded.encode()).decode().split('.')
+    try:
+        at = datetime.fromtimestamp(int(stamp), tz=dt_timezone.utc)
+    except (OverflowError, OSError) as e:
+        raise ValueError(f'Cursor time out of range: {stamp}') from e
+    return int(entry_id), at
+
+
+def visible_to(user):
+    """
+    Q over ChangeLogEntry for the entries ``user`` may read, or None if the
+    feed is not for them. Companies follow every listing, including ones
+    that leave the market, plus their own orders.
+    """
+    if user.is_superuser:
+        return Q()
+    profile = getattr(user, 'userprofile', None)
+    if profile is None:
+        return None
+    if profile.role == 'farmer' and hasattr(profile, 'farmerprofile'):
+        return Q(farmer_id=profile.farmerprofile.id)
+    if profile.role == 'company' and hasattr(profile, 'companyprofile'):
+        return Q(resource='listing') | Q(company_id=profile.companyprofile.id)
+    return None
+
+
+def _compact(entries):
+    """The last entry per object, in feed order."""
+    latest = {}
+    for entry in entries:
+        key = (entry.resource, entry.object_id)
+        latest.pop(key, None)
+        latest[key] = entry
+    return list(latest.values())
+
+
+def serialize(entry):
+    return {
+        'seq': entry.id,
+        'type': entry.resource,
+        'id': entry.object_id,
+        'action': entry.action,
+        'version': entry.version,
+        'data': entry.data,
+    }
+
+
+def read_changes(visible, since=None, limit=None):
+    """
+    One page of the feed after the cursor ``since``, as (entries, next_cursor,
+    has_more). Without ``since`` the page is empty and the cursor points at
+    the current end of the log: download the listings, then follow from it.
+    Raises CursorExpired for cursors past retention, ValueError for bad ones.
+    """
+    now = timezone.now()
+    settled = now - timedelta(seconds=settings.CHANGE_FEED_SETTLE)
+    if since is None:
+        head = ChangeLogEntry.objects.filter(created_at__lte=settled).aggregate(head=Max('id'))['head']
+        return [], encode_cursor(head or 0, settled), False
+
+    after_id, at = decode_cursor(since)
+    if at < now - timedelta(days=settings.CHANGE_LOG_RETENTION_DAYS):
+        raise CursorExpired(since)
+    limit = limit or settings.CHANGE_FEED_PAGE_SIZE
+    entries = ChangeLogEntry.objects.filter(visible, id__gt=after_id).order_by('id')[:limit + 1]
+    ready = list(takewhile(lambda entry: entry.created_at <= settled, entries))
+    has_more = len(ready) > limit
+    page = ready[:limit]
+    last_id = page[-1].id if page else after_id
+    # Caught up: every entry committed before ``settled`` has been read
+    next_cursor = encode_cursor(last_id, page[-1].created_at if has_more else settled)
+    return _compact(page), next_cursor, has_more
+
+
+def compact_changes(retention_days=None, batch_size=None):
+    """
+    Delete entries older than ``retention_days`` (CHANGE_LOG_RETENTION_DAYS by
+    default), then entries superseded by a later one for the same object, in
+    batches of ``batch_size``. Returns {'expired': n, 'superseded': n}.
+    """
+    days = settings.CHANGE_LOG_RETENTION_DAYS if retention_days is None else retention_days
+    batch_size = batch_size or settings.CHANGE_LOG_BATCH_SIZE
+    newer = ChangeLogEntry.objects.filter(
+        resource=OuterRef('resource'), object_id=OuterRef('object_id'), id__gt=OuterRef('id')
+    )
+    deleted = {}
+    for name, queryset in (
+        ('expired', ChangeLogEntry.objects.filter(created_at__lt=timezone.now() - timedelta(days=days))),
+        ('superseded', ChangeLogEntry.objects.filter(Exists(newer))),
+    ):
+        deleted[name] = 0
+        last_id = 0
+        while True:
+            ids = list(queryset.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            last_id = ids[-1]
+            deleted[name] += ChangeLogEntry.objects.filter(id__in=ids).delete()[0]
+    return deleted
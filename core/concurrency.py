@@ -0,0 +1,60 @@
+"""
+Optimistic concurrency for listings, orders and bargains.
+
+Models built on ``VersionedModel`` (core.models) carry a ``version`` column.
+Every update is a compare-and-swap: ``UPDATE ... SET version = n + 1 WHERE
+id = ... AND version = n``. When another request saved the row first the
+UPDATE matches nothing and ``VersionConflict`` is raised instead of silently
+overwriting that change. Saves with ``update_fields`` write only those
+columns (plus ``version`` and ``updated_at``).
+
+Two ways to handle a conflict:
+
+* Edits a person made from a form: put the version they saw in the form
+  (``{{ object.version }}`` as a hidden ``version`` input), apply it with
+  ``expect_version`` and tell them to review the latest data on conflict.
+* Automatic state changes: re-read the row and try again with
+  ``retry_on_conflict``.
+"""
+import random
+import time
+
+
+class VersionConflict(Exception):
+    """The row was changed by someone else since this instance was loaded."""
+
+    def __init__(self, instance, expected):
+        self.instance = instance
+        self.expected = expected
+        super().__init__(
+            f'{type(instance).__name__} #{instance.pk} was changed since version {expected}'
+        )
+
+
+def expect_version(instance, value):
+    """
+    Make the next save of ``instance`` succeed only if the row is still at
+    ``value`` (e.g. the version rendered into a form). Missing or malformed
+    values leave the loaded version in place.
+    """
+    try:
+        instance.version = int(value)
+    except (TypeError, ValueError):
+        pass
+    return instance
+
+
+def retry_on_conflict(func, *args, attempts=3, backoff=0.02, **kwargs):
+    """
+    Call ``func(*args, **kwargs)``, calling it again after a short randomized
+    pause whenever it raises VersionConflict. ``func`` must load the rows it
+    changes itself, so every attempt starts from fresh data. The last
+    conflict is re-raised.
+    """
+    for attempt in range(attempts):
+        try:
+            return func(*args, **kwargs)
+        except VersionConflict:
+            if attempt == attempts - 1:
+                raise
+            time.sleep(backoff * (2 ** attempt) * (0.5 + random.random()))
@@ -0,0 +1,275 @@
+"""
+Denormalized dashboard counters.
+
+Listing, order and account totals live in the ``Counter`` table and are kept
+current by the receivers in core.signals: every save or delete turns the old
+and new row state into a set of (scope, owner, name) deltas which are applied
+with ``F()`` increments in the same transaction as the write. Dashboards then
+read a handful of rows instead of counting and summing whole tables.
+
+Writes that bypass model signals (``bulk_create``, ``QuerySet.update``, raw
+SQL) leave the counters behind; ``reconcile_counters`` recomputes them from
+the source tables and fixes any drift. Archived orders and listings
+(core.archive) still count: the move runs under ``suspended()`` and
+``compute_counters`` reads the archive tables too. Counters live on
+``default`` and count the rows of every shard (core.shards); a write on
+another shard updates them in a separate transaction there.
+"""
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from decimal import Decimal
+from typing import NamedTuple
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from .models import (
+    Counter, FarmerProfile, CompanyProfile, WasteProduct, Order, ArchivedWasteProduct, ArchivedOrder
+)
+
+LISTING_FIELDS = ('status', 'farmer_id', 'quantity')
+ORDER_FIELDS = ('status', 'company_id', 'waste_product_id', 'quantity_ordered', 'total_price')
+
+OPEN_ORDER_STATUSES = ('pending_admin', 'sent_to_farmer', 'accepted_by_farmer')
+SOLD_ORDER_STATUSES = ('approved_by_admin', 'completed')
+
+ZERO = Decimal('0')
+
+_suspended = ContextVar('counters_suspended', default=False)
+
+
+class Stat(NamedTuple):
+    count: int
+    amount: Decimal
+
+
+def _add(deltas, scope, owner_id, name, count, amount, sign=1):
+    entry = deltas[(scope, owner_id, name)]
+    entry[0] += sign * count
+    entry[1] += sign * Decimal(str(amount or 0))
+
+
+def listing_deltas(deltas, state, sign=1, count=1):
+    """Counters touched by a listing (or a group of ``count`` listings) in ``state``."""
+    status, farmer_id, quantity = state['status'], state['farmer_id'], state['quantity']
+    for scope, owner_id in (('global', 0), ('farmer', farmer_id)):
+        _add(deltas, scope, owner_id, 'listings', count, quantity, sign)
+        _add(deltas, scope, owner_id, f'listings:{status}', count, quantity, sign)
+
+
+def order_deltas(deltas, state, farmer_id, sign=1, count=1, tons=None):
+    """
+    Counters touched by an order in ``state``. Amounts are rupees, except
+    ``sold_tons`` which sums the ordered quantity.
+    """
+    status, company_id, total = state['status'], state['company_id'], state['total_price']
+    tons = state['quantity_ordered'] if tons is None else tons
+    for scope, owner_id in (('global', 0), ('company', company_id), ('farmer', farmer_id)):
+        _add(deltas, scope, owner_id, 'orders', count, total, sign)
+        _add(deltas, scope, owner_id, f'orders:{status}', count, total, sign)
+    if status in SOLD_ORDER_STATUSES:
+        _add(deltas, 'company', company_id, 'spend', count, total, sign)
+        for scope, owner_id in (('global', 0), ('farmer', farmer_id)):
+            _add(deltas, scope, owner_id, 'revenue', count, total, sign)
+            _add(deltas, scope, owner_id, 'sold_tons', count, tons, sign)
+
+
+def apply_deltas(deltas):
+    """Apply non-zero deltas as one ``UPDATE ... SET count = count + n`` per counter."""
+    with transaction.atomic():
+        for (scope, owner_id, name), (count, amount) in sorted(deltas.items()):
+            if not count and not amount:
+                continue
+            counter = Counter.objects.filter(scope=scope, owner_id=owner_id, name=name)
+            if counter.update(count=F('count') + count, amount=F('amount') + amount):
+                continue
+            try:
+                with transaction.atomic():
+                    Counter.objects.create(scope=scope, owner_id=owner_id, name=name, count=count, amount=amount)
+            except IntegrityError:
+                # Another transaction created the row first
+                counter.update(count=F('count') + count, amount=F('amount') + amount)
+
+
+@contextmanager
+def suspended():
+    """Leave the counters alone for saves and deletes inside the block, e.g. rows moved to the archive."""
+    token = _suspended.set(True)
+    try:
+        yield
+    finally:
+        _suspended.reset(token)
+
+
+def new_deltas():
+    return defaultdict(lambda: [0, ZERO])
+
+
+def _state(instance, fields):
+    return {name: getattr(instance, name) for name in fields}
+
+
+def _order_farmer_id(order):
+    cached = order._state.fields_cache.get('waste_product')
+    if cached is not None and cached.pk == order.waste_product_id:
+        return cached.farmer_id
+    return WasteProduct._base_manager.using(order._state.db).filter(
+        pk=order.waste_product_id
+    ).values_list('farmer_id', flat=True).first()
+
+
+def _tracks(sender, update_fields):
+    fields = LISTING_FIELDS if sender is WasteProduct else ORDER_FIELDS
+    return update_fields is None or any(
+        sender._meta.get_field(name).name in update_fields or name in update_fields for name in fields
+    )
+
+
+def remember_previous_state(sender, instance, raw=False, using=DEFAULT_DB_ALIAS, update_fields=None, **kwargs):
+    """pre_save receiver: read the row as stored, locking it for the rest of the transaction."""
+    instance._counter_previous = None
+    if raw or _suspended.get() or instance._state.adding or instance.pk is None or not _tracks(sender, update_fields):
+        return
+    fields = LISTING_FIELDS if sender is WasteProduct else ORDER_FIELDS
+    queryset = sender._base_manager.using(using).filter(pk=instance.pk)
+    if transaction.get_connection(using).in_atomic_block:
+        queryset = queryset.select_for_update()
+    instance._counter_previous = queryset.values(*fields).first()
+
+
+def count_saved(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """post_save receiver for WasteProduct and Order."""
+    previous = getattr(instance, '_counter_previous', None)
+    instance._counter_previous = None
+    if raw or _suspended.get() or (not created and previous is None):
+        return
+    deltas = new_deltas()
+    if sender is WasteProduct:
+        listing_deltas(deltas, _state(instance, LISTING_FIELDS))
+        if previous:
+            listing_deltas(deltas, previous, sign=-1)
+    else:
+        farmer_id = _order_farmer_id(instance)
+        order_deltas(deltas, _state(instance, ORDER_FIELDS), farmer_id)
+        if previous:
+            previous_farmer_id = farmer_id
+            if previous['waste_product_id'] != instance.waste_product_id:
+                previous_farmer_id = WasteProduct._base_manager.using(instance._state.db).filter(
+                    pk=previous['waste_product_id']
+                ).values_list('farmer_id', flat=True).first()
+            order_deltas(deltas, previous, previous_farmer_id, sign=-1)
+    apply_deltas(deltas)
+
+
+def count_deleted(sender, instance, **kwargs):
+    """post_delete receiver for WasteProduct and Order."""
+    if _suspended.get():
+        return
+    deltas = new_deltas()
+    if sender is WasteProduct:
+        listing_deltas(deltas, _state(instance, LISTING_FIELDS), sign=-1)
+    else:
+        order_deltas(deltas, _state(instance, ORDER_FIELDS), _order_farmer_id(instance), sign=-1)
+    apply_deltas(deltas)
+
+
+ACCOUNT_COUNTERS = {User: 'users', FarmerProfile: 'farmers', CompanyProfile: 'companies'}
+PROFILE_SCOPES = {FarmerProfile: 'farmer', CompanyProfile: 'company'}
+
+
+def count_account_created(sender, instance, created, raw=False, using=DEFAULT_DB_ALIAS, **kwargs):
+    """post_save receiver for User, FarmerProfile and CompanyProfile. Copies on other shards do not count."""
+    if created and not raw and using == DEFAULT_DB_ALIAS:
+        apply_deltas({('global', 0, ACCOUNT_COUNTERS[sender]): [1, ZERO]})
+
+
+def count_account_deleted(sender, instance, using=DEFAULT_DB_ALIAS, **kwargs):
+    """post_delete receiver for User, FarmerProfile and CompanyProfile."""
+    if using != DEFAULT_DB_ALIAS:
+        return
+    with transaction.atomic():
+        apply_deltas({('global', 0, ACCOUNT_COUNTERS[sender]): [-1, ZERO]})
+        if sender in PROFILE_SCOPES:
+            Counter.objects.filter(scope=PROFILE_SCOPES[sender], owner_id=instance.pk).delete()
+
+
+def compute_counters():
+    """Recompute every counter from the source tables with grouped aggregates, over every shard."""
+    from . import shards
+    deltas = new_deltas()
+    for sender, name in ACCOUNT_COUNTERS.items():
+        _add(deltas, 'global', 0, name, sender._base_manager.count(), ZERO)
+
+    for model in (WasteProduct, ArchivedWasteProduct):
+        listings = shards.grouped(
+            model._base_manager.all(), 'status', 'farmer_id', rows=Count('id'), tons=Sum('quantity')
+        )
+        for row in listings:
+            listing_deltas(deltas, {**row, 'quantity': row['tons']}, count=row['rows'])
+
+    for model, farmer in ((Order, 'waste_product__farmer_id'), (ArchivedOrder, 'farmer_id')):
+        orders = shards.grouped(
+            model._base_manager.all(), 'status', 'company_id', farmer,
+            rows=Count('id'), total=Sum('total_price'), tons=Sum('quantity_ordered')
+        )
+        for row in orders:
+            order_deltas(
+                deltas, {**row, 'total_price': row['total']}, row[farmer],
+                count=row['rows'], tons=row['tons']
+            )
+    return {key: Stat(count, amount) for key, (count, amount) in deltas.items() if count or amount}
+
+
+def reconcile_counters(dry_run=False):
+    """
+    Bring the Counter table in line with the source tables.
+    Returns a list of (key, stored, expected) for every counter that had drifted.
+    """
+    with transaction.atomic():
+        expected = compute_counters()
+        stored = {
+            (c.scope, c.owner_id, c.name): c
+            for c in Counter.objects.select_for_update()
+        }
+        drift = []
+        for key in sorted(set(expected) | set(stored)):
+            want = expected.get(key, Stat(0, ZERO))
+            row = stored.get(key)
+            have = Stat(row.count, row.amount) if row else Stat(0, ZERO)
+            if have != want:
+                drift.append((key, have, want))
+        if dry_run or not drift:
+            return drift
+
+        stale = [stored[key].pk for key, _, want in drift if key in stored and key not in expected]
+        Counter.objects.filter(pk__in=stale).delete()
+        changed = []
+        for key, _, want in drift:
+            if key not in expected:
+                continue
+            row = stored.get(key) or Counter(scope=key[0], owner_id=key[1], name=key[2])
+            row.count, row.amount = want
+            changed.append(row)
+        Counter.objects.bulk_create(
+            [row for row in changed if row.pk is None], batch_size=500
+        )
+        Counter.objects.bulk_update(
+            [row for row in changed if row.pk is not None], ['count', 'amount'], batch_size=500
+        )
+    return drift
+
+
+def read_counters(scope='global', owner_id=0):
+    """
+    All counters for one scope as {name: Stat}. Missing names read as zero, so
+    templates can use ``stats.orders.count`` without checking.
+    """
+    stats = defaultdict(lambda: Stat(0, ZERO))
+    rows = Counter.objects.filter(scope=scope, owner_id=owner_id).values_list('name', 'count', 'amount')
+    for name, count, amount in rows:
+        stats[name] = Stat(count, amount)
+    return stats
+
+
+def sum_stats(stats, names):
+    return Stat(sum(stats[name].count for name in names), sum((stats[name].amount for name in names), ZERO))
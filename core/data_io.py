@@ -0,0 +1,257 @@
+"""
+Streaming CSV/JSONL export and chunked bulk import for marketplace data.
+
+Exports read rows with ``values_list().iterator(chunk_size=...)`` and yield one
+encoded line at a time, so memory stays constant regardless of table size;
+the shards (core.shards) are read side by side and merged in id order.
+Imports validate every row with the model fields' own validators and insert
+valid rows with ``bulk_create`` one chunk per transaction and shard: listings
+go to their farmer's shard, orders and bargains to their listing's.
+"""
+import csv
+import heapq
+import json
+from operator import itemgetter
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DEFAULT_DB_ALIAS, transaction
+from . import changes, shards
+from .jobs import enqueue
+from .tasks import rebuild_counters
+from .models import FarmerProfile, CompanyProfile, WasteProduct, Order, PriceBargain
+
+EXPORT_CHUNK_SIZE = 2000
+IMPORT_CHUNK_SIZE = 2000
+FORMATS = ('csv', 'jsonl')
+
+EXPORT_FIELDS = {
+    'waste_products': (WasteProduct, [
+        'id', 'farmer_id', 'crop_name', 'quantity', 'admin_price_per_ton', 'farmer_price_per_ton',
+        'location', 'description', 'status', 'created_at', 'updated_at',
+    ]),
+    'orders': (Order, [
+        'id', 'company_id', 'waste_product_id', 'quantity_ordered', 'company_price_per_ton',
+        'total_price', 'status', 'notes', 'admin_notes', 'created_at', 'updated_at',
+    ]),
+    'bargains': (PriceBargain, [
+        'id', 'waste_product_id', 'farmer_proposed_price', 'admin_counter_price',
+        'farmer_message', 'admin_message', 'status', 'created_at', 'updated_at',
+    ]),
+}
+
+# Columns accepted on import. Ids and timestamps are always assigned on insert.
+IMPORT_FIELDS = {
+    'waste_products': [
+        'farmer', 'crop_name', 'quantity', 'admin_price_per_ton', 'farmer_price_per_ton',
+        'location', 'description', 'status',
+    ],
+    'orders': [
+        'company', 'waste_product', 'quantity_ordered', 'company_price_per_ton',
+        'total_price', 'status', 'notes', 'admin_notes',
+    ],
+    'bargains': [
+        'waste_product', 'farmer_proposed_price', 'admin_counter_price',
+        'farmer_message', 'admin_message', 'status',
+    ],
+}
+
+# Columns that may be left empty because they are derived from other columns.
+COMPUTED_FIELDS = {
+    'orders': {'total_price'},
+}
+
+FOREIGN_KEYS = {
+    'farmer': FarmerProfile,
+    'company': CompanyProfile,
+    'waste_product': WasteProduct,
+}
+
+
+class Echo:
+    """File-like object whose write() just returns the value, for csv.writer streaming."""
+    def write(self, value):
+        return value
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def export_rows(dataset, chunk_size=EXPORT_CHUNK_SIZE):
+    model, fields = EXPORT_FIELDS[dataset]
+    queryset = model.objects.order_by('id').values_list(*fields)
+    per_shard = [queryset.using(alias).iterator(chunk_size=chunk_size) for alias in shards.aliases()]
+    # Every dataset starts with id
+    return fields, heapq.merge(*per_shard, key=itemgetter(0))
+
+
+def stream_csv(dataset, chunk_size=EXPORT_CHUNK_SIZE):
+    fields, rows = export_rows(dataset, chunk_size)
+    writer = csv.writer(Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow([_csv_value(value) for value in row])
+
+
+def stream_jsonl(dataset, chunk_size=EXPORT_CHUNK_SIZE):
+    fields, rows = export_rows(dataset, chunk_size)
+    encoder = DjangoJSONEncoder()
+    for row in rows:
+        yield encoder.encode(dict(zip(fields, row))) + '\n'
+
+
+def stream_export(dataset, fmt, chunk_size=EXPORT_CHUNK_SIZE):
+    if fmt == 'jsonl':
+        return stream_jsonl(dataset, chunk_size)
+    return stream_csv(dataset, chunk_size)
+
+
+def read_rows(fileobj, fmt):
+    """Yield (line_number, dict) pairs from a text file object."""
+    if fmt == 'jsonl':
+        for line_number, line in enumerate(fileobj, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield line_number, json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_number, e
+    else:
+        reader = csv.DictReader(fileobj)
+        for line_number, row in enumerate(reader, start=2):
+            yield line_number, row
+
+
+class BulkImporter:
+    """
+    Validate rows with the model field validators and insert them in chunks.
+    Invalid rows are skipped and reported in ``errors`` as (line, message) pairs.
+    """
+
+    def __init__(self, dataset, chunk_size=IMPORT_CHUNK_SIZE):
+        self.dataset = dataset
+        self.model = EXPORT_FIELDS[dataset][0]
+        self.field_names = IMPORT_FIELDS[dataset]
+        self.fields = [self.model._meta.get_field(name) for name in self.field_names]
+        self.computed = COMPUTED_FIELDS.get(dataset, set())
+        self.chunk_size = chunk_size
+        self.imported = 0
+        self.errors = []
+
+    def run(self, rows):
+        chunk = []
+        for line_number, row in rows:
+            chunk.append((line_number, row))
+            if len(chunk) >= self.chunk_size:
+                self._import_chunk(chunk)
+                chunk = []
+        if chunk:
+            self._import_chunk(chunk)
+        if self.imported:
+            # bulk_create skips the signals that maintain the dashboard counters
+            enqueue(rebuild_counters)
+        return self
+
+    def _import_chunk(self, chunk):
+        objects = []
+        for line_number, row in chunk:
+            if isinstance(row, Exception):
+                self.errors.append((line_number, f'Invalid JSON: {row}'))
+                continue
+            try:
+                objects.append((line_number, self._build(row)))
+            except ValidationError as e:
+                self.errors.append((line_number, '; '.join(
+                    f'{field}: {" ".join(messages)}' for field, messages in e.message_dict.items()
+                )))
+
+        objects, located = self._check_foreign_keys(objects)
+        for alias, rows in self._by_shard([obj for _, obj in objects], located).items():
+            # bulk_create skips save(), which numbers new rows across shards
+            shards.assign_ids(rows)
+            with transaction.atomic(using=alias):
+                self.model.objects.using(alias).bulk_create(rows, batch_size=self.chunk_size)
+                changes.record_created(rows, using=alias)
+            self.imported += len(rows)
+
+    def _build(self, row):
+        values = {}
+        errors = {}
+        instance = self.model()
+        for field in self.fields:
+            raw = row.get(field.attname, row.get(field.name))
+            if raw == '':
+                raw = None
+            if raw is None and field.name in self.computed:
+                continue
+            if raw is None and not field.null and field.has_default():
+                raw = field.get_default()
+            if raw is None and field.empty_strings_allowed and not field.null:
+                raw = ''
+            try:
+                if field.is_relation:
+                    if raw is None:
+                        raise ValidationError('This field cannot be null.')
+                    values[field.attname] = int(raw)
+                else:
+                    values[field.attname] = field.clean(raw, instance)
+            except (TypeError, ValueError):
+                errors[field.name] = ['Enter a valid id.']
+            except ValidationError as e:
+                errors[field.name] = e.messages
+        if errors:
+            raise ValidationError(errors)
+
+        if self.model is Order and values.get('total_price') is None:
+            values['total_price'] = values['quantity_ordered'] * values['company_price_per_ton']
+        return self.model(**values)
+
+    def _check_foreign_keys(self, objects):
+        """
+        Drop rows pointing at missing farmers/companies/listings with one query
+        per relation and shard. Returns (rows, {relation: {id: shard holding it}}).
+        """
+        located = {}
+        for field in self.fields:
+            if not field.is_relation:
+                continue
+            wanted = {getattr(obj, field.attname) for _, obj in objects}
+            existing = located[field.name] = _locate(FOREIGN_KEYS[field.name], wanted)
+            valid = []
+            for line_number, obj in objects:
+                if getattr(obj, field.attname) in existing:
+                    valid.append((line_number, obj))
+                else:
+                    self.errors.append((line_number, f'{field.name}: No record with id {getattr(obj, field.attname)}.'))
+            objects = valid
+        return objects, located
+
+    def _by_shard(self, objects, located):
+        """{shard: new rows} for rows that passed the checks."""
+        if self.model is WasteProduct:
+            regions = dict(
+                FarmerProfile.objects.filter(id__in={obj.farmer_id for obj in objects}).values_list('id', 'region')
+            )
+            shard = lambda obj: shards.for_region(regions[obj.farmer_id])
+        else:
+            shard = lambda obj: located['waste_product'][obj.waste_product_id]
+        groups = {}
+        for obj in objects:
+            groups.setdefault(shard(obj), []).append(obj)
+        return groups
+
+
+def _locate(model, ids):
+    """{id: shard} for the rows of ``model`` with these ids. Profiles live on default."""
+    if model._meta.label_lower not in shards.SHARDED:
+        return dict.fromkeys(model.objects.filter(id__in=ids).values_list('id', flat=True), DEFAULT_DB_ALIAS)
+    found = shards.each_shard(lambda alias: list(model.objects.using(alias).filter(id__in=ids).values_list('id', flat=True)))
+    located = {}
+    for alias, pks in zip(shards.aliases(), found):
+        located.update(dict.fromkeys(pks, alias))
+    return located
@@ -1,16 +1,68 @@
 from django import forms
+from django.conf import settings
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
-from .models import WasteProduct, Order, UserProfile
+from django.db.models import Value
+from .models import WasteProduct, Order, UserProfile, FarmerProfile, CompanyProfile
+from .validators import validate_phone, validate_registration_number
 
-class UserRegistrationForm(UserCreationForm):
+# (form class, prerender key, prefix, auto_id, field name) -> widget HTML
+_prerendered = {}
+
+
+def _renders_value(widget):
+    if isinstance(widget, forms.ClearableFileInput):
+        return True
+    if isinstance(widget, (forms.FileInput, forms.PasswordInput)):
+        return getattr(widget, 'render_value', False)
+    return True
+
+
+class PrerenderedBoundField(forms.BoundField):
+    def as_widget(self, widget=None, attrs=None, only_initial=False):
+        form = self.form
+        key = form.prerender_key()
+        if (
+            widget or attrs or only_initial or key is None or form.is_bound
+            or not settings.PRERENDER_FORM_FIELDS
+            or (_renders_value(self.field.widget) and self.value() not in (None, ''))
+        ):
+            return super().as_widget(widget, attrs, only_initial)
+        key = (type(form), key, form.prefix, form.auto_id, form.use_required_attribute, self.name)
+        html = _prerendered.get(key)
+        if html is None:
+            html = _prerendered[key] = super().as_widget()
+        return html
+
+
+class PrerenderedFieldsMixin:
+    """
+    Renders the widgets of the fields in ``prerendered_fields`` once per
+    process while the form is unbound and they have no initial value, since
+    their HTML is then the same on every request. Subclasses whose widgets
+    depend on constructor arguments fold those into ``prerender_key()``, or
+    return None from it to render normally.
+    """
+    prerendered_fields = ()
+
+    def prerender_key(self):
+        return ()
+
+    def __getitem__(self, name):
+        if name in self.prerendered_fields and name in self.fields and name not in self._bound_fields_cache:
+            self._bound_fields_cache[name] = PrerenderedBoundField(self, self.fields[name], name)
+        return super().__getitem__(name)
+
+
+class UserRegistrationForm(PrerenderedFieldsMixin, UserCreationForm):
     email = forms.EmailField(required=True, widget=forms.EmailInput(attrs={'class': 'form-control'}))
     first_name = forms.CharField(max_length=30, required=True, widget=forms.TextInput(attrs={'class': 'form-control'}))
     last_name = forms.CharField(max_length=30, required=True, widget=forms.TextInput(attrs={'class': 'form-control'}))
     phone = forms.CharField(
         max_length=15, 
         required=True, 
+        validators=[validate_phone],
         widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'e.g., +1234567890 or 1234567890'}),
         help_text="Phone number must be 10-15 digits, optionally starting with +"
     )
@@ -25,11 +77,27 @@ class UserRegistrationForm(UserCreationForm):
         help_text="Farm size in acres (for farmers only)",
         widget=forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01'})
     )
+    region = forms.ChoiceField(
+        choices=[('', 'Select state or union territory')] + FarmerProfile.REGION_CHOICES,
+        required=False,
+        help_text="State or union territory of the farm (for farmers only)",
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
     
     # Company specific fields
     company_name = forms.CharField(max_length=200, required=False, widget=forms.TextInput(attrs={'class': 'form-control'}))
     registration_number = forms.CharField(max_length=50, required=False, widget=forms.TextInput(attrs={'class': 'form-control'}))
     
+    TAKEN_MESSAGES = {
+        'username': 'A user with that username already exists.',
+        'email': 'Email already exists',
+        'registration_number': 'Company profile with this Registration number already exists.',
+    }
+    prerendered_fields = (
+        'username', 'first_name', 'last_name', 'email', 'phone', 'address', 'farm_size', 'region',
+        'company_name', 'registration_number', 'password1', 'password2',
+    )
+    
     class Meta:
         model = User
         fields = ('username', 'first_name', 'last_name', 'email', 'password1', 'password2')
@@ -50,27 +118,46 @@ class UserRegistrationForm(UserCreationForm):
         elif self.user_type == 'company':
             self.fields['company_name'].required = True
             self.fields['registration_number'].required = True
+            self.fields['registration_number'].validators.append(validate_registration_number)
     
-    def clean_email(self):
+    def prerender_key(self):
+        # Which fields are required depends on the account type
+        return (self.user_type,)
+    
+    def clean_username(self):
+        # Checked together with email and registration number in clean()
+        return self.cleaned_data.get('username')
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        self.check_taken()
+        return cleaned_data
+    
+    def check_taken(self):
+        """Look up username, email and registration number collisions in one UNION query."""
+        username = self.cleaned_data.get('username')
         email = self.cleaned_data.get('email')
-        if User.objects.filter(email=email).exists():
-            raise ValidationError("Email already exists")
-        return email
-    
-    def clean_phone(self):
-        phone = self.cleaned_data.get('phone')
-        import re
-        if not re.match(r'^[+]?[0-9]{10,15}$', phone):
-            raise ValidationError("Phone number must be 10-15 digits, optionally starting with +")
-        return phone
-    
-    def clean_registration_number(self):
-        registration_number = self.cleaned_data.get('registration_number')
-        if self.user_type == 'company' and registration_number:
-            import re
-            if not re.match(r'^[A-Z0-9]{6,20}$', registration_number):
-                raise ValidationError("Registration number must be 6-20 characters, alphanumeric uppercase only")
-        return registration_number
+        registration_number = self.cleaned_data.get('registration_number') if self.user_type == 'company' else None
+        lookups = []
+        if username:
+            lookups.append(User.objects.filter(username__iexact=username).values_list(Value('username')))
+        if email:
+            lookups.append(User.objects.filter(email=email).values_list(Value('email')))
+        if registration_number:
+            lookups.append(
+                CompanyProfile.objects.filter(registration_number=registration_number)
+                .values_list(Value('registration_number'))
+            )
+        if not lookups:
+            return
+        taken = lookups[0].union(*lookups[1:], all=True) if len(lookups) > 1 else lookups[0]
+        for (field,) in taken:
+            self.add_error(field, self.TAKEN_MESSAGES[field])
+    
+    def validate_unique(self):
+        # Username uniqueness is covered by check_taken(); the database
+        # constraint still catches a concurrent signup with the same name.
+        pass
     
     def save(self, commit=True):
         user = super().save(commit=False)
@@ -81,7 +168,9 @@ class UserRegistrationForm(UserCreationForm):
             user.save()
         return user
 
-class WasteProductForm(forms.ModelForm):
+class WasteProductForm(PrerenderedFieldsMixin, forms.ModelForm):
+    prerendered_fields = ('crop_name', 'quantity', 'farmer_price_per_ton', 'location', 'description', 'photo')
+    
     class Meta:
         model = WasteProduct
         fields = ['crop_name', 'quantity', 'farmer_price_per_ton', 'location', 'description', 'photo']
@@ -102,7 +191,9 @@ class WasteProductForm(forms.ModelForm):
             'photo': 'Product Photo',
         }
 
-class OrderForm(forms.ModelForm):
+class OrderForm(PrerenderedFieldsMixin, forms.ModelForm):
+    prerendered_fields = ('quantity_ordered', 'company_price_per_ton', 'notes')
+    
     class Meta:
         model = Order
         fields = ['quantity_ordered', 'company_price_per_ton', 'notes']
@@ -135,13 +226,17 @@ class OrderForm(forms.ModelForm):
         if self.waste_product:
             self.fields['quantity_ordered'].widget.attrs['max'] = str(self.waste_product.quantity)
     
+    def prerender_key(self):
+        # The quantity limit differs per listing
+        return None if self.waste_product else ()
+    
     def clean_quantity_ordered(self):
         quantity = self.cleaned_data.get('quantity_ordered')
         if self.waste_product and quantity > self.waste_product.quantity:
             raise ValidationError(f"Quantity cannot exceed available stock ({self.waste_product.quantity} tons)")
         return quantity
 
-class ProfileUpdateForm(forms.ModelForm):
+class ProfileUpdateForm(PrerenderedFieldsMixin, forms.ModelForm):
     first_name = forms.CharField(max_length=30, required=True, widget=forms.TextInput(attrs={'class': 'form-control'}))
     last_name = forms.CharField(max_length=30, required=True, widget=forms.TextInput(attrs={'class': 'form-control'}))
     email = forms.EmailField(required=True, widget=forms.EmailInput(attrs={'class': 'form-control'}))
@@ -154,10 +249,18 @@ class ProfileUpdateForm(forms.ModelForm):
         min_value=0.01,
         widget=forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01'})
     )
+    region = forms.ChoiceField(
+        choices=[('', 'Select state or union territory')] + FarmerProfile.REGION_CHOICES,
+        required=False,
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
     
     # Company specific field
     company_name = forms.CharField(max_length=200, required=False, widget=forms.TextInput(attrs={'class': 'form-control'}))
     
+    # The other fields always show the user's current values
+    prerendered_fields = ('profile_photo',)
+    
     class Meta:
         model = UserProfile
         fields = ['phone', 'address', 'profile_photo']
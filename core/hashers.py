@@ -0,0 +1,20 @@
+"""
+Password hasher whose work factor comes from settings.
+
+Django only changes PBKDF2 iterations between releases. Reading them from
+``PASSWORD_HASH_ITERATIONS`` lets a deployment size hashing cost for signup
+bursts against its CPU budget. Existing hashes keep verifying at whatever
+count they were created with and are re-hashed at the configured count on the
+user's next login (``must_update``).
+"""
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+
+class TunablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    # Same algorithm name as Django's hasher, so stored hashes stay interchangeable
+    algorithm = 'pbkdf2_sha256'
+
+    @property
+    def iterations(self):
+        return getattr(settings, 'PASSWORD_HASH_ITERATIONS', PBKDF2PasswordHasher.iterations)
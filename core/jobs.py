@@ -0,0 +1,142 @@
+"""
+Database-backed background jobs.
+
+Functions decorated with ``@task`` can be queued from views with ``enqueue``;
+the job row is written in the caller's transaction, so it only becomes visible
+if the surrounding change commits. ``python manage.py run_workers`` starts a
+pool of worker processes per queue (``JOB_QUEUES`` maps queue name to
+concurrency) that claim due jobs with a conditional UPDATE.
+
+Failed jobs are retried with exponential backoff and jitter until
+``max_attempts`` is reached. An ``idempotency_key`` makes enqueueing the same
+logical job twice a no-op for as long as the first job's row is kept.
+"""
+import random
+import traceback
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import Job
+import logging
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+
+
+def task(name=None, queue='default', max_attempts=5):
+    """Register a function as a job task. Arguments must be JSON-serializable keywords."""
+    def decorator(func):
+        func.task_name = name or f'{func.__module__}.{func.__name__}'
+        func.queue = queue
+        func.max_attempts = max_attempts
+        TASKS[func.task_name] = func
+        return func
+    return decorator
+
+
+def enqueue(func, idempotency_key=None, delay=0, queue=None, **payload):
+    """
+    Queue ``func(**payload)``. Returns the Job, or the existing job with the
+    same ``idempotency_key``.
+    """
+    fields = {
+        'task': func.task_name,
+        'queue': queue or func.queue,
+        'payload': payload,
+        'max_attempts': func.max_attempts,
+        'run_at': timezone.now() + timedelta(seconds=delay),
+    }
+    if idempotency_key is None:
+        return Job.objects.create(**fields)
+
+    existing = Job.objects.filter(idempotency_key=idempotency_key).first()
+    if existing is not None:
+        return existing
+    try:
+        with transaction.atomic():
+            return Job.objects.create(idempotency_key=idempotency_key, **fields)
+    except IntegrityError:
+        return Job.objects.get(idempotency_key=idempotency_key)
+
+
+def queue_limits():
+    return getattr(settings, 'JOB_QUEUES', {'default': 1})
+
+
+def backoff_seconds(attempts):
+    """Exponential backoff with jitter: base * 2^(n-1), capped, scaled by 0.5-1.0."""
+    base = getattr(settings, 'JOB_BACKOFF_BASE', 10)
+    cap = getattr(settings, 'JOB_BACKOFF_MAX', 3600)
+    return min(base * 2 ** (attempts - 1), cap) * random.uniform(0.5, 1.0)
+
+
+def claim_job(queue, worker_id, candidates=5):
+    """
+    Mark the next due job in ``queue`` as running and return it, or None.
+
+    Claiming is a compare-and-set ``UPDATE ... WHERE status = 'pending'`` on one
+    of the oldest due jobs, so two workers can never run the same job and no
+    read-then-write transaction is needed (SQLite cannot upgrade those under
+    contention). The running-job count also caps a queue at its JOB_QUEUES
+    limit when several ``run_workers`` instances serve it; that check takes no
+    lock, so concurrent hosts can briefly overshoot the limit by a job or two.
+    """
+    limit = queue_limits().get(queue, 1)
+    if Job.objects.filter(queue=queue, status='running').count() >= limit:
+        return None
+    now = timezone.now()
+    due = Job.objects.filter(queue=queue, status='pending', run_at__lte=now).order_by('run_at', 'id')
+    for job_id in due.values_list('id', flat=True)[:candidates]:
+        claimed = Job.objects.filter(id=job_id, status='pending').update(
+            status='running', attempts=F('attempts') + 1, locked_at=now, locked_by=worker_id
+        )
+        if claimed:
+            return Job.objects.get(id=job_id)
+    return None
+
+
+def run_job(job):
+    """Execute a claimed job and record the outcome. Returns True on success."""
+    func = TASKS.get(job.task)
+    try:
+        if func is None:
+            raise LookupError(f'Unknown task {job.task}')
+        func(**job.payload)
+    except Exception as e:
+        job.last_error = traceback.format_exc()
+        job.locked_at = None
+        job.locked_by = ''
+        if func is not None and job.attempts < job.max_attempts:
+            job.status = 'pending'
+            job.run_at = timezone.now() + timedelta(seconds=backoff_seconds(job.attempts))
+            logger.warning("Job %s (%s) failed on attempt %s, retrying at %s: %s", job.id, job.task, job.attempts, job.run_at, e)
+        else:
+            job.status = 'failed'
+            job.finished_at = timezone.now()
+            logger.error("Job %s (%s) failed permanently after %s attempts: %s", job.id, job.task, job.attempts, e)
+        job.save(update_fields=['status', 'run_at', 'last_error', 'locked_at', 'locked_by', 'finished_at'])
+        return False
+
+    job.status = 'succeeded'
+    job.finished_at = timezone.now()
+    job.locked_at = None
+    job.save(update_fields=['status', 'finished_at', 'locked_at'])
+    return True
+
+
+def requeue_stale():
+    """Return jobs whose worker died mid-run (locked longer than JOB_LOCK_TIMEOUT) to the queue."""
+    cutoff = timezone.now() - timedelta(seconds=getattr(settings, 'JOB_LOCK_TIMEOUT', 600))
+    return Job.objects.filter(status='running', locked_at__lt=cutoff).update(
+        status='pending', locked_at=None, locked_by='', run_at=timezone.now()
+    )
+
+
+def purge_finished():
+    """Delete finished jobs older than JOB_RETENTION_DAYS. Their idempotency keys become reusable."""
+    cutoff = timezone.now() - timedelta(days=getattr(settings, 'JOB_RETENTION_DAYS', 7))
+    deleted, _ = Job.objects.filter(status__in=['succeeded', 'failed'], finished_at__lt=cutoff).delete()
+    return deleted
@@ -0,0 +1,262 @@
+"""
+Non-blocking structured logging.
+
+Request threads never touch the log file. ``QueueHandler`` (configured in
+``settings.LOGGING``) only tags each record with the current request context
+and drops it on a bounded in-memory queue; one ``QueueListener`` thread per
+process formats the records as JSON lines and writes them to the real sinks
+(a shared append-only file and the console). If the queue is full, for example while
+the disk stalls under a burst, records are dropped and counted rather than
+making the request wait. The next record that fits reports how many were lost.
+
+Message formatting is deferred as well: with ``logger.info('x %s', y)`` the
+``%`` interpolation happens on the listener thread, and filtered records are
+never formatted at all.
+"""
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+from pathlib import Path
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+# Set by RequestLogMiddleware for the duration of a request
+request_context = contextvars.ContextVar('request_context', default=None)
+
+CONTEXT_FIELDS = ('request_id', 'trace_id', 'user_id', 'view', 'latency_ms')
+
+# Arguments that can be formatted later on another thread without changing
+# meaning or touching the database (lazy objects, model instances, forms...)
+SAFE_ARG_TYPES = (str, int, float, bool, type(None), Decimal, datetime, BaseException)
+
+_RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """One JSON object per line with the request context fields and any ``extra``."""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED and not key.startswith('_') and value is not None:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class ConsoleFormatter(logging.Formatter):
+    """Human-readable console lines with the request id when there is one."""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s %(message)s')
+
+    def format(self, record):
+        line = super().format(record)
+        request_id = getattr(record, 'request_id', None)
+        return f'{line} [{request_id}]' if request_id else line
+
+
+def _sink_handlers(filename, console, raw=False):
+    handlers = []
+    if filename:
+        Path(filename).parent.mkdir(parents=True, exist_ok=True)
+        # Every process appends to the same file, so none of them may rotate it:
+        # logrotate moves it away and each handler reopens it on its next write
+        file_handler = logging.handlers.WatchedFileHandler(filename, encoding='utf-8', delay=True)
+        file_handler.setFormatter(logging.Formatter('%(message)s') if raw else JsonLinesFormatter())
+        handlers.append(file_handler)
+    if console:
+        console_handler = logging.StreamHandler(sys.stderr)
+        console_handler.setFormatter(ConsoleFormatter())
+        handlers.append(console_handler)
+    return handlers
+
+
+class QueueHandler(logging.Handler):
+    """
+    Hand records to a background ``QueueListener`` that writes them to a
+    JSON-lines file and, optionally, the console.
+
+    With ``raw=True`` the file gets the bare message, for loggers whose
+    messages are already complete JSON documents (core.tracing).
+
+    Meant to be shared: configure it once in ``LOGGING['handlers']`` and
+    attach it to every logger. The listener thread is restarted in forked
+    children (gunicorn workers with ``--preload``) and drained at exit.
+
+    This deliberately does not subclass ``logging.handlers.QueueHandler``:
+    ``dictConfig`` special-cases that class on newer Pythons and would build
+    its own unbounded queue and listener.
+    """
+
+    def __init__(self, filename=None, console=True, queue_size=10000, raw=False):
+        super().__init__()
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self._drop_lock = threading.Lock()
+        self.listener = logging.handlers.QueueListener(
+            self.queue, *_sink_handlers(filename, console, raw),
+            respect_handler_level=True,
+        )
+        self.listener.start()
+        atexit.register(self.close)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._restart_after_fork)
+
+    def _restart_after_fork(self):
+        # The parent's listener thread does not exist in the child
+        self.queue = queue.Queue(maxsize=self.queue.maxsize)
+        self.listener.queue = self.queue
+        self.listener._thread = None
+        self.listener.start()
+
+    def emit(self, record):
+        try:
+            self.enqueue(self.prepare(record))
+        except Exception:
+            self.handleError(record)
+
+    def prepare(self, record):
+        """
+        Attach the request context, but leave message formatting to the
+        listener unless an argument could change or hit the database later.
+        """
+        record = copy.copy(record)
+        context = request_context.get()
+        if context:
+            for key in CONTEXT_FIELDS:
+                if getattr(record, key, None) is None:
+                    setattr(record, key, context.get(key))
+        if record.args and not all(isinstance(arg, SAFE_ARG_TYPES) for arg in _args(record.args)):
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info and record.exc_text is None:
+            # Tracebacks keep every frame's locals alive; render them now
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._drop_lock:
+                self.dropped += 1
+            return
+        if self.dropped:
+            with self._drop_lock:
+                dropped, self.dropped = self.dropped, 0
+            if dropped:
+                self._report_dropped(dropped)
+
+    def _report_dropped(self, dropped):
+        notice = logging.LogRecord(
+            __name__, logging.WARNING, __file__, 0,
+            'Log queue full, dropped %d records', (dropped,), None,
+        )
+        try:
+            self.queue.put_nowait(notice)
+        except queue.Full:
+            with self._drop_lock:
+                self.dropped += dropped
+
+    def close(self):
+        listener = self.listener
+        if listener._thread is not None:
+            # Blocking put: at shutdown it is fine to wait for the backlog to drain
+            self.queue.put(listener._sentinel)
+            listener._thread.join()
+            listener._thread = None
+        super().close()
+
+
+def _args(args):
+    return args.values() if isinstance(args, dict) else args
+
+
+class RequestLogMiddleware:
+    """
+    Give each request an id (reusing a valid ``X-Request-ID`` header from the
+    proxy), expose it to every log record emitted while the request runs, and
+    write one ``core.requests`` access record with status and latency.
+    """
+
+    header = 'HTTP_X_REQUEST_ID'
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.logger = logging.getLogger('core.requests')
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        token, context = self.start(request)
+        try:
+            response = self.get_response(request)
+            return self.finish(request, response, context, started)
+        finally:
+            request_context.reset(token)
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        token, context = self.start(request)
+        try:
+            response = await self.get_response(request)
+            return self.finish(request, response, context, started)
+        finally:
+            request_context.reset(token)
+
+    def start(self, request):
+        request_id = request.META.get(self.header, '')
+        if not (0 < len(request_id) <= 64 and request_id.replace('-', '').isalnum()):
+            request_id = os.urandom(8).hex()
+        request.request_id = request_id
+        context = dict.fromkeys(CONTEXT_FIELDS)
+        context['request_id'] = request_id
+        return request_context.set(context), context
+
+    def finish(self, request, response, context, started):
+        context['latency_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        response['X-Request-ID'] = request.request_id
+        if self.logger.isEnabledFor(logging.INFO):
+            self.logger.info(
+                '%s %s %d', request.method, request.path, response.status_code,
+                extra={'status': response.status_code, 'method': request.method},
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        context = request_context.get()
+        if context is not None:
+            match = request.resolver_match
+            context['view'] = match.view_name if match else getattr(view_func, '__name__', None)
+            # AuthenticationMiddleware and the session middleware above have
+            # already resolved request.user, so this adds no query
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_authenticated:
+                context['user_id'] = user.pk
+        return None
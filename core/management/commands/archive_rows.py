@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from core.archive import archive_rows
+
+
+class Command(BaseCommand):
+    help = 'Move finished orders and sold listings out of the hot tables into the archive tables.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.ARCHIVE_AFTER_DAYS,
+            help='Archive rows not updated for this many days (default: ARCHIVE_AFTER_DAYS).'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.ARCHIVE_BATCH_SIZE,
+            help='Rows moved per transaction.'
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Count the rows that would move without moving them.')
+
+    def handle(self, *args, **options):
+        moved = archive_rows(days=options['days'], batch_size=options['batch_size'], dry_run=options['dry_run'])
+        for name, count in moved.items():
+            self.stdout.write(f'{name}: {count}')
+        verb = 'Would archive' if options['dry_run'] else 'Archived'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {sum(moved.values())} rows older than {options["days"]} days'))
@@ -0,0 +1,174 @@
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.test.utils import setup_databases, teardown_databases
+
+SERVERS = {
+    'wsgi': lambda threads: ['agroconnect.wsgi', '-k', 'gthread', '--threads', str(threads)],
+    'asgi': lambda threads: ['agroconnect.asgi', '-k', 'uvicorn_worker.UvicornWorker'],
+}
+LABELS = {
+    'wsgi': lambda threads: f'wsgi (gthread x{threads})',
+    'asgi': lambda threads: 'asgi (uvicorn)',
+}
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def _read_response(reader):
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split()[1])
+    headers = {}
+    for line in lines[1:]:
+        if ':' in line:
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+    if 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    elif headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    return status
+
+
+async def _connection(port, request, deadline, latencies, errors):
+    """One keep-alive client polling until the deadline. Returns the number of responses."""
+    served = 0
+    try:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    except OSError:
+        errors.append('connect')
+        return 0
+    try:
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            writer.write(request)
+            await writer.drain()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            status = await asyncio.wait_for(_read_response(reader), remaining)
+            latencies.append(time.perf_counter() - started)
+            if status != 200:
+                errors.append(status)
+            served += 1
+    except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+    return served
+
+
+async def _drive(port, request, connections_count, duration):
+    latencies, errors = [], []
+    deadline = time.monotonic() + duration
+    served = await asyncio.gather(*(
+        _connection(port, request, deadline, latencies, errors) for _ in range(connections_count)
+    ))
+    return served, latencies, errors
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare one gunicorn worker under WSGI (gthread) and ASGI (uvicorn) with many '
+        'keep-alive clients polling an endpoint, e.g. the active sessions API.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=200, help='Concurrent keep-alive clients.')
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds to poll per server.')
+        parser.add_argument('--threads', type=int, default=8, help='Threads of the WSGI gthread worker.')
+        parser.add_argument('--path', default='/api/sessions/', help='URL polled by every client.')
+        parser.add_argument('--servers', nargs='+', choices=sorted(SERVERS), default=['wsgi', 'asgi'])
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as tmp:
+            database = os.path.join(tmp, 'bench_default.sqlite3')
+            settings.DATABASES['default'].setdefault('TEST', {})['NAME'] = database
+            old_config = setup_databases(verbosity=0, interactive=False)
+            try:
+                cookie = self.login()
+                connections.close_all()
+                for server in options['servers']:
+                    self.run_case(server, tmp, database, cookie, options)
+            finally:
+                teardown_databases(old_config, verbosity=0)
+
+    def login(self):
+        from django.contrib.auth.models import User
+        from core.models import UserProfile, CompanyProfile
+        user = User.objects.create_user('bench_company', 'bench@example.com', 'Harvest-Season-2024')
+        profile = UserProfile.objects.create(user=user, role='company', phone='9000000000', address='Bench Road')
+        CompanyProfile.objects.create(user_profile=profile, company_name='Bench Co', registration_number='BENCH001')
+        client = Client()
+        client.force_login(user)
+        return f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}'
+
+    def run_case(self, server, tmp, database, cookie, options):
+        port = _free_port()
+        env = dict(
+            os.environ,
+            DATABASE_URL=f'sqlite:///{database}',
+            REPLICA_DATABASE_URL='',
+            RATE_LIMIT_ENABLED='False',
+            TRACE_SAMPLE_RATE='0',
+            LOG_CONSOLE='False',
+            LOG_FILE=os.path.join(tmp, f'{server}.jsonl'),
+        )
+        command = [
+            sys.executable, '-m', 'gunicorn', *SERVERS[server](options['threads']),
+            '-w', '1', '-b', f'127.0.0.1:{port}', '--backlog', str(max(2048, options['connections'])),
+            '--keep-alive', '75', '--log-level', 'warning',
+        ]
+        process = subprocess.Popen(command, cwd=settings.BASE_DIR, env=env)
+        try:
+            self.wait_for(port, process)
+            request = (
+                f'GET {options["path"]} HTTP/1.1\r\nHost: localhost\r\nCookie: {cookie}\r\n'
+                f'Connection: keep-alive\r\n\r\n'
+            ).encode()
+            served, latencies, errors = asyncio.run(
+                _drive(port, request, options['connections'], options['duration'])
+            )
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+
+        latencies.sort()
+        p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0
+        median = statistics.median(latencies) if latencies else 0
+        label = LABELS[server](options['threads'])
+        self.stdout.write(
+            f'{label:<20} {sum(1 for count in served if count)}/{options["connections"]} connections served  '
+            f'{len(latencies) / options["duration"]:7.1f} req/s  '
+            f'median {median * 1000:7.1f} ms  p95 {p95 * 1000:7.1f} ms  errors {len(errors)}'
+        )
+
+    def wait_for(self, port, process, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise CommandError(f'gunicorn exited with status {process.returncode}')
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                return
+            except OSError:
+                time.sleep(0.2)
+        raise CommandError(f'gunicorn did not start listening on port {port}')
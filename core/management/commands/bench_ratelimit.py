@@ -0,0 +1,41 @@
+import time
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from django.urls import resolve
+from core.middleware import RateLimitMiddleware
+
+
+class Command(BaseCommand):
+    help = 'Measure the per-request overhead of RateLimitMiddleware.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=100000)
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        factory = RequestFactory()
+
+        # A limit high enough that every request is allowed, so we time the full token path
+        with override_settings(RATE_LIMITS={'login': {'default': f'{iterations * 10}/s'}}, RATE_LIMIT_ENABLED=True):
+            middleware = RateLimitMiddleware(lambda request: HttpResponse())
+
+        cases = [
+            ('limited url (token taken)', '/login/', 'POST'),
+            ('unlimited url (rule lookup only)', '/', 'GET'),
+        ]
+        for label, path, method in cases:
+            request = getattr(factory, method.lower())(path, REMOTE_ADDR='10.0.0.1')
+            request.user = AnonymousUser()
+            request.resolver_match = resolve(path)
+            view = request.resolver_match.func
+
+            for _ in range(1000):
+                middleware.process_view(request, view, (), {})
+            started = time.perf_counter()
+            for _ in range(iterations):
+                middleware.process_view(request, view, (), {})
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'{label:35s} {elapsed / iterations * 1e6:8.2f} us/request')
@@ -0,0 +1,73 @@
+import os
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import Client
+from django.test.utils import override_settings, setup_databases, teardown_databases
+
+
+def _register(index):
+    client = Client()
+    started = time.perf_counter()
+    response = client.post('/register/farmer/', {
+        'username': f'bench_farmer_{index}',
+        'email': f'bench_farmer_{index}@example.com',
+        'first_name': 'Bench',
+        'last_name': 'Farmer',
+        'password1': 'Harvest-Season-2024',
+        'password2': 'Harvest-Season-2024',
+        'phone': f'9{index:09d}',
+        'address': 'Bench Road',
+        'farm_size': '4.50',
+    })
+    elapsed = time.perf_counter() - started
+    connections.close_all()
+    return response.status_code == 302, elapsed
+
+
+class Command(BaseCommand):
+    help = 'Time concurrent farmer registrations through the real view at different PBKDF2 work factors.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=1000, help='Registrations per run.')
+        parser.add_argument('--concurrency', type=int, default=50, help='Parallel client threads.')
+        parser.add_argument(
+            '--iterations', type=int, nargs='+', default=[settings.PASSWORD_HASH_ITERATIONS],
+            help='PASSWORD_HASH_ITERATIONS values to compare.'
+        )
+
+    def handle(self, *args, **options):
+        count, concurrency = options['count'], options['concurrency']
+        with tempfile.TemporaryDirectory() as tmp:
+            # A throwaway database: a file for SQLite so every thread sees the same data
+            for alias in connections:
+                test = settings.DATABASES[alias].setdefault('TEST', {})
+                if connections[alias].vendor == 'sqlite' and not test.get('MIRROR'):
+                    test['NAME'] = os.path.join(tmp, f'bench_{alias}.sqlite3')
+            old_config = setup_databases(verbosity=0, interactive=False)
+            try:
+                for iterations in options['iterations']:
+                    self.run_case(iterations, count, concurrency)
+            finally:
+                teardown_databases(old_config, verbosity=0)
+
+    def run_case(self, iterations, count, concurrency):
+        from django.contrib.auth.models import User
+        User.objects.filter(username__startswith='bench_farmer_').delete()
+        with override_settings(PASSWORD_HASH_ITERATIONS=iterations, RATE_LIMIT_ENABLED=False):
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                results = list(pool.map(_register, range(count)))
+            elapsed = time.perf_counter() - started
+
+        latencies = sorted(latency for _, latency in results)
+        ok = sum(1 for success, _ in results if success)
+        p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0
+        self.stdout.write(
+            f'iterations={iterations:<8d} {ok}/{count} ok  {count / elapsed:7.1f} signups/s  '
+            f'median {statistics.median(latencies) * 1000:7.1f} ms  p95 {p95 * 1000:7.1f} ms'
+        )
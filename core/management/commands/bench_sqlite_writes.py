@@ -0,0 +1,83 @@
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from core.sqlite import apply_pragmas
+
+SCHEMA = """
+CREATE TABLE session (key TEXT PRIMARY KEY, data TEXT, expire REAL);
+CREATE TABLE orders (id INTEGER PRIMARY KEY, company INTEGER, total REAL, status TEXT);
+"""
+
+
+def _worker(path, pragmas, writes, worker_id, results):
+    done = errors = 0
+    try:
+        conn = sqlite3.connect(path, timeout=0, isolation_level=None)
+        apply_pragmas(conn.cursor(), pragmas)
+        for i in range(writes):
+            try:
+                # Mirrors one request: a session save plus an order write in one transaction
+                conn.execute('BEGIN IMMEDIATE')
+                conn.execute(
+                    'INSERT OR REPLACE INTO session VALUES (?, ?, ?)',
+                    (f'{worker_id}-{i % 50}', 'x' * 200, time.time())
+                )
+                conn.execute(
+                    'INSERT INTO orders (company, total, status) VALUES (?, ?, ?)',
+                    (worker_id, i * 1.5, 'pending_admin')
+                )
+                conn.execute('COMMIT')
+                done += 1
+            except sqlite3.OperationalError:
+                errors += 1
+                if conn.in_transaction:
+                    conn.execute('ROLLBACK')
+        conn.close()
+    finally:
+        # Always report back so the parent never blocks on a crashed worker
+        results.put((done, errors))
+
+
+class Command(BaseCommand):
+    help = 'Compare multi-process SQLite write throughput with default settings and SQLITE_PRAGMAS.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=4)
+        parser.add_argument('--writes', type=int, default=500, help='Transactions per process.')
+
+    def handle(self, *args, **options):
+        default_pragmas = {'busy_timeout': settings.SQLITE_PRAGMAS.get('busy_timeout', 5000)}
+        scenarios = [
+            ('rollback journal (default)', default_pragmas),
+            ('tuned SQLITE_PRAGMAS', settings.SQLITE_PRAGMAS),
+        ]
+        for label, pragmas in scenarios:
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, 'bench.sqlite3')
+                conn = sqlite3.connect(path)
+                conn.executescript(SCHEMA)
+                conn.close()
+
+                results = multiprocessing.Queue()
+                workers = [
+                    multiprocessing.Process(target=_worker, args=(path, pragmas, options['writes'], n, results))
+                    for n in range(options['processes'])
+                ]
+                started = time.perf_counter()
+                for worker in workers:
+                    worker.start()
+                totals = [results.get(timeout=600) for _ in workers]
+                for worker in workers:
+                    worker.join()
+                elapsed = time.perf_counter() - started
+
+            done = sum(t[0] for t in totals)
+            errors = sum(t[1] for t in totals)
+            self.stdout.write(
+                f'{label:28s} {done / elapsed:9.0f} tx/s  '
+                f'({done} committed, {errors} lock errors, {elapsed:.2f}s)'
+            )
@@ -0,0 +1,124 @@
+import http.client
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test.utils import setup_databases, teardown_databases
+
+PROFILES = {
+    # What the Procfile ran before agroconnect/gunicorn.conf.py: sync workers, no preload, no warm-up
+    'default': lambda workers: ['agroconnect.wsgi', '-w', str(workers)],
+    'config': lambda workers: ['agroconnect.wsgi', '-c', 'agroconnect/gunicorn.conf.py', '-w', str(workers)],
+}
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _get(port, path, timeout=60):
+    """GET ``path`` on a new connection. Returns (status, seconds, perf_counter() when answered)."""
+    started = time.perf_counter()
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+    try:
+        connection.request('GET', path)
+        response = connection.getresponse()
+        response.read()
+        finished = time.perf_counter()
+        return response.status, finished - started, finished
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = (
+        'Start gunicorn with its defaults and with agroconnect/gunicorn.conf.py and time how long '
+        'each takes to answer its first requests, i.e. how cold the workers are.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='Workers for both profiles.')
+        parser.add_argument('--path', default='/login/', help='URL requested.')
+        parser.add_argument('--first', type=int, default=0, help='Concurrent first requests (default: 2 per worker).')
+        parser.add_argument('--requests', type=int, default=50, help='Sequential requests after warm-up.')
+        parser.add_argument('--runs', type=int, default=3, help='Launches per profile; medians are reported.')
+        parser.add_argument('--profiles', nargs='+', choices=sorted(PROFILES), default=['default', 'config'])
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as tmp:
+            database = os.path.join(tmp, 'bench_default.sqlite3')
+            settings.DATABASES['default'].setdefault('TEST', {})['NAME'] = database
+            old_config = setup_databases(verbosity=0, interactive=False)
+            connections.close_all()
+            try:
+                for profile in options['profiles']:
+                    runs = [self.launch(profile, tmp, database, options) for _ in range(options['runs'])]
+                    self.report(profile, runs, options)
+            finally:
+                teardown_databases(old_config, verbosity=0)
+
+    def launch(self, profile, tmp, database, options):
+        """Start gunicorn once. Returns (seconds to first response, first latencies, steady latencies)."""
+        port = _free_port()
+        env = dict(
+            os.environ,
+            DATABASE_URL=f'sqlite:///{database}',
+            REPLICA_DATABASE_URL='',
+            RATE_LIMIT_ENABLED='False',
+            TRACE_SAMPLE_RATE='0',
+            LOG_CONSOLE='False',
+            LOG_FILE=os.path.join(tmp, f'{profile}.jsonl'),
+        )
+        command = [
+            sys.executable, '-m', 'gunicorn', *PROFILES[profile](options['workers']),
+            '-b', f'127.0.0.1:{port}', '--log-level', 'warning', '--access-logfile', os.devnull,
+        ]
+        launched = time.perf_counter()
+        process = subprocess.Popen(command, cwd=settings.BASE_DIR, env=env)
+        try:
+            self.wait_for(port, process)
+            # The master accepts connections before its workers are up; these wait in the backlog
+            first = options['first'] or 2 * options['workers']
+            with ThreadPoolExecutor(max_workers=first) as pool:
+                results = list(pool.map(lambda _: _get(port, options['path']), range(first)))
+            steady = [_get(port, options['path']) for _ in range(options['requests'])]
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+        statuses = {status for status, _, _ in results + steady}
+        if statuses != {200}:
+            raise CommandError(f'{profile}: unexpected responses {sorted(statuses)} for {options["path"]}')
+        first_response = min(finished for _, _, finished in results) - launched
+        return first_response, [latency for _, latency, _ in results], [latency for _, latency, _ in steady]
+
+    def report(self, profile, runs, options):
+        ready = statistics.median(run[0] for run in runs)
+        first_slowest = statistics.median(max(run[1]) for run in runs)
+        first_median = statistics.median(statistics.median(run[1]) for run in runs)
+        steady = statistics.median(statistics.median(run[2]) for run in runs)
+        self.stdout.write(
+            f'{profile:<8} launch to first response {ready * 1000:7.0f} ms   '
+            f'first {len(runs[0][1])} requests: median {first_median * 1000:6.0f} ms, slowest {first_slowest * 1000:6.0f} ms   '
+            f'then median {steady * 1000:5.1f} ms'
+        )
+
+    def wait_for(self, port, process, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise CommandError(f'gunicorn exited with status {process.returncode}')
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                return
+            except OSError:
+                time.sleep(0.05)
+        raise CommandError(f'gunicorn did not start listening on port {port}')
@@ -0,0 +1,212 @@
+import gc
+import json
+import os
+import statistics
+import tempfile
+import time
+from decimal import Decimal
+from pathlib import Path
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.template import loader
+from django.test import Client
+from django.test.signals import template_rendered
+from django.test.utils import (
+    CaptureQueriesContext, override_settings, setup_databases, setup_test_environment,
+    teardown_databases, teardown_test_environment,
+)
+from django.urls import reverse
+
+PASSWORD = 'Bench-Templates-2024'
+UNCACHED_TEMPLATES = [{
+    **settings.TEMPLATES[0],
+    'OPTIONS': {**settings.TEMPLATES[0]['OPTIONS'], 'loaders': settings.TEMPLATE_LOADERS},
+}]
+MODES = [
+    ('uncached', {'TEMPLATES': UNCACHED_TEMPLATES, 'PRERENDER_FORM_FIELDS': False}),
+    ('cached', {'PRERENDER_FORM_FIELDS': False}),
+    ('prerendered', {'PRERENDER_FORM_FIELDS': True}),
+]
+
+
+def seed(rows):
+    """Accounts for every role and ``rows`` listings, orders and bargains. Returns {role: username}."""
+    from django.contrib.auth.models import User
+    from core.analytics import refresh_facts
+    from core.models import (
+        UserProfile, FarmerProfile, CompanyProfile, WasteProduct, Order, PriceBargain, NotificationEvent, Notification
+    )
+    admin = User.objects.create_superuser('bench_admin', 'bench_admin@example.com', PASSWORD)
+    farmer_user = User.objects.create_user('bench_farmer', 'bench_farmer@example.com', PASSWORD, first_name='Bench')
+    farmer = FarmerProfile.objects.create(
+        user_profile=UserProfile.objects.create(user=farmer_user, role='farmer', phone='9876543210', address='Bench Farm'),
+        farm_size=Decimal('12.5'),
+    )
+    company_user = User.objects.create_user('bench_company', 'bench_company@example.com', PASSWORD)
+    company = CompanyProfile.objects.create(
+        user_profile=UserProfile.objects.create(user=company_user, role='company', phone='9876543211', address='Bench Mill'),
+        company_name='Bench Mills', registration_number='BENCH001',
+    )
+    crops = [value for value, _ in WasteProduct.CROP_CHOICES]
+    statuses = [value for value, _ in Order.STATUS_CHOICES]
+    for i in range(rows):
+        listing = WasteProduct.objects.create(
+            farmer=farmer, crop_name=crops[i % len(crops)], quantity=Decimal(10 + i % 40),
+            admin_price_per_ton=Decimal(1000 + 25 * (i % 20)), location=f'Village {i % 7}',
+            description='Dry residue, baled and ready for pickup. ' * 3,
+        )
+        Order.objects.create(
+            company=company, waste_product=listing, quantity_ordered=Decimal(5), company_price_per_ton=Decimal(1100),
+            total_price=Decimal(5500), status=statuses[i % len(statuses)], notes='Pickup on weekdays.',
+        )
+        PriceBargain.objects.create(
+            waste_product=listing, farmer_proposed_price=Decimal(1200), farmer_message='Quality is above average.',
+            status='pending' if i % 2 else 'rejected', admin_counter_price=None if i % 2 else Decimal(1150),
+        )
+        event = NotificationEvent.objects.create(
+            event_type='order_status', recipient_ids=[farmer_user.id], subject=f'Order #{i}', message='Updated.'
+        )
+        Notification.objects.create(recipient=farmer_user, event=event, subject=event.subject, message=event.message)
+    refresh_facts(full=True)
+    return {'admin': admin.username, 'farmer': farmer_user.username, 'company': company_user.username}
+
+
+def pages():
+    """(role or None, url) covering every template in templates/core."""
+    from core.models import WasteProduct, Order, PriceBargain
+    listing = WasteProduct.objects.filter(status='available').first()
+    order = Order.objects.filter(status='pending_admin').first()
+    bargain = PriceBargain.objects.filter(status='pending').first()
+    return [
+        (None, reverse('home')),
+        ('farmer', reverse('dashboard')),
+        ('company', reverse('dashboard')),
+        ('admin', reverse('dashboard')),
+        ('company', reverse('waste_list')),
+        ('company', reverse('waste_list') + '?crop_type=rice'),
+        ('company', reverse('waste_detail', args=[listing.pk])),
+        ('farmer', reverse('waste_add')),
+        ('company', reverse('place_order', args=[listing.pk])),
+        ('farmer', reverse('profile')),
+        ('farmer', reverse('edit_profile')),
+        ('farmer', reverse('create_bargain', args=[listing.pk])),
+        ('farmer', reverse('notifications')),
+        ('admin', reverse('respond_bargain', args=[bargain.pk])),
+        ('admin', reverse('admin_bargains')),
+        ('admin', reverse('admin_orders')),
+        ('admin', reverse('admin_approve_order', args=[order.pk])),
+        ('admin', reverse('admin_view_prices')),
+        ('admin', reverse('order_summary')),
+        ('admin', reverse('admin_analytics')),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        'Time rendering of every template in templates/core with the contexts real pages pass them, '
+        'with uncached loaders, cached loaders, and cached loaders plus pre-rendered form fields.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=50, help='Listings, orders and bargains to seed.')
+        parser.add_argument('--iterations', type=int, default=200, help='Renders per template and mode.')
+        parser.add_argument('--json', help='Write the results to this file.')
+        parser.add_argument('--baseline', help='A file written by --json to compare against.')
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as tmp:
+            for alias in connections:
+                test = settings.DATABASES[alias].setdefault('TEST', {})
+                if connections[alias].vendor == 'sqlite' and not test.get('MIRROR'):
+                    test['NAME'] = os.path.join(tmp, f'bench_{alias}.sqlite3')
+            setup_test_environment()
+            old_config = setup_databases(verbosity=0, interactive=False)
+            try:
+                with override_settings(RATE_LIMIT_ENABLED=False):
+                    captured = self.capture(seed(options['rows']))
+                    results = self.measure(captured, options['iterations'])
+            finally:
+                teardown_databases(old_config, verbosity=0)
+                teardown_test_environment()
+        self.report(results, options['baseline'])
+        if options['json']:
+            Path(options['json']).write_text(json.dumps(results, indent=2, sort_keys=True))
+
+    def capture(self, users):
+        """Request every page and keep the first context each core template was rendered with."""
+        captured = {}
+
+        def store(sender, template, context, **kwargs):
+            name = template.name or ''
+            if name.startswith('core/') and name not in captured:
+                captured[name] = (context.flatten(), getattr(context, 'request', None))
+
+        template_rendered.connect(store, dispatch_uid='bench_templates')
+        try:
+            clients = {None: Client()}
+            for role, username in users.items():
+                clients[role] = Client()
+                clients[role].login(username=username, password=PASSWORD)
+            for role, url in pages():
+                response = clients[role].get(url)
+                if response.status_code != 200:
+                    self.stderr.write(f'{url} as {role or "anonymous"}: HTTP {response.status_code}')
+        finally:
+            template_rendered.disconnect(dispatch_uid='bench_templates')
+        core = Path(settings.BASE_DIR) / 'templates' / 'core'
+        for path in sorted(core.glob('*.html')):
+            if f'core/{path.name}' not in captured:
+                self.stderr.write(f'core/{path.name}: not rendered by any benchmarked page')
+        return captured
+
+    def measure(self, captured, iterations):
+        """{template: {mode: {'median_ms', 'p95_ms', 'queries'}}}."""
+        results = {}
+        for name in sorted(captured):
+            context, request = captured[name]
+            results[name] = {}
+            # Modes alternate per template so they run under the same machine load
+            for mode, overrides in MODES:
+                with override_settings(**overrides):
+                    # The first render loads the template and fills lazy querysets
+                    loader.get_template(name).render(context, request)
+                    timings = []
+                    # As timeit does: collection pauses would land on whichever mode runs next
+                    gc.collect()
+                    gc.disable()
+                    try:
+                        with CaptureQueriesContext(connection) as queries:
+                            for _ in range(iterations):
+                                started = time.perf_counter()
+                                loader.get_template(name).render(context, request)
+                                timings.append(time.perf_counter() - started)
+                    finally:
+                        gc.enable()
+                timings.sort()
+                results[name][mode] = {
+                    'median_ms': round(statistics.median(timings) * 1000, 3),
+                    'p95_ms': round(timings[int(len(timings) * 0.95) - 1] * 1000, 3),
+                    'queries': round(len(queries) / iterations, 2),
+                }
+        return results
+
+    def report(self, results, baseline_path):
+        baseline = json.loads(Path(baseline_path).read_text()) if baseline_path else {}
+        header = f'{"template":<28}' + ''.join(f'{mode:>14}' for mode, _ in MODES) + f'{"p95":>10}{"queries":>9}'
+        if baseline:
+            header += f'{"vs baseline":>13}'
+        self.stdout.write(header + '\n' + '-' * len(header))
+        for name, modes in results.items():
+            best = modes[MODES[-1][0]]
+            line = f'{name[5:]:<28}' + ''.join(f'{modes[mode]["median_ms"]:>11.3f} ms' for mode, _ in MODES)
+            line += f'{best["p95_ms"]:>7.3f} ms{best["queries"]:>9}'
+            before = baseline.get(name, {}).get(MODES[-1][0])
+            if before:
+                change = (best['median_ms'] - before['median_ms']) * 100 / before['median_ms']
+                line += f'{change:>+12.1f}%'
+            self.stdout.write(line)
+        totals = [sum(modes[mode]['median_ms'] for modes in results.values()) for mode, _ in MODES]
+        self.stdout.write(self.style.SUCCESS(
+            'Total median: ' + ', '.join(f'{mode} {total:.2f} ms' for (mode, _), total in zip(MODES, totals))
+        ))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from core.analytics import refresh_facts
+
+
+class Command(BaseCommand):
+    help = 'Load orders, listings and bargains into the daily analytics fact tables.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Rebuild every day instead of only the days with changed rows (also picks up deletions).'
+        )
+
+    def handle(self, *args, **options):
+        for name, (days, written) in refresh_facts(full=options['full']).items():
+            scope = 'all days' if days is None else f'{days} changed days'
+            self.stdout.write(f'{name}: rebuilt {scope}, {written} fact rows')
+        self.stdout.write(self.style.SUCCESS('Analytics facts are up to date'))
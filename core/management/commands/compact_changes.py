@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from core.changes import compact_changes
+
+
+class Command(BaseCommand):
+    help = 'Delete change feed entries that are past retention or superseded by a later change to the same row.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.CHANGE_LOG_RETENTION_DAYS,
+            help='Keep entries from this many days (default: CHANGE_LOG_RETENTION_DAYS).'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.CHANGE_LOG_BATCH_SIZE,
+            help='Entries deleted per statement.'
+        )
+
+    def handle(self, *args, **options):
+        deleted = compact_changes(retention_days=options['days'], batch_size=options['batch_size'])
+        for name, count in deleted.items():
+            self.stdout.write(f'{name}: {count}')
+        self.stdout.write(self.style.SUCCESS(f'Deleted {sum(deleted.values())} change feed entries'))
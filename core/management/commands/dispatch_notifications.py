@@ -0,0 +1,27 @@
+import time
+from django.core.management.base import BaseCommand
+from core.notifications import dispatch_pending, send_pending_emails
+
+
+class Command(BaseCommand):
+    help = 'Deliver pending order/bargain notification events (in-app feed and email).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--loop', action='store_true', help='Keep running and poll the outbox.')
+        parser.add_argument('--interval', type=float, default=2.0, help='Seconds to sleep when the outbox is empty.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        total = emailed = 0
+        while True:
+            dispatched = dispatch_pending(batch_size=batch_size)
+            sent = send_pending_emails(batch_size=batch_size)
+            total += dispatched
+            emailed += sent
+            if dispatched or sent:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS(f'Dispatched {total} notification events, emailed {emailed}'))
@@ -0,0 +1,21 @@
+import sys
+from django.core.management.base import BaseCommand
+from core.data_io import EXPORT_FIELDS, EXPORT_CHUNK_SIZE, FORMATS, stream_export
+
+
+class Command(BaseCommand):
+    help = 'Stream waste products, orders or bargains to CSV or JSON Lines.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(EXPORT_FIELDS))
+        parser.add_argument('--format', choices=FORMATS, default='csv')
+        parser.add_argument('--output', help='File to write (defaults to stdout).')
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        lines = stream_export(options['dataset'], options['format'], options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as out:
+                out.writelines(lines)
+        else:
+            sys.stdout.writelines(lines)
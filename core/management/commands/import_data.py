@@ -0,0 +1,35 @@
+import csv
+import time
+from django.core.management.base import BaseCommand
+from core.data_io import EXPORT_FIELDS, IMPORT_CHUNK_SIZE, FORMATS, BulkImporter, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Bulk import waste products, orders or bargains from CSV or JSON Lines.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(EXPORT_FIELDS))
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=FORMATS, default='csv')
+        parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE)
+        parser.add_argument('--errors', help='Write the per-row error report to this CSV file.')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        with open(options['path'], newline='', encoding='utf-8') as source:
+            importer = BulkImporter(options['dataset'], chunk_size=options['chunk_size'])
+            importer.run(read_rows(source, options['format']))
+
+        if options['errors']:
+            with open(options['errors'], 'w', newline='', encoding='utf-8') as report:
+                writer = csv.writer(report)
+                writer.writerow(['line', 'error'])
+                writer.writerows(importer.errors)
+        else:
+            for line_number, message in importer.errors:
+                self.stderr.write(f'line {line_number}: {message}')
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {importer.imported} rows, {len(importer.errors)} errors in {elapsed:.1f}s'
+        ))
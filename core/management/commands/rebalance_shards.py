@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from core.shards import rebalance, sync_references
+
+
+class Command(BaseCommand):
+    help = (
+        'Copy users and profiles to every shard, then move the listings, orders and bargains of farmers '
+        'whose region maps to a different shard than the one holding them.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.SHARD_MOVE_BATCH_SIZE,
+            help='Listings moved per transaction (default: SHARD_MOVE_BATCH_SIZE).'
+        )
+        parser.add_argument('--farmer', type=int, action='append', dest='farmers', help='Only this farmer id (repeatable).')
+        parser.add_argument('--no-references', action='store_true', help='Skip copying users and profiles.')
+        parser.add_argument('--dry-run', action='store_true', help='Count the farmers that would move without moving them.')
+
+    def handle(self, *args, **options):
+        if not options['no_references'] and not options['dry_run']:
+            for name, written in sync_references().items():
+                self.stdout.write(f'{name}: {written} copies written')
+        moves = rebalance(farmer_ids=options['farmers'], batch_size=options['batch_size'], dry_run=options['dry_run'])
+        unit = 'farmers' if options['dry_run'] else 'rows'
+        for (source, target), count in sorted(moves.items()):
+            self.stdout.write(f'{source} -> {target}: {count} {unit}')
+        verb = 'Would move' if options['dry_run'] else 'Moved'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {sum(moves.values())} {unit} between {len(settings.SHARDS)} shards'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from core.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = 'Recompute dashboard counters from the listing, order and account tables and fix any drift.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without writing.')
+
+    def handle(self, *args, **options):
+        drift = reconcile_counters(dry_run=options['dry_run'])
+        for (scope, owner_id, name), stored, expected in drift:
+            self.stdout.write(
+                f'{scope}:{owner_id} {name}: stored {stored.count} / {stored.amount}, '
+                f'expected {expected.count} / {expected.amount}'
+            )
+        verb = 'Found' if options['dry_run'] else 'Fixed'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {len(drift)} drifted counters'))
@@ -0,0 +1,93 @@
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, close_old_connections, connections
+from core import tasks  # noqa: F401  registers the task functions
+from core.jobs import claim_job, purge_finished, queue_limits, requeue_stale, run_job
+
+MAINTENANCE_INTERVAL = 60
+
+logger = logging.getLogger(__name__)
+
+
+def _worker(queue, interval, once):
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda *args: stopping.append(True))
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    worker_id = f'{socket.gethostname()}:{os.getpid()}'
+    while not stopping:
+        close_old_connections()
+        try:
+            job = claim_job(queue, worker_id)
+        except DatabaseError as e:
+            logger.warning("Worker %s could not claim a %s job: %s", worker_id, queue, e)
+            job = None
+        if job is not None:
+            run_job(job)
+            continue
+        if once:
+            break
+        time.sleep(interval)
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Run background job workers: a pool of processes per queue, sized by JOB_QUEUES.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queues', nargs='+', help='Only serve these queues.')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to sleep when a queue is empty.')
+        parser.add_argument('--once', action='store_true', help='Exit once every queue is drained.')
+
+    def handle(self, *args, **options):
+        limits = queue_limits()
+        queues = options['queues'] or list(limits)
+        unknown = set(queues) - set(limits)
+        if unknown:
+            raise CommandError(f'Unknown queues: {", ".join(sorted(unknown))}. Configure them in JOB_QUEUES.')
+
+        requeue_stale()
+        # Children must open their own database connections
+        connections.close_all()
+        interval, once = options['interval'], options['once']
+        slots = [queue for queue in queues for _ in range(limits[queue])]
+        workers = [self.start_worker(queue, interval, once) for queue in slots]
+        self.stdout.write(f'Started {len(workers)} workers for {", ".join(queues)}')
+
+        stopping = []
+
+        def stop(*args):
+            stopping.append(True)
+            for worker in workers:
+                worker.terminate()
+        signal.signal(signal.SIGTERM, stop)
+
+        try:
+            last_maintenance = time.monotonic()
+            while any(worker.is_alive() for worker in workers):
+                time.sleep(1)
+                if not once and not stopping:
+                    # Replace workers that crashed
+                    for i, worker in enumerate(workers):
+                        if not worker.is_alive():
+                            self.stderr.write(f'Worker for {slots[i]} exited with {worker.exitcode}, restarting')
+                            workers[i] = self.start_worker(slots[i], interval, once)
+                if time.monotonic() - last_maintenance >= MAINTENANCE_INTERVAL:
+                    close_old_connections()
+                    requeue_stale()
+                    purge_finished()
+                    last_maintenance = time.monotonic()
+        except KeyboardInterrupt:
+            stop()
+        for worker in workers:
+            worker.join()
+        self.stdout.write(self.style.SUCCESS('Workers stopped'))
+
+    def start_worker(self, queue, interval, once):
+        worker = multiprocessing.Process(target=_worker, args=(queue, interval, once), daemon=True)
+        worker.start()
+        return worker
@@ -0,0 +1,26 @@
+import time
+from django.core.management.base import BaseCommand
+from core.pricing import get_model, fill_suggestions
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the suggested-price model from accepted trades and store suggestions on unpriced listings.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true', dest='everything',
+            help='Refresh the suggestion on every listing, not only unpriced ones.'
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        model = get_model(rebuild=True)
+        built = time.perf_counter()
+        self.stdout.write(
+            f'Model built from {model.samples} accepted trades into {len(model.table)} groups '
+            f'in {(built - started) * 1000:.0f} ms'
+        )
+        updated = fill_suggestions(model, everything=options['everything'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Updated suggestions on {updated} listings in {(time.perf_counter() - built) * 1000:.0f} ms'
+        ))
@@ -0,0 +1,112 @@
+"""
+Serving of user-uploaded media (profile and waste product photos).
+
+WhiteNoise only serves files known at startup, so uploads go through this
+view instead. It streams from disk in fixed-size blocks, answers conditional
+requests with 304 and supports single byte ranges (206) so clients can resume
+or partially fetch large images.
+"""
+import mimetypes
+import os
+import re
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.http import http_date, quote_etag, parse_etags
+from django.views.decorators.http import require_http_methods
+from django.views.static import was_modified_since
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+BLOCK_SIZE = 64 * 1024
+
+
+def _iter_range(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(BLOCK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _parse_range(header, size):
+    """Return (start, end) for a single satisfiable byte range, None to ignore, or False if unsatisfiable."""
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if first:
+        start = int(first)
+        end = int(last) if last else size - 1
+    else:
+        # Suffix range: the last N bytes
+        start = max(size - int(last), 0)
+        end = size - 1
+    if start >= size or start > end:
+        return False
+    return start, min(end, size - 1)
+
+
+@require_http_methods(["GET", "HEAD"])
+def serve_media(request, path):
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404('Not found')
+    try:
+        stat = os.stat(full_path)
+    except OSError:
+        raise Http404('Not found')
+    if not os.path.isfile(full_path):
+        raise Http404('Not found')
+
+    etag = quote_etag(f'{int(stat.st_mtime):x}-{stat.st_size:x}')
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if (if_none_match and etag in parse_etags(if_none_match)) or (
+        not if_none_match and not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'), stat.st_mtime)
+    ):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+
+    content_type, encoding = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+    size = stat.st_size
+
+    byte_range = None
+    range_header = request.META.get('HTTP_RANGE')
+    if range_header and request.META.get('HTTP_IF_RANGE', etag) == etag:
+        byte_range = _parse_range(range_header, size)
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    if byte_range:
+        start, end = byte_range
+        length = end - start + 1
+        if request.method == 'HEAD':
+            response = HttpResponse(status=206, content_type=content_type)
+        else:
+            response = StreamingHttpResponse(_iter_range(full_path, start, length), status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(length)
+    elif request.method == 'HEAD':
+        response = HttpResponse(content_type=content_type)
+        response['Content-Length'] = str(size)
+    else:
+        response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+
+    if encoding:
+        response['Content-Encoding'] = encoding
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = f'public, max-age={settings.MEDIA_CACHE_MAX_AGE}'
+    return response
@@ -7,10 +7,15 @@ from django.contrib.sessions.models import Session
 from django.contrib.auth.models import User
 from django.utils import timezone
 from django.conf import settings
-from django.core.cache import cache
-from django.http import JsonResponse
+from django.core.cache import cache, caches
+from django.http import JsonResponse, HttpResponse
 from django.views.decorators.http import require_http_methods
 from django.contrib.auth.decorators import login_required
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from .async_utils import aget_user, alogin_required, arequire_http_methods
+from whitenoise.middleware import WhiteNoiseMiddleware
+from .jobs import enqueue
+from .tasks import cleanup_expired_sessions
 import logging
 
 logger = logging.getLogger(__name__)
@@ -19,12 +24,19 @@ class ConcurrentSessionMiddleware:
     """
     Middleware to handle concurrent user sessions properly.
     Ensures each user can have multiple active sessions without conflicts.
+    Runs natively in both sync (WSGI) and async (ASGI) stacks.
     """
+    sync_capable = True
+    async_capable = True
     
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
         # Process request before view
         self.process_request(request)
         
@@ -35,6 +47,22 @@ class ConcurrentSessionMiddleware:
         
         return response
 
+    async def __acall__(self, request):
+        user = await aget_user(request)
+        if user.is_authenticated:
+            session_key = request.session.session_key
+            await cache.aset(f"user_activity_{user.id}_{session_key}", timezone.now().timestamp(), timeout=3600)
+            cache_key = f"active_sessions_{user.id}"
+            active_sessions = await cache.aget(cache_key, set())
+            active_sessions.add(session_key)
+            await cache.aset(cache_key, active_sessions, timeout=3600)
+        
+        response = await self.get_response(request)
+        
+        if user.is_authenticated and int(time.time()) % 100 == 0:
+            await sync_to_async(self.cleanup_expired_sessions)()
+        return response
+
     def process_request(self, request):
         """Process incoming request for session management."""
         # Ensure user attribute exists and is authenticated
@@ -71,26 +99,23 @@ class ConcurrentSessionMiddleware:
         cache.set(cache_key, active_sessions, timeout=3600)
 
     def cleanup_expired_sessions(self):
-        """Clean up expired sessions from database."""
+        """Queue a background cleanup of expired sessions, at most one per hour."""
         try:
-            expired_sessions = Session.objects.filter(
-                expire_date__lt=timezone.now()
-            )
-            count = expired_sessions.count()
-            if count > 0:
-                expired_sessions.delete()
-                logger.info(f"Cleaned up {count} expired sessions")
+            enqueue(cleanup_expired_sessions, idempotency_key=f"cleanup_sessions_{int(time.time()) // 3600}")
         except Exception as e:
-            logger.error(f"Error cleaning up sessions: {e}")
+            logger.error("Error queueing session cleanup: %s", e)
 
 
-@login_required
-@require_http_methods(["GET"])
-def get_active_sessions_api(request):
-    """API endpoint to get user's active sessions."""
-    from .auth_views import get_user_active_sessions
+@alogin_required
+@arequire_http_methods(["GET"])
+async def get_active_sessions_api(request):
+    """
+    API endpoint to get user's active sessions. Polled by every open tab, so
+    it is async: under ASGI it holds no worker thread while waiting.
+    """
+    from .auth_views import aget_user_active_sessions
     try:
-        sessions = get_user_active_sessions(request.user)
+        sessions = await aget_user_active_sessions(request.user)
         session_data = []
         
         for session_info in sessions:
@@ -106,7 +131,7 @@ def get_active_sessions_api(request):
             'total_sessions': len(session_data)
         })
     except Exception as e:
-        logger.error(f"Error fetching active sessions for user {request.user.username}: {e}")
+        logger.error("Error fetching active sessions for user %s: %s", request.user.username, e)
         return JsonResponse({
             'success': False,
             'error': 'Failed to fetch session data'
@@ -145,7 +170,7 @@ def terminate_session_api(request):
             active_sessions = [s for s in active_sessions if s.get('session_key') != session_key]
             cache.set(user_sessions_key, active_sessions, timeout=3600)
             
-            logger.info(f"Session {session_key[:8]} terminated by user {request.user.username}")
+            logger.info("Session %s terminated by user %s", session_key[:8], request.user.username)
             
             return JsonResponse({
                 'success': True,
@@ -164,7 +189,7 @@ def terminate_session_api(request):
             'error': 'Invalid JSON data'
         }, status=400)
     except Exception as e:
-        logger.error(f"Error terminating session: {e}")
+        logger.error("Error terminating session: %s", e)
         return JsonResponse({
             'success': False,
             'error': 'Failed to terminate session'
@@ -175,14 +200,27 @@ class SessionSecurityMiddleware:
     """
     Enhanced session security middleware for concurrent access.
     """
+    sync_capable = True
+    async_capable = True
     
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
         # Add session security headers
         response = self.get_response(request)
-        
+        return self.add_headers(request, response)
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        await aget_user(request)
+        return self.add_headers(request, response)
+
+    def add_headers(self, request, response):
         if hasattr(request, 'user') and request.user.is_authenticated:
             # Add security headers
             response['X-Session-ID'] = request.session.session_key[:8]  # Partial for debugging
@@ -192,4 +230,162 @@ class SessionSecurityMiddleware:
                 user_role = 'unknown'
             response['X-User-Role'] = user_role
         
-        return response
\ No newline at end of file
+        return response
+
+
+RATE_PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """Parse '10/m' into (burst, interval_ms): 10 tokens, one token refilled every 6000 ms."""
+    count, period = rate.split('/')
+    count = int(count)
+    return count, RATE_PERIODS[period[0]] * 1000 // count
+
+
+class RateLimitMiddleware:
+    """
+    Token-bucket rate limiting per URL name and role, keyed by user id or client IP.
+
+    Buckets are stored with the GCRA formulation of a token bucket: a single
+    integer per key holding the "theoretical arrival time" in milliseconds.
+    Taking a token is one atomic ``cache.incr``, so the check is safe across
+    threads and, with a shared cache backend, across gunicorn workers.
+    Limits are configured in ``settings.RATE_LIMITS``.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        self.enabled = getattr(settings, 'RATE_LIMIT_ENABLED', True)
+        self.cache = caches[getattr(settings, 'RATE_LIMIT_CACHE', 'default')]
+        self.use_forwarded_for = getattr(settings, 'RATE_LIMIT_USE_X_FORWARDED_FOR', False)
+        self.rules = {}
+        for url_name, rule in getattr(settings, 'RATE_LIMITS', {}).items():
+            methods = {method.upper() for method in rule.get('methods', [])}
+            limits = {role: parse_rate(rate) for role, rate in rule.items() if role != 'methods'}
+            self.rules[url_name] = (methods, limits)
+
+    def __call__(self, request):
+        # In an async stack this returns the inner coroutine unchanged. The
+        # process_view hook stays sync (Django runs it in a thread there); it
+        # only touches the already-loaded user and the in-memory cache.
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not self.enabled:
+            return None
+        rule = self.rules.get(request.resolver_match.url_name)
+        if rule is None:
+            return None
+        methods, limits = rule
+        if methods and request.method not in methods:
+            return None
+
+        role, identity = self.get_identity(request, limits)
+        limit = limits.get(role) or limits.get('default')
+        if limit is None:
+            return None
+
+        retry_after = self.take_token(f"ratelimit:{request.resolver_match.url_name}:{identity}", *limit)
+        if retry_after is None:
+            return None
+
+        logger.warning("Rate limit exceeded for %s on %s", identity, request.resolver_match.url_name)
+        if request.path.startswith('/api/'):
+            response = JsonResponse({
+                'success': False,
+                'error': 'Too many requests'
+            }, status=429)
+        else:
+            response = HttpResponse('Too many requests. Please try again later.', status=429, content_type='text/plain')
+        response['Retry-After'] = str(retry_after)
+        return response
+
+    def get_identity(self, request, limits):
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated:
+            return 'anonymous', f"ip:{self.get_client_ip(request)}"
+        if user.is_superuser:
+            role = 'admin'
+        elif len(limits.keys() - {'default', 'anonymous', 'admin'}) == 0:
+            # No role-specific limit configured, skip the profile lookup
+            role = 'default'
+        else:
+            profile = getattr(user, 'userprofile', None)
+            role = profile.role if profile else 'default'
+        return role, f"user:{user.id}"
+
+    def get_client_ip(self, request):
+        if self.use_forwarded_for:
+            forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
+            if forwarded:
+                return forwarded.split(',')[0].strip()
+        return request.META.get('REMOTE_ADDR', 'unknown')
+
+    def take_token(self, key, burst, interval_ms):
+        """
+        Take one token from the bucket. Returns None if allowed, otherwise the
+        number of seconds until a token becomes available.
+        """
+        now = int(time.time() * 1000)
+        timeout = burst * interval_ms // 1000 + 1
+        self.cache.add(key, now, timeout=timeout)
+        try:
+            tat = self.cache.incr(key, interval_ms)
+        except ValueError:
+            # Key expired between add() and incr()
+            self.cache.set(key, now + interval_ms, timeout=timeout)
+            tat = now + interval_ms
+
+        if tat - interval_ms < now:
+            # Bucket had refilled completely; restart it from now
+            tat = now + interval_ms
+            self.cache.set(key, tat, timeout=timeout)
+
+        overshoot = tat - now - burst * interval_ms
+        if overshoot <= 0:
+            return None
+
+        # Rejected requests must not consume a token
+        try:
+            self.cache.decr(key, interval_ms)
+        except ValueError:
+            pass
+        return max(1, -(-overshoot // 1000))
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise that can sit in an async middleware stack.
+
+    WhiteNoiseMiddleware is sync-only, and a single sync-only middleware makes
+    Django run every layer below it, and the view, through sync adapters,
+    which would undo the async endpoints under ASGI. Static files are looked
+    up the same way; only serving one goes through a thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, **kwargs):
+        super().__init__(get_response, **kwargs)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
@@ -0,0 +1,60 @@
+# Generated by Django 4.2.30 on 2026-10-19 08:03
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0010_order_admin_notes_alter_order_status'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='status',
+            field=models.CharField(choices=[('pending_admin', 'Pending Admin Review'), ('sent_to_farmer', 'Sent to Farmer'), ('accepted_by_farmer', 'Accepted by Farmer'), ('rejected_by_farmer', 'Rejected by Farmer'), ('approved_by_admin', 'Final Admin Approval'), ('completed', 'Completed')], default='pending_admin', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='wasteproduct',
+            name='crop_name',
+            field=models.CharField(choices=[('rice', 'Rice Residue'), ('wheat', 'Wheat Residue'), ('sugarcane', 'Sugarcane Residue'), ('cotton', 'Cotton Residue'), ('other', 'Other')], max_length=20),
+        ),
+        migrations.CreateModel(
+            name='NotificationEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_type', models.CharField(choices=[('order_status', 'Order Status Changed'), ('bargain_response', 'Bargain Response')], max_length=30)),
+                ('recipient_ids', models.JSONField(default=list)),
+                ('subject', models.CharField(max_length=200)),
+                ('message', models.TextField()),
+                ('link', models.CharField(blank=True, max_length=200)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('dispatched_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(condition=models.Q(('dispatched_at__isnull', True)), fields=['id'], name='notification_event_pending')],
+            },
+        ),
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.CharField(max_length=200)),
+                ('message', models.TextField()),
+                ('link', models.CharField(blank=True, max_length=200)),
+                ('is_read', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='core.notificationevent')),
+                ('recipient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['recipient', 'is_read'], name='notification_unread')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-19 08:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_notifications'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Counter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('global', 'Global'), ('farmer', 'Farmer'), ('company', 'Company')], max_length=10)),
+                ('owner_id', models.PositiveBigIntegerField(default=0)),
+                ('name', models.CharField(max_length=50)),
+                ('count', models.BigIntegerField(default=0)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='counter',
+            constraint=models.UniqueConstraint(fields=('scope', 'owner_id', 'name'), name='unique_counter'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-19 08:34
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_jobs'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='companyprofile',
+            name='unique_company_registration',
+        ),
+        migrations.AlterField(
+            model_name='companyprofile',
+            name='registration_number',
+            field=models.CharField(max_length=50, unique=True, validators=[django.core.validators.RegexValidator(message='Registration number must be 6-20 characters, alphanumeric uppercase only', regex='^[A-Z0-9]{6,20}$')]),
+        ),
+    ]
@@ -0,0 +1,97 @@
+# Generated by Django 4.2.30 on 2026-10-19 08:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_drop_duplicate_registration_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BargainFact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('week', models.DateField()),
+                ('crop_name', models.CharField(choices=[('rice', 'Rice Residue'), ('wheat', 'Wheat Residue'), ('sugarcane', 'Sugarcane Residue'), ('cotton', 'Cotton Residue'), ('other', 'Other')], max_length=20)),
+                ('status', models.CharField(max_length=20)),
+                ('tons', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('bargains', models.PositiveIntegerField(default=0)),
+                ('countered', models.PositiveIntegerField(default=0)),
+                ('discount_pct_total', models.FloatField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='FactWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('loaded_until', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ListingFact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('week', models.DateField()),
+                ('crop_name', models.CharField(choices=[('rice', 'Rice Residue'), ('wheat', 'Wheat Residue'), ('sugarcane', 'Sugarcane Residue'), ('cotton', 'Cotton Residue'), ('other', 'Other')], max_length=20)),
+                ('status', models.CharField(max_length=20)),
+                ('tons', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('listings', models.PositiveIntegerField(default=0)),
+                ('value', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='OrderFact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('week', models.DateField()),
+                ('crop_name', models.CharField(choices=[('rice', 'Rice Residue'), ('wheat', 'Wheat Residue'), ('sugarcane', 'Sugarcane Residue'), ('cotton', 'Cotton Residue'), ('other', 'Other')], max_length=20)),
+                ('status', models.CharField(max_length=20)),
+                ('tons', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('value', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['created_at'], name='order_created'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['updated_at'], name='order_updated'),
+        ),
+        migrations.AddIndex(
+            model_name='pricebargain',
+            index=models.Index(fields=['created_at'], name='bargain_created'),
+        ),
+        migrations.AddIndex(
+            model_name='pricebargain',
+            index=models.Index(fields=['updated_at'], name='bargain_updated'),
+        ),
+        migrations.AddIndex(
+            model_name='wasteproduct',
+            index=models.Index(fields=['created_at'], name='waste_created'),
+        ),
+        migrations.AddIndex(
+            model_name='wasteproduct',
+            index=models.Index(fields=['updated_at'], name='waste_updated'),
+        ),
+        migrations.AddConstraint(
+            model_name='orderfact',
+            constraint=models.UniqueConstraint(fields=('date', 'crop_name', 'status'), name='unique_order_fact'),
+        ),
+        migrations.AddConstraint(
+            model_name='listingfact',
+            constraint=models.UniqueConstraint(fields=('date', 'crop_name', 'status'), name='unique_listing_fact'),
+        ),
+        migrations.AddConstraint(
+            model_name='bargainfact',
+            constraint=models.UniqueConstraint(fields=('date', 'crop_name', 'status'), name='unique_bargain_fact'),
+        ),
+    ]
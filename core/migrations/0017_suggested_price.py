@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 09:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_versions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wasteproduct',
+            name='suggested_price_per_ton',
+            field=models.DecimalField(blank=True, decimal_places=2, help_text='Suggested from recent accepted trades (core.pricing)', max_digits=10, null=True),
+        ),
+    ]
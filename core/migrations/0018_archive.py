@@ -0,0 +1,86 @@
+# Generated by Django 4.2.30 on 2026-10-19 09:06
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_suggested_price'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedBargain',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('waste_product_id', models.BigIntegerField(db_index=True)),
+                ('crop_name', models.CharField(choices=[('rice', 'Rice Residue'), ('wheat', 'Wheat Residue'), ('sugarcane', 'Sugarcane Residue'), ('cotton', 'Cotton Residue'), ('other', 'Other')], max_length=20)),
+                ('location', models.CharField(max_length=200)),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('farmer_proposed_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('admin_counter_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('farmer_message', models.TextField()),
+                ('admin_message', models.TextField(blank=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('accepted', 'Accepted'), ('rejected', 'Rejected')], max_length=10)),
+                ('version', models.PositiveIntegerField(default=1)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['created_at'], name='archived_bargain_created')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedWasteProduct',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('crop_name', models.CharField(choices=[('rice', 'Rice Residue'), ('wheat', 'Wheat Residue'), ('sugarcane', 'Sugarcane Residue'), ('cotton', 'Cotton Residue'), ('other', 'Other')], max_length=20)),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('admin_price_per_ton', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('farmer_price_per_ton', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('suggested_price_per_ton', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('location', models.CharField(max_length=200)),
+                ('description', models.TextField()),
+                ('photo', models.ImageField(blank=True, null=True, upload_to='waste_photos/')),
+                ('status', models.CharField(choices=[('available', 'Available'), ('sold', 'Sold'), ('reserved', 'Reserved')], max_length=10)),
+                ('version', models.PositiveIntegerField(default=1)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('farmer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_waste_products', to='core.farmerprofile')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['created_at'], name='archived_waste_created')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('waste_product_id', models.BigIntegerField(db_index=True)),
+                ('crop_name', models.CharField(choices=[('rice', 'Rice Residue'), ('wheat', 'Wheat Residue'), ('sugarcane', 'Sugarcane Residue'), ('cotton', 'Cotton Residue'), ('other', 'Other')], max_length=20)),
+                ('location', models.CharField(max_length=200)),
+                ('quantity_ordered', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('company_price_per_ton', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('total_price', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('status', models.CharField(choices=[('pending_admin', 'Pending Admin Review'), ('sent_to_farmer', 'Sent to Farmer'), ('accepted_by_farmer', 'Accepted by Farmer'), ('rejected_by_farmer', 'Rejected by Farmer'), ('approved_by_admin', 'Final Admin Approval'), ('completed', 'Completed')], max_length=20)),
+                ('notes', models.TextField(blank=True)),
+                ('admin_notes', models.TextField(blank=True)),
+                ('version', models.PositiveIntegerField(default=1)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_orders', to='core.companyprofile')),
+                ('farmer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_orders', to='core.farmerprofile')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['created_at'], name='archived_order_created'), models.Index(fields=['status', 'created_at'], name='archived_order_status')],
+            },
+        ),
+    ]
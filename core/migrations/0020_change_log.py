@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-19 09:44
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_shards'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLogEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resource', models.CharField(choices=[('listing', 'Listing'), ('order', 'Order'), ('bargain', 'Bargain')], max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('action', models.CharField(choices=[('saved', 'Saved'), ('deleted', 'Deleted')], max_length=10)),
+                ('version', models.PositiveIntegerField()),
+                ('data', models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True)),
+                ('farmer_id', models.PositiveBigIntegerField(blank=True, null=True)),
+                ('company_id', models.PositiveBigIntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['resource', 'object_id', 'id'], name='change_object'), models.Index(fields=['farmer_id', 'id'], name='change_farmer'), models.Index(fields=['company_id', 'id'], name='change_company'), models.Index(fields=['created_at'], name='change_created')],
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.30 on 2026-10-19 09:53
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def mark_sent(apps, schema_editor):
+    # Events dispatched before this migration already had their one email attempt
+    NotificationEvent = apps.get_model('core', 'NotificationEvent')
+    NotificationEvent.objects.filter(dispatched_at__isnull=False).update(emailed_at=F('dispatched_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_change_log'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificationevent',
+            name='email_attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='notificationevent',
+            name='email_retry_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='notificationevent',
+            name='emailed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(mark_sent, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='notificationevent',
+            index=models.Index(condition=models.Q(('dispatched_at__isnull', False), ('emailed_at__isnull', True)), fields=['id'], name='notification_email_pending'),
+        ),
+    ]
@@ -1,8 +1,15 @@
+from decimal import Decimal
 from django.db import models
+from django.db.models import Case, DecimalField, ExpressionWrapper, F, Value, When
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.functional import cached_property
 from django.urls import reverse
-from django.core.validators import MinValueValidator, RegexValidator
+from django.core.validators import MinValueValidator
 from django.core.exceptions import ValidationError
+from .concurrency import VersionConflict
+from .validators import validate_phone, validate_registration_number
 
 class UserProfile(models.Model):
     ROLE_CHOICES = [
@@ -11,13 +18,7 @@ class UserProfile(models.Model):
     ]
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     role = models.CharField(max_length=10, choices=ROLE_CHOICES)
-    phone = models.CharField(
-        max_length=15,
-        validators=[RegexValidator(
-            regex=r'^[+]?[0-9]{10,15}$',
-            message='Phone number must be 10-15 digits, optionally starting with +'
-        )]
-    )
+    phone = models.CharField(max_length=15, validators=[validate_phone])
     address = models.TextField()
     profile_photo = models.ImageField(upload_to='profile_photos/', blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -26,6 +27,44 @@ class UserProfile(models.Model):
         return f"{self.user.username} - {self.get_role_display()}"
 
 class FarmerProfile(models.Model):
+    REGION_CHOICES = [
+        ('andhra_pradesh', 'Andhra Pradesh'),
+        ('arunachal_pradesh', 'Arunachal Pradesh'),
+        ('assam', 'Assam'),
+        ('bihar', 'Bihar'),
+        ('chhattisgarh', 'Chhattisgarh'),
+        ('goa', 'Goa'),
+        ('gujarat', 'Gujarat'),
+        ('haryana', 'Haryana'),
+        ('himachal_pradesh', 'Himachal Pradesh'),
+        ('jharkhand', 'Jharkhand'),
+        ('karnataka', 'Karnataka'),
+        ('kerala', 'Kerala'),
+        ('madhya_pradesh', 'Madhya Pradesh'),
+        ('maharashtra', 'Maharashtra'),
+        ('manipur', 'Manipur'),
+        ('meghalaya', 'Meghalaya'),
+        ('mizoram', 'Mizoram'),
+        ('nagaland', 'Nagaland'),
+        ('odisha', 'Odisha'),
+        ('punjab', 'Punjab'),
+        ('rajasthan', 'Rajasthan'),
+        ('sikkim', 'Sikkim'),
+        ('tamil_nadu', 'Tamil Nadu'),
+        ('telangana', 'Telangana'),
+        ('tripura', 'Tripura'),
+        ('uttar_pradesh', 'Uttar Pradesh'),
+        ('uttarakhand', 'Uttarakhand'),
+        ('west_bengal', 'West Bengal'),
+        ('andaman_nicobar', 'Andaman and Nicobar Islands'),
+        ('chandigarh', 'Chandigarh'),
+        ('dadra_nagar_haveli_daman_diu', 'Dadra and Nagar Haveli and Daman and Diu'),
+        ('delhi', 'Delhi'),
+        ('jammu_kashmir', 'Jammu and Kashmir'),
+        ('ladakh', 'Ladakh'),
+        ('lakshadweep', 'Lakshadweep'),
+        ('puducherry', 'Puducherry'),
+    ]
     user_profile = models.OneToOneField(UserProfile, on_delete=models.CASCADE)
     farm_size = models.DecimalField(
         max_digits=10, 
@@ -33,6 +72,8 @@ class FarmerProfile(models.Model):
         validators=[MinValueValidator(0.01)],
         help_text="Farm size in acres"
     )
+    # Decides which database holds the farmer's listings, orders and bargains (core.shards)
+    region = models.CharField(max_length=30, choices=REGION_CHOICES, blank=True, default='', help_text="State or union territory")
     
     def __str__(self):
         return f"Farmer: {self.user_profile.user.get_full_name() or self.user_profile.user.username}"
@@ -40,28 +81,127 @@ class FarmerProfile(models.Model):
 class CompanyProfile(models.Model):
     user_profile = models.OneToOneField(UserProfile, on_delete=models.CASCADE)
     company_name = models.CharField(max_length=200)
-    registration_number = models.CharField(
-        max_length=50, 
-        unique=True,
-        db_index=True,
-        validators=[RegexValidator(
-            regex=r'^[A-Z0-9]{6,20}$',
-            message='Registration number must be 6-20 characters, alphanumeric uppercase only'
-        )]
-    )
-    
-    class Meta:
-        constraints = [
-            models.UniqueConstraint(
-                fields=['registration_number'],
-                name='unique_company_registration'
-            )
-        ]
+    # unique=True already creates the one index this column needs
+    registration_number = models.CharField(max_length=50, unique=True, validators=[validate_registration_number])
     
     def __str__(self):
         return self.company_name
 
-class WasteProduct(models.Model):
+class ShardedQuerySet(models.QuerySet):
+    def create(self, **kwargs):
+        # Saved without a database unless using() picked one, so ShardRouter places the row (core.shards)
+        obj = self.model(**kwargs)
+        self._for_write = True
+        obj.save(force_insert=True, using=self._db)
+        return obj
+
+def crop_label(field='crop_name'):
+    """``CASE`` expression turning a crop_name column into its display label."""
+    whens = [When(**{field: value}, then=Value(label)) for value, label in WasteProduct.CROP_CHOICES]
+    return Case(*whens, default=F(field), output_field=models.CharField())
+
+class AnnotatedDecimalField(DecimalField):
+    """Output field for decimal annotations, rounded to ``decimal_places`` like a column (SQLite returns floats)."""
+    def from_db_value(self, value, expression, connection):
+        return None if value is None else Decimal(value).quantize(Decimal(1).scaleb(-self.decimal_places))
+
+def _product(left, right):
+    # Exact product of two 2-place columns, as quantity * price gives in Python
+    return ExpressionWrapper(left * right, output_field=AnnotatedDecimalField(max_digits=22, decimal_places=4))
+
+class WasteProductQuerySet(ShardedQuerySet):
+    def with_values(self):
+        """Annotate ``effective_price``, ``line_total`` (quantity × effective price) and ``crop_label``."""
+        effective_price = Coalesce(
+            'farmer_price_per_ton', 'admin_price_per_ton',
+            output_field=AnnotatedDecimalField(max_digits=10, decimal_places=2)
+        )
+        return self.annotate(
+            effective_price=effective_price,
+            line_total=_product(F('quantity'), effective_price),
+            crop_label=crop_label(),
+        )
+
+class OrderQuerySet(ShardedQuerySet):
+    def with_values(self):
+        """Annotate ``line_total`` (quantity × offered price) and the listing's ``crop_label``."""
+        return self.annotate(
+            line_total=_product(F('quantity_ordered'), F('company_price_per_ton')),
+            crop_label=crop_label('waste_product__crop_name'),
+        )
+
+class VersionedModel(models.Model):
+    """
+    Optimistic concurrency (core.concurrency): every save of an existing row
+    bumps ``version`` and only updates the row if it is still at the version
+    this instance was loaded with, raising VersionConflict otherwise.
+    """
+    version = models.PositiveIntegerField(default=1, editable=False)
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def changed_fields(self):
+        """Names of the fields assigned since the row was loaded, for ``save(update_fields=...)``."""
+        loaded = getattr(self, '_loaded_values', {})
+        return [
+            field.name for field in self._meta.concrete_fields
+            if field.attname in loaded and not field.primary_key and field.name != 'version'
+            and getattr(self, field.attname) != loaded[field.attname]
+        ]
+
+    def save(self, *args, update_fields=None, **kwargs):
+        if self._state.adding or self.pk is None:
+            from . import shards
+            if self.pk is None and shards.assign_ids([self]):
+                kwargs['force_insert'] = True
+            return super().save(*args, update_fields=update_fields, **kwargs)
+        if update_fields is not None:
+            if not update_fields:
+                return
+            auto_now = [field.name for field in self._meta.concrete_fields if getattr(field, 'auto_now', False)]
+            update_fields = {*update_fields, *auto_now, 'version'}
+        expected = self.version
+        self._expected_version = expected
+        self.version = expected + 1
+        try:
+            super().save(*args, update_fields=update_fields, **kwargs)
+        except BaseException:
+            self.version = expected
+            raise
+        finally:
+            self._expected_version = None
+        self._snapshot()
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using=using, fields=fields)
+        self._snapshot(fields)
+
+    def _snapshot(self, fields=None):
+        loaded = getattr(self, '_loaded_values', {})
+        for field in self._meta.concrete_fields:
+            if fields is None or field.name in fields or field.attname in fields:
+                loaded[field.attname] = getattr(self, field.attname)
+        self._loaded_values = loaded
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        expected = getattr(self, '_expected_version', None)
+        if expected is None:
+            return super()._do_update(base_qs, using, pk_val, values, update_fields, forced_update)
+        updated = super()._do_update(
+            base_qs.filter(version=expected), using, pk_val, values, update_fields, forced_update
+        )
+        if not updated and base_qs.filter(pk=pk_val).exists():
+            raise VersionConflict(self, expected)
+        return updated
+
+class WasteProduct(VersionedModel):
     CROP_CHOICES = [
         ('rice', 'Rice Residue'),
         ('wheat', 'Wheat Residue'),
@@ -97,6 +237,13 @@ class WasteProduct(models.Model):
         null=True,
         blank=True
     )
+    suggested_price_per_ton = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        help_text="Suggested from recent accepted trades (core.pricing)",
+        null=True,
+        blank=True
+    )
     location = models.CharField(max_length=200, help_text="Location where waste is available")
     description = models.TextField()
     photo = models.ImageField(upload_to='waste_photos/', blank=True, null=True)
@@ -104,8 +251,15 @@ class WasteProduct(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = WasteProductQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Used by the incremental analytics load (core.analytics)
+            models.Index(fields=['created_at'], name='waste_created'),
+            models.Index(fields=['updated_at'], name='waste_updated'),
+        ]
     
     def __str__(self):
         return f"{self.get_crop_name_display()} - {self.quantity} tons by {self.farmer}"
@@ -113,15 +267,26 @@ class WasteProduct(models.Model):
     def get_absolute_url(self):
         return reverse('waste_detail', kwargs={'pk': self.pk})
     
-    @property
+    def save(self, *args, **kwargs):
+        from django.db import transaction
+        # Keeps the dashboard counter update (core.counters) in the same transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    # Fallbacks for rows loaded without with_values(); the annotations take their place
+    @cached_property
     def effective_price(self):
         return self.farmer_price_per_ton or self.admin_price_per_ton
     
-    @property
-    def total_value(self):
+    @cached_property
+    def line_total(self):
         return self.quantity * self.effective_price
 
-class Order(models.Model):
+    @cached_property
+    def crop_label(self):
+        return self.get_crop_name_display()
+
+class Order(VersionedModel):
     STATUS_CHOICES = [
         ('pending_admin', 'Pending Admin Review'),
         ('sent_to_farmer', 'Sent to Farmer'),
@@ -151,8 +316,14 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = OrderQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at'], name='order_created'),
+            models.Index(fields=['updated_at'], name='order_updated'),
+        ]
     
     def __str__(self):
         return f"Order #{self.id} - {self.company.company_name} - {self.get_status_display()}"
@@ -164,7 +335,15 @@ class Order(models.Model):
                 self.total_price = self.quantity_ordered * self.company_price_per_ton
             super().save(*args, **kwargs)
 
-class PriceBargain(models.Model):
+    @cached_property
+    def line_total(self):
+        return self.quantity_ordered * self.company_price_per_ton
+
+    @cached_property
+    def crop_label(self):
+        return self.waste_product.crop_label
+
+class PriceBargain(VersionedModel):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
         ('accepted', 'Accepted'),
@@ -192,8 +371,351 @@ class PriceBargain(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = ShardedQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at'], name='bargain_created'),
+            models.Index(fields=['updated_at'], name='bargain_updated'),
+        ]
     
     def __str__(self):
-        return f"Bargain #{self.id} - {self.waste_product.crop_name} - {self.get_status_display()}"
\ No newline at end of file
+        return f"Bargain #{self.id} - {self.waste_product.crop_name} - {self.get_status_display()}"
+
+class NotificationEvent(models.Model):
+    """
+    Outbox row written in the same transaction as the order/bargain state
+    change it describes. The dispatcher fans it out to recipients later:
+    ``dispatched_at`` marks the in-app feed written, ``emailed_at`` the email
+    accepted by the mail server, retried until then (core.notifications).
+    """
+    EVENT_CHOICES = [
+        ('order_status', 'Order Status Changed'),
+        ('bargain_response', 'Bargain Response'),
+    ]
+
+    event_type = models.CharField(max_length=30, choices=EVENT_CHOICES)
+    recipient_ids = models.JSONField(default=list)
+    subject = models.CharField(max_length=200)
+    message = models.TextField()
+    link = models.CharField(max_length=200, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    dispatched_at = models.DateTimeField(null=True, blank=True)
+    emailed_at = models.DateTimeField(null=True, blank=True)
+    email_attempts = models.PositiveIntegerField(default=0)
+    email_retry_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(
+                fields=['id'],
+                name='notification_event_pending',
+                condition=models.Q(dispatched_at__isnull=True)
+            ),
+            models.Index(
+                fields=['id'],
+                name='notification_email_pending',
+                condition=models.Q(dispatched_at__isnull=False, emailed_at__isnull=True)
+            ),
+        ]
+
+    def __str__(self):
+        return f"Event #{self.id} - {self.get_event_type_display()}"
+
+class Notification(models.Model):
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
+    event = models.ForeignKey(NotificationEvent, on_delete=models.CASCADE, related_name='notifications')
+    subject = models.CharField(max_length=200)
+    message = models.TextField()
+    link = models.CharField(max_length=200, blank=True)
+    is_read = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['recipient', 'is_read'], name='notification_unread')
+        ]
+
+    def __str__(self):
+        return f"Notification for {self.recipient.username} - {self.subject}"
+
+class Counter(models.Model):
+    """
+    Denormalized dashboard statistic, kept current by core.counters.
+
+    Each row is one named figure for the whole site (scope 'global', owner_id 0)
+    or for one farmer/company profile. ``count`` holds the number of rows and
+    ``amount`` the matching sum (tons or rupees, depending on the name).
+    """
+    SCOPE_CHOICES = [
+        ('global', 'Global'),
+        ('farmer', 'Farmer'),
+        ('company', 'Company'),
+    ]
+
+    scope = models.CharField(max_length=10, choices=SCOPE_CHOICES)
+    owner_id = models.PositiveBigIntegerField(default=0)
+    name = models.CharField(max_length=50)
+    count = models.BigIntegerField(default=0)
+    amount = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'owner_id', 'name'], name='unique_counter')
+        ]
+
+    def __str__(self):
+        return f"{self.scope}:{self.owner_id} {self.name} = {self.count} / {self.amount}"
+
+class ChangeLogEntry(models.Model):
+    """
+    Append-only record of a listing, order or bargain write, served to
+    partner integrations by the change feed (core.changes). ``id`` is the
+    feed's sequence; the owner ids decide who may read an entry.
+    """
+    RESOURCE_CHOICES = [
+        ('listing', 'Listing'),
+        ('order', 'Order'),
+        ('bargain', 'Bargain'),
+    ]
+    ACTION_CHOICES = [
+        ('saved', 'Saved'),
+        ('deleted', 'Deleted'),
+    ]
+
+    resource = models.CharField(max_length=10, choices=RESOURCE_CHOICES)
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    version = models.PositiveIntegerField()
+    data = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    farmer_id = models.PositiveBigIntegerField(null=True, blank=True)
+    company_id = models.PositiveBigIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            # Compaction finds superseded entries per object; readers scan their own rows
+            models.Index(fields=['resource', 'object_id', 'id'], name='change_object'),
+            models.Index(fields=['farmer_id', 'id'], name='change_farmer'),
+            models.Index(fields=['company_id', 'id'], name='change_company'),
+            models.Index(fields=['created_at'], name='change_created'),
+        ]
+
+    def __str__(self):
+        return f"Change #{self.id} - {self.resource} {self.object_id} {self.action}"
+
+class Job(models.Model):
+    """
+    Background job for core.jobs, claimed and run by ``run_workers`` processes.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    ]
+
+    queue = models.CharField(max_length=50, default='default')
+    task = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    idempotency_key = models.CharField(max_length=200, unique=True, null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField()
+    locked_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['run_at', 'id']
+        indexes = [
+            models.Index(fields=['queue', 'status', 'run_at'], name='job_claim'),
+        ]
+
+    def __str__(self):
+        return f"Job #{self.id} {self.task} [{self.queue}] - {self.get_status_display()}"
+
+class DailyFact(models.Model):
+    """
+    One pre-aggregated row per day x crop x status, rebuilt by core.analytics.
+    ``date`` is the local date the source row was created and ``week`` the
+    Monday of that week, so weekly charts can group in SQL on any backend.
+    """
+    date = models.DateField()
+    week = models.DateField()
+    crop_name = models.CharField(max_length=20, choices=WasteProduct.CROP_CHOICES)
+    status = models.CharField(max_length=20)
+    tons = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        abstract = True
+
+class OrderFact(DailyFact):
+    orders = models.PositiveIntegerField(default=0)
+    value = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'crop_name', 'status'], name='unique_order_fact')
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.crop_name} {self.status}: {self.orders} orders, {self.tons} t"
+
+class ListingFact(DailyFact):
+    listings = models.PositiveIntegerField(default=0)
+    value = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'crop_name', 'status'], name='unique_listing_fact')
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.crop_name} {self.status}: {self.listings} listings, {self.tons} t"
+
+class BargainFact(DailyFact):
+    """``tons`` is the listed quantity the bargains were about."""
+    bargains = models.PositiveIntegerField(default=0)
+    countered = models.PositiveIntegerField(default=0)
+    # Sum over countered bargains of (proposed - counter) / proposed * 100
+    discount_pct_total = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'crop_name', 'status'], name='unique_bargain_fact')
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.crop_name} {self.status}: {self.bargains} bargains"
+
+class FactWatermark(models.Model):
+    """Source rows updated before ``loaded_until`` are already in the fact table ``name``."""
+    name = models.CharField(max_length=50, unique=True)
+    loaded_until = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.name} loaded until {self.loaded_until}"
+
+class ShardSequence(models.Model):
+    """
+    Last id handed out for the sharded table ``name``. Ids come from here
+    rather than each database's own sequence so they stay unique across
+    shards (core.shards).
+    """
+    name = models.CharField(max_length=50, unique=True)
+    last_id = models.BigIntegerField()
+
+    def __str__(self):
+        return f"{self.name} at {self.last_id}"
+
+class ArchivedWasteProduct(models.Model):
+    """
+    A sold listing moved out of WasteProduct by core.archive, with the same id
+    and columns. Its bargains move to ArchivedBargain with it.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    farmer = models.ForeignKey(FarmerProfile, on_delete=models.CASCADE, related_name='archived_waste_products')
+    crop_name = models.CharField(max_length=20, choices=WasteProduct.CROP_CHOICES)
+    quantity = models.DecimalField(max_digits=10, decimal_places=2)
+    admin_price_per_ton = models.DecimalField(max_digits=10, decimal_places=2)
+    farmer_price_per_ton = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    suggested_price_per_ton = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    location = models.CharField(max_length=200)
+    description = models.TextField()
+    photo = models.ImageField(upload_to='waste_photos/', blank=True, null=True)
+    status = models.CharField(max_length=10, choices=WasteProduct.STATUS_CHOICES)
+    version = models.PositiveIntegerField(default=1)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['created_at'], name='archived_waste_created')]
+
+    def __str__(self):
+        return f"{self.get_crop_name_display()} - {self.quantity} tons by {self.farmer} (archived)"
+
+    get_absolute_url = WasteProduct.get_absolute_url
+    effective_price = WasteProduct.effective_price
+    line_total = WasteProduct.line_total
+    crop_label = WasteProduct.crop_label
+
+class ArchivedOrder(models.Model):
+    """
+    A completed or rejected order moved out of Order by core.archive, with the
+    same id and columns. The listing may be hot or archived, so it is kept as
+    a plain id with its crop, location and farmer copied alongside.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    company = models.ForeignKey(CompanyProfile, on_delete=models.CASCADE, related_name='archived_orders')
+    farmer = models.ForeignKey(FarmerProfile, on_delete=models.CASCADE, related_name='archived_orders')
+    waste_product_id = models.BigIntegerField(db_index=True)
+    crop_name = models.CharField(max_length=20, choices=WasteProduct.CROP_CHOICES)
+    location = models.CharField(max_length=200)
+    quantity_ordered = models.DecimalField(max_digits=10, decimal_places=2)
+    company_price_per_ton = models.DecimalField(max_digits=10, decimal_places=2)
+    total_price = models.DecimalField(max_digits=12, decimal_places=2)
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    notes = models.TextField(blank=True)
+    admin_notes = models.TextField(blank=True)
+    version = models.PositiveIntegerField(default=1)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at'], name='archived_order_created'),
+            models.Index(fields=['status', 'created_at'], name='archived_order_status'),
+        ]
+
+    def __str__(self):
+        return f"Order #{self.id} - {self.company.company_name} - {self.get_status_display()} (archived)"
+
+    line_total = Order.line_total
+
+    @cached_property
+    def crop_label(self):
+        return self.get_crop_name_display()
+
+    @property
+    def waste_product(self):
+        """The listing, hot or archived. core.archive.order_history fetches these in bulk."""
+        if not hasattr(self, '_waste_product'):
+            from .archive import find_listing
+            self._waste_product = find_listing(self.waste_product_id)
+        return self._waste_product
+
+class ArchivedBargain(models.Model):
+    """A settled bargain on an archived listing, with the listing's crop, location and quantity copied."""
+    id = models.BigIntegerField(primary_key=True)
+    waste_product_id = models.BigIntegerField(db_index=True)
+    crop_name = models.CharField(max_length=20, choices=WasteProduct.CROP_CHOICES)
+    location = models.CharField(max_length=200)
+    quantity = models.DecimalField(max_digits=10, decimal_places=2)
+    farmer_proposed_price = models.DecimalField(max_digits=10, decimal_places=2)
+    admin_counter_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    farmer_message = models.TextField()
+    admin_message = models.TextField(blank=True)
+    status = models.CharField(max_length=10, choices=PriceBargain.STATUS_CHOICES)
+    version = models.PositiveIntegerField(default=1)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['created_at'], name='archived_bargain_created')]
+
+    def __str__(self):
+        return f"Bargain #{self.id} - {self.crop_name} - {self.get_status_display()} (archived)"
@@ -0,0 +1,155 @@
+"""
+Notification outbox and dispatcher.
+
+Views call ``queue_notification`` inside the same transaction as the state
+change, so an event is recorded if and only if the change commits. The
+``dispatch_notifications`` management command drains the outbox in batches,
+writing the in-app feed, then sends email through Django's mail backend.
+Each event records its email delivery, so a failing mail server only delays
+the email: it is retried with backoff until the server accepts it.
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from .models import NotificationEvent, Notification
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def queue_notification(event_type, recipients, subject, message, link=''):
+    """Write an outbox event for the given users. Returns None if nobody is left to notify."""
+    recipient_ids = sorted({user.id for user in recipients if user is not None})
+    if not recipient_ids:
+        return None
+    return NotificationEvent.objects.create(
+        event_type=event_type,
+        recipient_ids=recipient_ids,
+        subject=subject,
+        message=message,
+        link=link
+    )
+
+
+def admin_users():
+    return User.objects.filter(is_superuser=True, is_active=True)
+
+
+def dispatch_pending(batch_size=100):
+    """
+    Write the in-app feed for one batch of pending outbox events.
+    Returns the number of events dispatched. Email goes out separately
+    (``send_pending_emails``), so a mail server outage never loses the feed.
+    """
+    with transaction.atomic():
+        events = list(
+            NotificationEvent.objects.select_for_update(skip_locked=True)
+            .filter(dispatched_at__isnull=True)
+            .order_by('id')[:batch_size]
+        )
+        if not events:
+            return 0
+
+        user_ids = {user_id for event in events for user_id in event.recipient_ids}
+        users = User.objects.only('id', 'email', 'is_active').in_bulk(user_ids)
+
+        feed = []
+        unmailed = []
+        for event in events:
+            recipients = [users.get(user_id) for user_id in event.recipient_ids]
+            recipients = [user for user in recipients if user is not None and user.is_active]
+            feed.extend(
+                Notification(
+                    recipient=user,
+                    event=event,
+                    subject=event.subject,
+                    message=event.message,
+                    link=event.link
+                )
+                for user in recipients
+            )
+            if not any(user.email for user in recipients):
+                unmailed.append(event.id)
+
+        Notification.objects.bulk_create(feed, batch_size=500)
+        now = timezone.now()
+        NotificationEvent.objects.filter(id__in=[event.id for event in events]).update(dispatched_at=now)
+        NotificationEvent.objects.filter(id__in=unmailed).update(emailed_at=now)
+
+    logger.info("Dispatched %s notification events (%s deliveries)", len(events), len(feed))
+    return len(events)
+
+
+def _email_backoff(attempts):
+    return timedelta(seconds=min(
+        settings.NOTIFICATION_EMAIL_BACKOFF_BASE * 2 ** (attempts - 1), settings.NOTIFICATION_EMAIL_BACKOFF_MAX
+    ))
+
+
+def send_pending_emails(batch_size=100):
+    """
+    Email the recipients of dispatched events. An event is marked emailed only
+    once the mail server has accepted its messages; a failure is retried with
+    exponential backoff, up to NOTIFICATION_EMAIL_MAX_ATTEMPTS. Delivery is
+    at least once: a retry may repeat messages the server took before failing.
+    Returns the number of events emailed.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        events = list(
+            NotificationEvent.objects.select_for_update(skip_locked=True)
+            .filter(
+                dispatched_at__isnull=False, emailed_at__isnull=True,
+                email_attempts__lt=settings.NOTIFICATION_EMAIL_MAX_ATTEMPTS,
+            )
+            .filter(Q(email_retry_at__isnull=True) | Q(email_retry_at__lte=now))
+            .order_by('id')[:batch_size]
+        )
+        if not events:
+            return 0
+        # Sending happens outside the transaction; the lease keeps other dispatchers off these rows meanwhile
+        NotificationEvent.objects.filter(id__in=[event.id for event in events]).update(
+            email_attempts=F('email_attempts') + 1,
+            email_retry_at=now + timedelta(seconds=settings.NOTIFICATION_EMAIL_LEASE)
+        )
+
+    user_ids = {user_id for event in events for user_id in event.recipient_ids}
+    users = User.objects.filter(is_active=True).exclude(email='').only('id', 'email').in_bulk(user_ids)
+    connection = get_connection()
+    emailed = 0
+    for event in events:
+        attempts = event.email_attempts + 1
+        messages = [
+            EmailMessage(
+                subject=event.subject,
+                body=event.message,
+                from_email=settings.DEFAULT_FROM_EMAIL,
+                to=[users[user_id].email]
+            )
+            for user_id in event.recipient_ids if user_id in users
+        ]
+        try:
+            if messages:
+                connection.send_messages(messages)
+        except Exception as e:
+            NotificationEvent.objects.filter(id=event.id).update(email_retry_at=timezone.now() + _email_backoff(attempts))
+            if attempts >= settings.NOTIFICATION_EMAIL_MAX_ATTEMPTS:
+                logger.error("Giving up emailing notification event %s after %s attempts: %s", event.id, attempts, e)
+            else:
+                logger.warning("Failed to email notification event %s (attempt %s): %s", event.id, attempts, e)
+            continue
+        NotificationEvent.objects.filter(id=event.id).update(emailed_at=timezone.now(), email_retry_at=None)
+        emailed += 1
+
+    if emailed:
+        logger.info("Emailed %s notification events", emailed)
+    return emailed
+
+
+def unread_count(user):
+    """Single lookup against the (recipient, is_read) index."""
+    return Notification.objects.filter(recipient_id=user.id, is_read=False).count()
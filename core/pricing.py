@@ -0,0 +1,207 @@
+"""
+Suggested prices for new listings.
+
+``build_model`` reads every accepted trade of the last
+``PRICING_HISTORY_DAYS``: orders the farmer accepted at the company's price
+and bargains accepted at the farmer's price. It groups them by crop,
+location and quantity band and computes, with NumPy over the whole history
+at once, a trimmed mean (``PRICING_TRIM`` cut from each end) and the
+interquartile band of the price per ton for every group.
+
+A suggestion uses the most specific group with at least
+``PRICING_MIN_SAMPLES`` trades: crop + location + band, then crop + band,
+then the crop alone. The model is a plain dict, cached in the default
+cache and kept per process for ``PRICING_MODEL_TTL`` seconds, so ``suggest``
+is a few dict lookups. ``python manage.py suggest_prices`` rebuilds it and
+fills ``suggested_price_per_ton`` on unpriced listings.
+"""
+import time
+from bisect import bisect_right
+from itertools import chain
+from datetime import timedelta
+from decimal import Decimal
+from typing import NamedTuple
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from . import shards
+from .models import WasteProduct, Order, PriceBargain, ArchivedOrder, ArchivedBargain
+
+# Placeholder admin price of a listing nobody has priced yet
+UNPRICED = Decimal('0.01')
+
+# Upper bounds (tons) of the quantity bands; the last band is open-ended
+QUANTITY_BANDS = (5, 20, 100)
+ACCEPTED_ORDER_STATUSES = ('accepted_by_farmer', 'approved_by_admin', 'completed')
+MODEL_CACHE_KEY = 'pricing:model'
+CENTS = Decimal('0.01')
+
+
+class Suggestion(NamedTuple):
+    price: Decimal
+    low: Decimal
+    high: Decimal
+    samples: int
+    basis: str
+
+    def as_dict(self):
+        return self._asdict()
+
+
+class PriceModel:
+    def __init__(self, table, samples):
+        self.table = table
+        self.samples = samples
+        self.built_at = timezone.now()
+
+    def suggest(self, crop_name, location, quantity):
+        """Best Suggestion for a listing, or None if the crop has no accepted trades yet."""
+        band = quantity_band(quantity)
+        table = self.table
+        return (
+            table.get((crop_name, normalize_location(location), band))
+            or table.get((crop_name, None, band))
+            or table.get((crop_name, None, None))
+        )
+
+
+def normalize_location(location):
+    return ' '.join((location or '').lower().split())
+
+
+def quantity_band(quantity):
+    return bisect_right(QUANTITY_BANDS, float(quantity or 0))
+
+
+def _history(since):
+    """(crop names, locations, quantities, prices) of accepted trades since ``since``, hot and archived, on every shard."""
+    querysets = []
+    for model, listing in ((Order, 'waste_product__'), (ArchivedOrder, '')):
+        querysets.append(model.objects.filter(status__in=ACCEPTED_ORDER_STATUSES, created_at__gte=since).values_list(
+            f'{listing}crop_name', f'{listing}location', 'quantity_ordered', 'company_price_per_ton'
+        ))
+    for model, listing in ((PriceBargain, 'waste_product__'), (ArchivedBargain, '')):
+        querysets.append(model.objects.filter(status='accepted', updated_at__gte=since).values_list(
+            f'{listing}crop_name', f'{listing}location', f'{listing}quantity', 'farmer_proposed_price'
+        ))
+    rows = list(chain.from_iterable(shards.each_shard(lambda alias: [
+        row for queryset in querysets for row in queryset.using(alias).iterator(chunk_size=5000)
+    ])))
+    if not rows:
+        return None
+    crops, locations, quantities, prices = zip(*rows)
+    return (
+        np.array(crops, dtype=object),
+        np.array([normalize_location(location) for location in locations], dtype=object),
+        np.array(quantities, dtype=float),
+        np.array(prices, dtype=float),
+    )
+
+
+def group_stats(codes, prices, trim, quantiles=(0.25, 0.75)):
+    """
+    Trimmed mean and quantiles of ``prices`` per distinct value of ``codes``.
+    Returns (codes, counts, means, [values per quantile]).
+    """
+    order = np.lexsort((prices, codes))
+    codes, prices = codes[order], prices[order]
+    groups, starts, counts = np.unique(codes, return_index=True, return_counts=True)
+    group_of = np.repeat(np.arange(len(groups)), counts)
+    rank = np.arange(len(codes)) - starts[group_of]
+    cut = np.floor(counts * trim).astype(np.int64)
+    keep = (rank >= cut[group_of]) & (rank < (counts - cut)[group_of])
+    means = np.bincount(group_of[keep], weights=prices[keep], minlength=len(groups)) / (counts - 2 * cut)
+    bands = []
+    for q in quantiles:
+        position = q * (counts - 1)
+        lower = np.floor(position).astype(np.int64)
+        upper = np.minimum(lower + 1, counts - 1)
+        low_value = prices[starts + lower]
+        bands.append(low_value + (prices[starts + upper] - low_value) * (position - lower))
+    return groups, counts, means, bands
+
+
+def _money(value):
+    return Decimal(str(value)).quantize(CENTS)
+
+
+def build_model(now=None):
+    since = (now or timezone.now()) - timedelta(days=settings.PRICING_HISTORY_DAYS)
+    history = _history(since)
+    if history is None:
+        return PriceModel({}, 0)
+    crops, locations, quantities, prices = history
+    crop_names, crop_codes = np.unique(crops, return_inverse=True)
+    location_names, location_codes = np.unique(locations, return_inverse=True)
+    band_codes = np.digitize(quantities, QUANTITY_BANDS, right=False)
+    band_count = len(QUANTITY_BANDS) + 1
+
+    levels = [
+        ('crop, location and quantity', (crop_codes * len(location_names) + location_codes) * band_count + band_codes,
+         lambda code: (crop_names[code // band_count // len(location_names)],
+                       location_names[code // band_count % len(location_names)], int(code % band_count))),
+        ('crop and quantity', crop_codes * band_count + band_codes,
+         lambda code: (crop_names[code // band_count], None, int(code % band_count))),
+        ('crop', crop_codes, lambda code: (crop_names[code], None, None)),
+    ]
+    table = {}
+    for basis, codes, key_of in levels:
+        # Coarsest level always answers; finer ones need enough trades to beat it
+        min_samples = 1 if basis == 'crop' else settings.PRICING_MIN_SAMPLES
+        groups, counts, means, (low, high) = group_stats(codes, prices, settings.PRICING_TRIM)
+        for i in np.flatnonzero(counts >= min_samples):
+            table[key_of(groups[i])] = Suggestion(
+                _money(means[i]), _money(low[i]), _money(high[i]), int(counts[i]), basis
+            )
+    return PriceModel(table, len(prices))
+
+
+_local = {'model': None, 'loaded': 0.0}
+
+
+def get_model(rebuild=False):
+    """The shared model: this process's copy, then the cache, then a fresh build."""
+    now = time.monotonic()
+    model = _local['model']
+    if rebuild or model is None or now - _local['loaded'] > settings.PRICING_MODEL_TTL:
+        model = None if rebuild else cache.get(MODEL_CACHE_KEY)
+        if model is None:
+            model = build_model()
+            cache.set(MODEL_CACHE_KEY, model, timeout=None)
+        _local['model'], _local['loaded'] = model, now
+    return model
+
+
+def suggest(crop_name, location, quantity):
+    return get_model().suggest(crop_name, location, quantity)
+
+
+def suggested_price(listing):
+    """Suggested price per ton for an unsaved listing, or None."""
+    suggestion = suggest(listing.crop_name, listing.location, listing.quantity)
+    return suggestion.price if suggestion else None
+
+
+def fill_suggestions(model=None, everything=False, batch_size=500):
+    """
+    Store a suggestion on every unpriced listing (every listing with
+    ``everything``). Returns the number of listings updated.
+    """
+    model = model or get_model()
+    listings = WasteProduct.objects.only('id', 'crop_name', 'location', 'quantity', 'suggested_price_per_ton')
+    if not everything:
+        listings = listings.filter(admin_price_per_ton__lte=UNPRICED)
+    updated = 0
+    for alias in shards.aliases():
+        changed = []
+        for listing in listings.using(alias).iterator(chunk_size=batch_size):
+            suggestion = model.suggest(listing.crop_name, listing.location, listing.quantity)
+            price = suggestion.price if suggestion else None
+            if price != listing.suggested_price_per_ton:
+                listing.suggested_price_per_ton = price
+                changed.append(listing)
+        # Advisory column only: not counted, so skipping save() signals and the version bump is fine
+        WasteProduct.objects.using(alias).bulk_update(changed, ['suggested_price_per_ton'], batch_size=batch_size)
+        updated += len(changed)
+    return updated
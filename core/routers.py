@@ -0,0 +1,125 @@
+"""
+Database routing.
+
+Listings, orders and bargains are stored on their farmer's region shard
+(ShardRouter, core.shards); everything else is written to ``default``.
+Read-heavy report views can opt in to reading from the optional ``replica``
+alias (configured with REPLICA_DATABASE_URL) by running inside
+``replica_reads()``, or by using the ``read_from_replica`` decorator /
+``ReplicaReadMixin``. The replica mirrors ``default`` only.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+
+REPLICA_ALIAS = 'replica'
+
+_use_replica = ContextVar('use_replica', default=False)
+
+
+@contextmanager
+def replica_reads():
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def read_from_replica(view_func):
+    """
+    Run a function view (including template rendering) with reads routed to
+    the replica. Works for ``async def`` views too: the flag is a context
+    variable, so ORM calls made through ``sync_to_async`` inherit it.
+    """
+    if iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def async_wrapper(request, *args, **kwargs):
+            with replica_reads():
+                return await view_func(request, *args, **kwargs)
+        return async_wrapper
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        with replica_reads():
+            return view_func(request, *args, **kwargs)
+    return wrapper
+
+
+class ReplicaReadMixin:
+    """Class-based view counterpart of read_from_replica; renders the response inside the context."""
+
+    def dispatch(self, request, *args, **kwargs):
+        with replica_reads():
+            response = super().dispatch(request, *args, **kwargs)
+            if hasattr(response, 'render') and not getattr(response, 'is_rendered', True):
+                response.render()
+        return response
+
+
+def read_alias(alias):
+    """The database to read ``alias``'s rows from: the replica for default under replica_reads()."""
+    if alias == 'default' and _use_replica.get() and REPLICA_ALIAS in settings.DATABASES:
+        return REPLICA_ALIAS
+    return alias
+
+
+class ShardRouter:
+    """
+    Keeps sharded rows on their shard: a stored row is read from and written
+    to the database it came from, and a new one goes to its farmer's shard.
+    Queries without an instance fall through to ``default``; core.shards
+    runs them on every shard. Only sharded and reference tables of the core
+    app are created on the other shards.
+    """
+
+    def db_for_read(self, model, **hints):
+        from . import shards
+        if model._meta.label_lower not in shards.SHARDED:
+            return None
+        instance = hints.get('instance')
+        if instance is None:
+            return None
+        if isinstance(instance, shards.FarmerProfile):
+            return read_alias(shards.for_farmer(instance))
+        if instance._state.db:
+            return read_alias(instance._state.db)
+        return None
+
+    def db_for_write(self, model, **hints):
+        from . import shards
+        instance = hints.get('instance')
+        if instance is None or model._meta.label_lower not in shards.SHARDED:
+            return None
+        if isinstance(instance, shards.FarmerProfile):
+            return shards.for_farmer(instance)
+        if isinstance(instance, model):
+            return shards.shard_of(instance)
+        if instance._meta.label_lower in shards.SHARDED:
+            # Assigning a related row, e.g. an order's listing
+            return instance._state.db
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == 'default' or db not in settings.SHARDS or app_label != 'core' or model_name is None:
+            return None
+        from . import shards
+        return f'{app_label}.{model_name}' in shards.SHARDED | shards.REFERENCES
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _use_replica.get() and REPLICA_ALIAS in settings.DATABASES:
+            return REPLICA_ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
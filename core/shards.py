@@ -0,0 +1,626 @@
+"""
+Region sharding of marketplace data.
+
+Listings, orders and bargains, and their archive tables (core.archive), are
+stored in the database of the listing farmer's region: ``SHARD_REGIONS``
+maps regions onto the aliases in ``SHARDS``, and regions not listed stay on
+``default``. Orders and bargains live with their listing, so joins between
+them never leave a shard.
+
+Accounts belong to ``default``. Users, profiles and companies are copied to
+the other shards as reference tables once each change commits
+(``copy_references``), so shard queries can still join to farmers and
+companies and keep their foreign keys.
+
+ShardRouter (core.routers) keeps a row's reads and writes on its shard and
+places new rows on their farmer's. Queries that are not about one farmer go
+through the helpers here, which run them on every shard and merge the
+results:
+
+- ``gather``: rows in the queryset's order, or only the first ``limit``;
+- ``grouped``: ``values().annotate()`` totals with Sum, Count, Min, Max and Avg;
+- ``count``, and ``find`` for the one row matching a lookup such as an id.
+
+Shards are queried in parallel, ``SHARD_READ_THREADS`` at a time, unless the
+caller is in a transaction. Ids of sharded rows come from ShardSequence on
+``default`` so they are unique across shards and survive moves.
+``rebalance`` moves the rows of farmers whose region now maps to a different
+shard (``python manage.py rebalance_shards``).
+
+With only ``default`` configured, every helper runs a single query there and
+ids come from the database as before.
+"""
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from functools import partial
+from itertools import chain
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, IntegrityError, connections, transaction
+from django.db.models import Avg, Count, Exists, Max, Min, OuterRef, Sum
+from django.http import Http404
+from . import changes, counters, tracing
+from .routers import read_alias
+from .models import (
+    UserProfile, FarmerProfile, CompanyProfile, WasteProduct, Order, PriceBargain,
+    ArchivedWasteProduct, ArchivedOrder, ArchivedBargain, ShardSequence
+)
+import logging
+
+logger = logging.getLogger(__name__)
+
+SHARDED_MODELS = (WasteProduct, Order, PriceBargain, ArchivedWasteProduct, ArchivedOrder, ArchivedBargain)
+# Copied from default to every shard, parents first
+REFERENCE_MODELS = (User, UserProfile, FarmerProfile, CompanyProfile)
+# Hot tables numbered by ShardSequence, with the archive that keeps their ids
+SEQUENCES = {WasteProduct: ArchivedWasteProduct, Order: ArchivedOrder, PriceBargain: ArchivedBargain}
+
+SHARDED = frozenset(model._meta.label_lower for model in SHARDED_MODELS)
+REFERENCES = frozenset(model._meta.label_lower for model in REFERENCE_MODELS)
+
+# Copy passes per farmer before rebalance gives up on rows that keep changing
+MAX_MOVE_PASSES = 5
+
+
+def aliases():
+    return settings.SHARDS
+
+
+def enabled():
+    return len(settings.SHARDS) > 1
+
+
+def for_region(region):
+    return settings.SHARD_REGIONS.get(region, DEFAULT_DB_ALIAS)
+
+
+def for_farmer(farmer):
+    return for_region(farmer.region)
+
+
+def shard_of(instance):
+    """
+    The shard a sharded row is stored on, or belongs on if it is new. None
+    while a new row has no farmer or listing yet, e.g. when a ModelForm
+    validates constraints before the view fills them in.
+    """
+    if instance._state.db and not instance._state.adding:
+        return instance._state.db
+    if isinstance(instance, (WasteProduct, ArchivedWasteProduct, ArchivedOrder)):
+        return for_farmer(instance.farmer) if instance.farmer_id is not None else None
+    if isinstance(instance, (Order, PriceBargain)):
+        if instance.waste_product_id is None:
+            return None
+        listing = instance._state.fields_cache.get('waste_product')
+        if listing is None:
+            listing = find(WasteProduct._base_manager.filter(pk=instance.waste_product_id))
+        return shard_of(listing) if listing is not None else DEFAULT_DB_ALIAS
+    return None
+
+
+# Ids
+
+_local = threading.local()
+
+
+@contextmanager
+def _sequence_transaction():
+    """
+    A transaction on default for ShardSequence, on this thread's second
+    connection so an id is committed as soon as it is handed out, whatever
+    transaction the caller is in. SQLite has one writer at a time anyway and
+    a commit from a second connection would stop a caller's transaction that
+    has already read from writing, so there the caller's connection is used.
+    """
+    if connections[DEFAULT_DB_ALIAS].vendor == 'sqlite':
+        with transaction.atomic(using=DEFAULT_DB_ALIAS):
+            yield connections[DEFAULT_DB_ALIAS]
+        return
+    connection = getattr(_local, 'sequence_connection', None)
+    if connection is None:
+        connection = _local.sequence_connection = connections.create_connection(DEFAULT_DB_ALIAS)
+    connection.close_if_unusable_or_obsolete()
+    connection.ensure_connection()
+    connection.set_autocommit(False)
+    try:
+        yield connection
+        connection.commit()
+    except BaseException:
+        connection.rollback()
+        raise
+    finally:
+        connection.set_autocommit(True)
+
+
+def _highest_id(model):
+    tables = [model._meta.db_table, SEQUENCES[model]._meta.db_table]
+    highest = 0
+    for alias in aliases():
+        connection = connections[alias]
+        with connection.cursor() as cursor:
+            for table in tables:
+                cursor.execute(f'SELECT MAX(id) FROM {connection.ops.quote_name(table)}')
+                highest = max(highest, cursor.fetchone()[0] or 0)
+    return highest
+
+
+def allocate_ids(model, count=1):
+    """Reserve ``count`` consecutive ids for ``model`` on every shard. Returns them as a range."""
+    name = model._meta.label_lower
+    for attempt in range(2):
+        try:
+            with _sequence_transaction() as connection:
+                table = connection.ops.quote_name(ShardSequence._meta.db_table)
+                with connection.cursor() as cursor:
+                    cursor.execute(f'UPDATE {table} SET last_id = last_id + %s WHERE name = %s', [count, name])
+                    if cursor.rowcount == 0:
+                        # The first allocation starts above every id already stored
+                        cursor.execute(
+                            f'INSERT INTO {table} (name, last_id) VALUES (%s, %s)', [name, _highest_id(model) + count]
+                        )
+                    cursor.execute(f'SELECT last_id FROM {table} WHERE name = %s', [name])
+                    last_id = cursor.fetchone()[0]
+        except IntegrityError:
+            # Another process created the sequence first
+            if attempt:
+                raise
+            continue
+        return range(last_id - count + 1, last_id + 1)
+
+
+def assign_ids(instances):
+    """
+    Give new rows of one sequenced model their ids. Returns False, leaving
+    the numbering to the database, when only default is configured.
+    """
+    if not enabled() or not instances:
+        return False
+    for instance, pk in zip(instances, allocate_ids(type(instances[0]), len(instances))):
+        instance.pk = pk
+    return True
+
+
+# Reference tables
+
+def _copy_rows(model, rows, alias):
+    """Make ``alias``'s copies of ``rows``, loaded from default, match them."""
+    fields = [field for field in model._meta.concrete_fields if not field.primary_key]
+    manager = model._base_manager.using(alias)
+    stored = manager.in_bulk([row.pk for row in rows])
+    copied = 0
+    for row in rows:
+        values = {field.attname: getattr(row, field.attname) for field in fields}
+        copy = stored.get(row.pk)
+        if copy is None:
+            # raw: keeps auto_now columns and tells the receivers this is a copy
+            row.save_base(raw=True, force_insert=True, using=alias)
+        elif any(getattr(copy, name) != value for name, value in values.items()):
+            manager.filter(pk=row.pk).update(**values)
+        else:
+            continue
+        copied += 1
+    return copied
+
+
+def copy_references(model, pks):
+    """Copy rows of a reference model from default to the other shards."""
+    rows = list(model._base_manager.using(DEFAULT_DB_ALIAS).filter(pk__in=pks))
+    for alias in aliases():
+        if alias == DEFAULT_DB_ALIAS:
+            continue
+        try:
+            with transaction.atomic(using=alias):
+                _copy_rows(model, rows, alias)
+        except DatabaseError:
+            logger.exception(
+                "Could not copy %s %s to shard %s; run rebalance_shards to catch up", model._meta.label, pks, alias
+            )
+
+
+def sync_references(batch_size=1000):
+    """Copy every reference row to every shard. Returns {model label: rows written}."""
+    written = {}
+    for model in REFERENCE_MODELS:
+        written[model._meta.label] = 0
+        queryset = model._base_manager.using(DEFAULT_DB_ALIAS).order_by('pk')
+        for alias in aliases():
+            if alias == DEFAULT_DB_ALIAS:
+                continue
+            last_pk = 0
+            while True:
+                rows = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+                if not rows:
+                    break
+                with transaction.atomic(using=alias):
+                    written[model._meta.label] += _copy_rows(model, rows, alias)
+                last_pk = rows[-1].pk
+    return written
+
+
+def reference_saved(sender, instance, raw=False, using=DEFAULT_DB_ALIAS, update_fields=None, **kwargs):
+    """post_save receiver for users, profiles and companies."""
+    if raw or using != DEFAULT_DB_ALIAS or not enabled():
+        return
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        # Logging in changes nothing shard queries read
+        return
+    transaction.on_commit(partial(copy_references, sender, [instance.pk]), using=using)
+
+
+def reference_deleted(sender, instance, using=DEFAULT_DB_ALIAS, **kwargs):
+    """post_delete receiver for users, profiles and companies: the shards cascade as default did."""
+    if using != DEFAULT_DB_ALIAS or not enabled():
+        return
+
+    def delete():
+        for alias in aliases():
+            if alias != DEFAULT_DB_ALIAS:
+                sender._base_manager.using(alias).filter(pk=instance.pk).delete()
+
+    transaction.on_commit(delete, using=using)
+
+
+def remember_region(sender, instance, raw=False, using=DEFAULT_DB_ALIAS, **kwargs):
+    """pre_save receiver for FarmerProfile: the region as stored."""
+    instance._stored_region = None
+    if raw or using != DEFAULT_DB_ALIAS or instance._state.adding or not enabled():
+        return
+    instance._stored_region = FarmerProfile._base_manager.filter(pk=instance.pk).values_list('region', flat=True).first()
+
+
+def region_changed(sender, instance, created, raw=False, **kwargs):
+    """post_save receiver for FarmerProfile: queue moving the farmer's rows when their shard changes."""
+    stored = getattr(instance, '_stored_region', None)
+    instance._stored_region = None
+    if stored is None or for_region(stored) == for_region(instance.region):
+        return
+    from .jobs import enqueue
+    from .tasks import rebalance_farmer
+    enqueue(rebalance_farmer, farmer_id=instance.pk)
+
+
+# Reads across shards
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _reset_pool():
+    global _pool
+    _pool = None
+
+
+# Pool threads do not survive a fork, e.g. gunicorn's preloading master
+os.register_at_fork(after_in_child=_reset_pool)
+
+
+def _executor():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=settings.SHARD_READ_THREADS, thread_name_prefix='shard-read')
+        return _pool
+
+
+def shutdown():
+    """Stop the read threads, e.g. before forking; they start again when next needed."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown()
+
+
+def _run(func, alias):
+    # A request's trace is only touched by the thread serving it
+    tracing.current_trace.set(None)
+    # Pool threads keep their connections between queries like a request thread does
+    connection = connections[alias]
+    connection.close_if_unusable_or_obsolete()
+    try:
+        return func(alias)
+    finally:
+        connection.close_if_unusable_or_obsolete()
+
+
+def each_shard(func):
+    """
+    ``[func(alias) for alias in aliases()]``, run on the read threads when
+    there is more than one shard. Inside a transaction it runs in the calling
+    thread, whose connections see the transaction's own writes.
+    """
+    shard_aliases = aliases()
+    if (
+        len(shard_aliases) == 1 or not settings.SHARD_READ_THREADS
+        or any(connections[alias].in_atomic_block for alias in shard_aliases)
+    ):
+        return [func(alias) for alias in shard_aliases]
+    with tracing.span('shards.gather', shards=len(shard_aliases)):
+        futures = [
+            _executor().submit(contextvars.copy_context().run, _run, func, alias) for alias in shard_aliases
+        ]
+        return [future.result() for future in futures]
+
+
+def _ordering(queryset):
+    query = queryset.query
+    if query.order_by:
+        ordering = query.order_by
+    elif query.default_ordering:
+        ordering = queryset.model._meta.ordering
+    else:
+        return ()
+    if not all(isinstance(field, str) for field in ordering):
+        raise TypeError('Rows gathered from several shards can only be ordered by field names')
+    return ordering
+
+
+def _sort_value(row, name):
+    if isinstance(row, dict):
+        value = row[name]
+    else:
+        value = row
+        for part in name.split('__'):
+            value = getattr(value, part)
+    # None sorts first, as it does in SQLite
+    return (value is not None, value)
+
+
+def _merge(results, ordering):
+    if len(results) == 1:
+        return results[0]
+    rows, seen = [], set()
+    for row in chain.from_iterable(results):
+        pk = getattr(row, 'pk', None)
+        if pk is not None:
+            # A row being rebalanced can be on two shards for a moment
+            if pk in seen:
+                continue
+            seen.add(pk)
+        rows.append(row)
+    for field in reversed(ordering):
+        name = field.lstrip('-')
+        rows.sort(key=lambda row: _sort_value(row, name), reverse=field.startswith('-'))
+    return rows
+
+
+def gather(queryset, limit=None):
+    """
+    Rows of ``queryset`` from every shard as one list, in the queryset's
+    order. With ``limit`` each shard returns at most that many and only the
+    first ``limit`` overall are kept, e.g. a keyset page or the latest five.
+    """
+    ordering = _ordering(queryset)
+
+    def fetch(alias):
+        rows = queryset.using(read_alias(alias))
+        return list(rows[:limit] if limit is not None else rows)
+
+    rows = _merge(each_shard(fetch), ordering)
+    return rows[:limit] if limit is not None else rows
+
+
+def count(queryset):
+    return sum(each_shard(lambda alias: queryset.using(read_alias(alias)).count()))
+
+
+def find(queryset):
+    """The first row of ``queryset`` found on any shard, or None. For lookups that match one row."""
+    for alias in aliases():
+        row = queryset.using(read_alias(alias)).first()
+        if row is not None:
+            return row
+    return None
+
+
+def get_object_or_404(klass, *args, **kwargs):
+    """django.shortcuts.get_object_or_404 over every shard."""
+    queryset = klass._default_manager.all() if hasattr(klass, '_default_manager') else klass
+    row = find(queryset.filter(*args, **kwargs))
+    if row is None:
+        raise Http404(f'No {queryset.model._meta.object_name} matches the given query.')
+    return row
+
+
+def _combine(aggregate, values):
+    values = [value for value in values if value is not None]
+    if isinstance(aggregate, Count):
+        return sum(values)
+    if not values:
+        return None
+    if isinstance(aggregate, Min):
+        return min(values)
+    if isinstance(aggregate, Max):
+        return max(values)
+    return sum(values[1:], values[0])
+
+
+def grouped(queryset, *fields, ordering=(), **aggregates):
+    """
+    ``queryset.values(*fields).annotate(**aggregates)`` over every shard, as a
+    list of dicts sorted by ``ordering``. Sum and Count add up, Min and Max
+    keep the extreme and Avg is rebuilt from each shard's sum and count.
+    """
+    per_shard = {}
+    for name, aggregate in aggregates.items():
+        if isinstance(aggregate, Avg):
+            expressions, condition = aggregate.source_expressions, aggregate.filter
+            per_shard[f'{name}__sum'] = Sum(*expressions, filter=condition)
+            per_shard[f'{name}__count'] = Count(*expressions, filter=condition)
+        elif isinstance(aggregate, (Sum, Count, Min, Max)):
+            per_shard[name] = aggregate
+        else:
+            raise TypeError(f'{type(aggregate).__name__} cannot be combined across shards')
+
+    results = each_shard(
+        lambda alias: list(queryset.using(read_alias(alias)).values(*fields).annotate(**per_shard).order_by())
+    )
+    groups = {}
+    for row in chain.from_iterable(results):
+        groups.setdefault(tuple(row[field] for field in fields), []).append(row)
+    rows = []
+    for key, parts in groups.items():
+        row = dict(zip(fields, key))
+        for name, aggregate in aggregates.items():
+            if isinstance(aggregate, Avg):
+                total = _combine(Sum(), [part[f'{name}__sum'] for part in parts])
+                number = _combine(Count('pk'), [part[f'{name}__count'] for part in parts])
+                row[name] = total / number if number else None
+            else:
+                row[name] = _combine(aggregate, [part[name] for part in parts])
+        rows.append(row)
+    return _merge([rows, []], ordering) if ordering else rows
+
+
+@contextmanager
+def atomic(*shard_aliases):
+    """
+    A transaction on ``default`` and one on each of ``shard_aliases``. The
+    shards commit first and ``default`` last; there is no two-phase commit,
+    so if ``default`` then fails the shard writes stay. Counters can be
+    reconciled afterwards (``reconcile_counters``).
+    """
+    with ExitStack() as stack:
+        stack.enter_context(transaction.atomic(using=DEFAULT_DB_ALIAS))
+        for alias in sorted(set(shard_aliases) - {DEFAULT_DB_ALIAS}):
+            stack.enter_context(transaction.atomic(using=alias))
+        yield
+
+
+# Rebalancing
+
+def _copy(model, rows, target):
+    """Insert ``rows`` on ``target`` as they are, replacing copies left there by an interrupted run."""
+    model._base_manager.using(target).filter(pk__in=[row.pk for row in rows]).delete()
+    for row in rows:
+        row.save_base(raw=True, force_insert=True, using=target)
+
+
+def _delete_unchanged(model, rows, source):
+    """Delete ``rows`` from ``source`` unless they changed after being copied. Returns the ids deleted."""
+    current = dict(
+        model._base_manager.using(source).select_for_update()
+        .filter(pk__in=[row.pk for row in rows]).values_list('pk', 'version')
+    )
+    unchanged = [row.pk for row in rows if current.get(row.pk) == row.version]
+    model._base_manager.using(source).filter(pk__in=unchanged).delete()
+    return unchanged
+
+
+def _move_listings(farmer_id, source, target, batch_size):
+    """Move one chunk of a farmer's listings with their orders and bargains. Returns rows moved."""
+    ids = list(
+        WasteProduct._base_manager.using(source).filter(farmer_id=farmer_id)
+        .order_by('pk').values_list('pk', flat=True)[:batch_size]
+    )
+    if not ids:
+        return 0
+    listings = list(WasteProduct._base_manager.using(source).filter(pk__in=ids))
+    orders = list(Order._base_manager.using(source).filter(waste_product_id__in=ids))
+    bargains = list(PriceBargain._base_manager.using(source).filter(waste_product_id__in=ids))
+    with counters.suspended(), changes.suspended():
+        with transaction.atomic(using=target):
+            # Replacing a listing cascades to its old copies' orders and bargains
+            _copy(WasteProduct, listings, target)
+            _copy(Order, orders, target)
+            _copy(PriceBargain, bargains, target)
+        with transaction.atomic(using=source):
+            moved = len(_delete_unchanged(Order, orders, source)) + len(_delete_unchanged(PriceBargain, bargains, source))
+            # A listing still holding orders or bargains that changed meanwhile is copied again next pass
+            settled = [
+                listing for listing in listings if not WasteProduct._base_manager.using(source).filter(pk=listing.pk).filter(
+                    Exists(Order._base_manager.filter(waste_product=OuterRef('pk')))
+                    | Exists(PriceBargain._base_manager.filter(waste_product=OuterRef('pk')))
+                ).exists()
+            ]
+            moved += len(_delete_unchanged(WasteProduct, settled, source))
+    return moved
+
+
+def _move_archive(farmer_id, source, target, batch_size):
+    """Move one chunk of a farmer's archived rows, which never change. Returns rows moved."""
+    moved = 0
+    with counters.suspended():
+        for model in (ArchivedWasteProduct, ArchivedOrder):
+            rows = list(model._base_manager.using(source).filter(farmer_id=farmer_id).order_by('pk')[:batch_size])
+            if not rows:
+                continue
+            bargains = []
+            if model is ArchivedWasteProduct:
+                bargains = list(ArchivedBargain._base_manager.using(source).filter(
+                    waste_product_id__in=[row.pk for row in rows]
+                ))
+            with transaction.atomic(using=target):
+                _copy(model, rows, target)
+                _copy(ArchivedBargain, bargains, target)
+            with transaction.atomic(using=source):
+                ArchivedBargain._base_manager.using(source).filter(pk__in=[row.pk for row in bargains]).delete()
+                model._base_manager.using(source).filter(pk__in=[row.pk for row in rows]).delete()
+            moved += len(rows) + len(bargains)
+    return moved
+
+
+def move_farmer(farmer_id, source, target, batch_size=None):
+    """Move every row of one farmer from ``source`` to ``target``. Returns the number of rows moved."""
+    batch_size = batch_size or settings.SHARD_MOVE_BATCH_SIZE
+    moved = 0
+    for _ in range(MAX_MOVE_PASSES):
+        while True:
+            count = _move_archive(farmer_id, source, target, batch_size)
+            moved += count
+            if not count:
+                break
+        while True:
+            count = _move_listings(farmer_id, source, target, batch_size)
+            moved += count
+            if not count:
+                break
+        if not WasteProduct._base_manager.using(source).filter(farmer_id=farmer_id).exists():
+            return moved
+    logger.warning("Farmer %s still has listings on shard %s after %s passes", farmer_id, source, MAX_MOVE_PASSES)
+    return moved
+
+
+def misplaced_farmers(farmer_ids=None):
+    """{(farmer id, shard holding rows of theirs): shard their region maps to} for rows on the wrong shard."""
+    misplaced = {}
+    for alias in aliases():
+        held = set()
+        for model in (WasteProduct, ArchivedWasteProduct, ArchivedOrder):
+            queryset = model._base_manager.using(alias)
+            if farmer_ids is not None:
+                queryset = queryset.filter(farmer_id__in=farmer_ids)
+            held.update(queryset.values_list('farmer_id', flat=True).distinct().order_by())
+        regions = dict(FarmerProfile._base_manager.using(DEFAULT_DB_ALIAS).filter(pk__in=held).values_list('pk', 'region'))
+        for farmer_id in sorted(held):
+            if farmer_id not in regions:
+                logger.warning("Shard %s holds rows of farmer %s, who no longer exists", alias, farmer_id)
+                continue
+            target = for_region(regions[farmer_id])
+            if target != alias:
+                misplaced[(farmer_id, alias)] = target
+    return misplaced
+
+
+def rebalance(farmer_ids=None, batch_size=None, dry_run=False):
+    """
+    Move rows of farmers (all, or ``farmer_ids``) to the shard their region
+    maps to now. Returns {(source, target): rows moved}, or with ``dry_run``
+    {(source, target): farmers to move}.
+    """
+    moves = {}
+    for (farmer_id, source), target in misplaced_farmers(farmer_ids).items():
+        key = (source, target)
+        if dry_run:
+            moves[key] = moves.get(key, 0) + 1
+            continue
+        moves[key] = moves.get(key, 0) + move_farmer(farmer_id, source, target, batch_size)
+    if moves and not dry_run:
+        logger.info(
+            "Rebalanced shards: %s",
+            ', '.join(f'{count} rows from {source} to {target}' for (source, target), count in sorted(moves.items()))
+        )
+    return moves
@@ -0,0 +1,45 @@
+"""
+Signal receivers for the core app. Connected in CoreConfig.ready().
+"""
+from django.contrib.auth.models import User
+from django.db.backends.signals import connection_created
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from . import changes, counters, shards
+from .backends import invalidate_user_context
+from .models import UserProfile, FarmerProfile, CompanyProfile, WasteProduct, Order, PriceBargain
+from .sqlite import configure_sqlite_connection
+
+connection_created.connect(configure_sqlite_connection, dispatch_uid='core.sqlite_pragmas')
+
+
+@receiver([post_save, post_delete], sender=UserProfile)
+def invalidate_user_profile(sender, instance, **kwargs):
+    invalidate_user_context(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=FarmerProfile)
+@receiver([post_save, post_delete], sender=CompanyProfile)
+def invalidate_role_profile(sender, instance, **kwargs):
+    invalidate_user_context(instance.user_profile.user_id)
+
+
+for model in (WasteProduct, Order):
+    pre_save.connect(counters.remember_previous_state, sender=model, dispatch_uid=f'counters_pre_save_{model.__name__}')
+    post_save.connect(counters.count_saved, sender=model, dispatch_uid=f'counters_save_{model.__name__}')
+    post_delete.connect(counters.count_deleted, sender=model, dispatch_uid=f'counters_delete_{model.__name__}')
+
+for model in (WasteProduct, Order, PriceBargain):
+    post_save.connect(changes.record_saved, sender=model, dispatch_uid=f'changes_save_{model.__name__}')
+    post_delete.connect(changes.record_deleted, sender=model, dispatch_uid=f'changes_delete_{model.__name__}')
+
+for model in (User, FarmerProfile, CompanyProfile):
+    post_save.connect(counters.count_account_created, sender=model, dispatch_uid=f'counters_save_{model.__name__}')
+    post_delete.connect(counters.count_account_deleted, sender=model, dispatch_uid=f'counters_delete_{model.__name__}')
+
+for model in shards.REFERENCE_MODELS:
+    post_save.connect(shards.reference_saved, sender=model, dispatch_uid=f'shards_save_{model.__name__}')
+    post_delete.connect(shards.reference_deleted, sender=model, dispatch_uid=f'shards_delete_{model.__name__}')
+
+pre_save.connect(shards.remember_region, sender=FarmerProfile, dispatch_uid='shards_pre_save_region')
+post_save.connect(shards.region_changed, sender=FarmerProfile, dispatch_uid='shards_save_region')
@@ -0,0 +1,36 @@
+"""
+Connection tuning for single-node SQLite deployments.
+
+Every new SQLite connection gets the pragmas from ``settings.SQLITE_PRAGMAS``.
+WAL lets readers proceed while one writer commits, ``synchronous=NORMAL`` is
+safe under WAL and skips an fsync per transaction, and ``busy_timeout`` makes
+contending gunicorn workers wait for the lock instead of failing with
+"database is locked".
+"""
+from django.conf import settings
+
+# busy_timeout goes first so switching journal_mode waits for other connections' locks.
+PRAGMA_ORDER = ('busy_timeout', 'journal_mode', 'synchronous', 'cache_size', 'mmap_size', 'temp_store')
+
+
+def apply_pragmas(cursor, pragmas):
+    for name in PRAGMA_ORDER:
+        value = pragmas.get(name)
+        if value is not None:
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def is_memory_database(name):
+    name = str(name)
+    return name == ':memory:' or 'mode=memory' in name
+
+
+def configure_sqlite_connection(sender, connection, **kwargs):
+    """connection_created receiver."""
+    if connection.vendor != 'sqlite' or is_memory_database(connection.settings_dict['NAME']):
+        return
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', None)
+    if not pragmas:
+        return
+    with connection.cursor() as cursor:
+        apply_pragmas(cursor, pragmas)
@@ -0,0 +1,78 @@
+"""
+Background tasks run by ``python manage.py run_workers`` (see core.jobs).
+"""
+from django.contrib.sessions.models import Session
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image, ImageOps
+from .analytics import refresh_facts
+from .archive import archive_rows
+from .changes import compact_changes
+from .counters import reconcile_counters
+from .jobs import task
+from .shards import rebalance
+import logging
+
+logger = logging.getLogger(__name__)
+
+MAX_IMAGE_SIDE = 1600
+
+
+@task(queue='maintenance')
+def cleanup_expired_sessions():
+    deleted, _ = Session.objects.filter(expire_date__lt=timezone.now()).delete()
+    if deleted:
+        logger.info("Cleaned up %s expired sessions", deleted)
+
+
+@task(queue='maintenance')
+def rebuild_counters():
+    drift = reconcile_counters()
+    if drift:
+        logger.info("Reconciled %s dashboard counters", len(drift))
+
+
+@task(queue='maintenance')
+def refresh_analytics(full=False):
+    results = refresh_facts(full=full)
+    logger.info("Refreshed analytics facts: %s", ', '.join(f'{name} {written} rows' for name, (_, written) in results.items()))
+
+
+@task(queue='maintenance')
+def archive_finished_trades():
+    archive_rows()
+
+
+@task(queue='maintenance')
+def compact_change_log():
+    deleted = compact_changes()
+    logger.info("Compacted change feed: %s expired, %s superseded entries deleted", deleted['expired'], deleted['superseded'])
+
+
+@task(queue='maintenance')
+def rebalance_farmer(farmer_id):
+    """Move a farmer's rows to the shard of their new region."""
+    rebalance(farmer_ids=[farmer_id])
+
+
+@task(queue='media')
+def shrink_image(name):
+    """Downscale an uploaded photo in place so its longest side is at most MAX_IMAGE_SIDE."""
+    if not default_storage.exists(name):
+        return
+    with default_storage.open(name, 'rb') as f:
+        image = Image.open(f)
+        image.load()
+    if max(image.size) <= MAX_IMAGE_SIDE:
+        return
+    image_format = image.format
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((MAX_IMAGE_SIDE, MAX_IMAGE_SIDE))
+    with default_storage.open(name, 'wb') as f:
+        image.save(f, format=image_format, optimize=True)
+    logger.info("Resized %s to %sx%s", name, image.size[0], image.size[1])
+
+
+@task(queue='media')
+def delete_file(name):
+    default_storage.delete(name)
@@ -1,11 +0,0 @@
-from django import template
-
-register = template.Library()
-
-@register.filter
-def mul(value, arg):
-    """Multiplies the value by the argument."""
-    try:
-        return float(value) * float(arg)
-    except (ValueError, TypeError):
-        return 0
\ No newline at end of file
@@ -0,0 +1,86 @@
+import json
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from core.models import CompanyProfile, FarmerProfile, Order, PriceBargain, UserProfile, WasteProduct
+
+
+def make_profile(username, role):
+    user = User.objects.create_user(username, password='secret')
+    return UserProfile.objects.create(user=user, role=role, phone='9876543210', address='Ludhiana')
+
+
+@override_settings(RATE_LIMIT_ENABLED=False)
+class ApiTests(TestCase):
+    def setUp(self):
+        farmer = FarmerProfile.objects.create(user_profile=make_profile('farmer', 'farmer'), farm_size=12)
+        CompanyProfile.objects.create(
+            user_profile=make_profile('company', 'company'), company_name='Green Fuels', registration_number='GF1234'
+        )
+        self.listing = WasteProduct.objects.create(
+            farmer=farmer, crop_name='rice', quantity=10, admin_price_per_ton=100, location='Ludhiana'
+        )
+
+    def post(self, url, data):
+        return self.client.post(url, json.dumps(data), content_type='application/json')
+
+    def test_order_rejects_bad_waste_product(self):
+        self.client.login(username='company', password='secret')
+        for waste_product in ('abc', {'a': 1}, None, [1]):
+            response = self.post('/api/v1/orders/', {
+                'waste_product': waste_product, 'quantity_ordered': '2', 'company_price_per_ton': '100'
+            })
+            self.assertEqual(response.status_code, 400, waste_product)
+            self.assertEqual(response.json()['error'], 'waste_product must be an integer id')
+        response = self.post('/api/v1/orders/', {
+            'waste_product': self.listing.pk + 1000, 'quantity_ordered': '2', 'company_price_per_ton': '100'
+        })
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Order.objects.exists())
+
+    def test_order_created(self):
+        self.client.login(username='company', password='secret')
+        response = self.post('/api/v1/orders/', {
+            'waste_product': str(self.listing.pk), 'quantity_ordered': '2', 'company_price_per_ton': '100',
+            'version': self.listing.version,
+        })
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json()['result']['total_price'], '200.00')
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.status, 'reserved')
+
+    def test_order_stale_version(self):
+        self.client.login(username='company', password='secret')
+        response = self.post('/api/v1/orders/', {
+            'waste_product': self.listing.pk, 'quantity_ordered': '2', 'company_price_per_ton': '100',
+            'version': self.listing.version + 1,
+        })
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Order.objects.exists())
+
+    def test_bargain_rejects_bad_waste_product(self):
+        self.client.login(username='farmer', password='secret')
+        for waste_product in ('abc', {'a': 1}, None):
+            response = self.post('/api/v1/bargains/', {'waste_product': waste_product, 'proposed_price': '120'})
+            self.assertEqual(response.status_code, 400, waste_product)
+            self.assertEqual(response.json()['error'], 'waste_product must be an integer id')
+        response = self.post('/api/v1/bargains/', {'waste_product': self.listing.pk, 'proposed_price': '120', 'message': 'Fair price'})
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(PriceBargain.objects.get().waste_product_id, self.listing.pk)
+
+    def test_roles(self):
+        self.client.login(username='farmer', password='secret')
+        self.assertEqual(self.post('/api/v1/orders/', {'waste_product': self.listing.pk}).status_code, 403)
+        self.assertEqual(self.client.post('/api/v1/orders/', 'not json', content_type='application/json').status_code, 403)
+        self.client.login(username='company', password='secret')
+        self.assertEqual(self.client.post('/api/v1/orders/', 'not json', content_type='application/json').status_code, 400)
+
+    def test_list_pagination(self):
+        self.client.login(username='company', password='secret')
+        self.assertEqual(self.client.get('/api/v1/waste-products/', {'limit': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/v1/waste-products/', {'cursor': '!!'}).status_code, 400)
+        response = self.client.get('/api/v1/waste-products/', {'fields': 'id,crop_name'})
+        self.assertEqual(response.json()['results'], [{'id': self.listing.pk, 'crop_name': 'rice'}])
+        etag = response['ETag']
+        self.assertEqual(
+            self.client.get('/api/v1/waste-products/', {'fields': 'id,crop_name'}, HTTP_IF_NONE_MATCH=etag).status_code, 304
+        )
@@ -0,0 +1,52 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from core.backends import ProfileModelBackend, user_context_cache_key
+from core.models import FarmerProfile, UserProfile
+
+
+@override_settings(USER_CONTEXT_CACHE_TIMEOUT=300)
+class ProfileModelBackendTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('farmer', password='secret')
+        profile = UserProfile.objects.create(user=self.user, role='farmer', phone='9876543210', address='Ludhiana')
+        FarmerProfile.objects.create(user_profile=profile, farm_size=12, region='punjab')
+        self.backend = ProfileModelBackend()
+
+    def test_profiles_come_from_cache(self):
+        self.backend.get_user(self.user.id)
+        with self.assertNumQueries(1):
+            user = self.backend.get_user(self.user.id)
+            self.assertEqual(user.userprofile.farmerprofile.region, 'punjab')
+            self.assertIs(user.userprofile.user, user)
+
+    def test_cache_holds_no_user_data(self):
+        self.backend.get_user(self.user.id)
+        cached = cache.get(user_context_cache_key(self.user.id))
+        self.assertIsInstance(cached, UserProfile)
+        self.assertNotIn('user', cached._state.fields_cache)
+
+    def test_profile_save_invalidates_cache(self):
+        self.backend.get_user(self.user.id)
+        farmer = FarmerProfile.objects.get(user_profile__user=self.user)
+        farmer.region = 'kerala'
+        farmer.save()
+        self.assertEqual(self.backend.get_user(self.user.id).userprofile.farmerprofile.region, 'kerala')
+
+    def test_user_changes_apply_while_cached(self):
+        self.backend.get_user(self.user.id)
+        self.user.set_password('changed')
+        self.user.save()
+        user = self.backend.get_user(self.user.id)
+        self.assertEqual(user.get_session_auth_hash(), self.user.get_session_auth_hash())
+
+        User.objects.filter(id=self.user.id).update(is_active=False)
+        self.assertIsNone(self.backend.get_user(self.user.id))
+
+    def test_user_without_profile(self):
+        admin = User.objects.create_superuser('admin', password='secret')
+        self.backend.get_user(admin.id)
+        with self.assertNumQueries(1):
+            user = self.backend.get_user(admin.id)
+            self.assertFalse(hasattr(user, 'userprofile'))
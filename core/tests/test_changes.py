@@ -0,0 +1,115 @@
+import base64
+import time
+from asgiref.sync import sync_to_async
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.db.models import Q
+from django.test import TransactionTestCase, override_settings
+from django.utils import timezone
+from core import changes
+from core.models import ChangeLogEntry, FarmerProfile, UserProfile, WasteProduct
+
+
+def make_farmer(username):
+    user = User.objects.create_user(username, password='secret')
+    profile = UserProfile.objects.create(user=user, role='farmer', phone='9876543210', address='Ludhiana')
+    return FarmerProfile.objects.create(user_profile=profile, farm_size=12, region='punjab')
+
+
+def make_listing(farmer, crop_name='rice'):
+    return WasteProduct.objects.create(
+        farmer=farmer, crop_name=crop_name, quantity=10, admin_price_per_ton=100, location='Ludhiana'
+    )
+
+
+def _raw_cursor(text):
+    return base64.urlsafe_b64encode(text.encode()).decode().rstrip('=')
+
+
+@override_settings(CHANGE_FEED_SETTLE=0, RATE_LIMIT_ENABLED=False)
+class ChangeFeedTests(TransactionTestCase):
+    def setUp(self):
+        self.farmer = make_farmer('farmer')
+        self.visible = changes.visible_to(self.farmer.user_profile.user)
+
+    def test_cursor_paging(self):
+        _, cursor, has_more = changes.read_changes(self.visible)
+        self.assertFalse(has_more)
+        first, second, third = (make_listing(self.farmer) for _ in range(3))
+        first.quantity = 20
+        first.save()
+
+        entries, cursor, has_more = changes.read_changes(self.visible, cursor, limit=2)
+        self.assertEqual([(entry.object_id, entry.action) for entry in entries], [(first.pk, 'saved'), (second.pk, 'saved')])
+        self.assertTrue(has_more)
+        entries, cursor, has_more = changes.read_changes(self.visible, cursor, limit=2)
+        # Only the last entry per object is kept
+        self.assertEqual([(entry.object_id, entry.version) for entry in entries], [(third.pk, 1), (first.pk, 2)])
+        self.assertEqual(entries[1].data['quantity'], '20.00')
+        self.assertFalse(has_more)
+
+        third_id = third.pk
+        third.delete()
+        entries, cursor, has_more = changes.read_changes(self.visible, cursor)
+        self.assertEqual([(entry.object_id, entry.action) for entry in entries], [(third_id, 'deleted')])
+        self.assertEqual(changes.read_changes(self.visible, cursor)[0], [])
+
+    def test_only_visible_entries(self):
+        _, cursor, _ = changes.read_changes(Q())
+        make_listing(make_farmer('other'))
+        own = make_listing(self.farmer)
+        entries, _, _ = changes.read_changes(self.visible, cursor)
+        self.assertEqual([entry.object_id for entry in entries], [own.pk])
+
+    @override_settings(CHANGE_FEED_SETTLE=60)
+    def test_unsettled_entries_wait(self):
+        _, cursor, _ = changes.read_changes(self.visible)
+        make_listing(self.farmer)
+        entries, next_cursor, _ = changes.read_changes(self.visible, cursor)
+        self.assertEqual(entries, [])
+        self.assertEqual(changes.decode_cursor(next_cursor)[0], changes.decode_cursor(cursor)[0])
+
+    @override_settings(CHANGE_LOG_RETENTION_DAYS=30)
+    def test_cursor_expiry(self):
+        expired = changes.encode_cursor(0, timezone.now() - timedelta(days=31))
+        with self.assertRaises(changes.CursorExpired):
+            changes.read_changes(self.visible, expired)
+        self.client.login(username='farmer', password='secret')
+        self.assertEqual(self.client.get('/api/changes/', {'since': expired}).status_code, 410)
+
+    def test_malformed_cursor(self):
+        self.client.login(username='farmer', password='secret')
+        for cursor in ('not-a-cursor', _raw_cursor('1.99999999999999999999'), _raw_cursor('x.1'), _raw_cursor('1')):
+            with self.assertRaises(ValueError):
+                changes.read_changes(self.visible, cursor)
+            response = self.client.get('/api/changes/', {'since': cursor})
+            self.assertEqual(response.status_code, 400, cursor)
+            self.assertEqual(response.json()['error'], 'Invalid cursor')
+
+    def test_compaction(self):
+        listing = make_listing(self.farmer)
+        for quantity in (11, 12):
+            listing.quantity = quantity
+            listing.save()
+        old = ChangeLogEntry.objects.create(resource='listing', object_id=0, action='deleted', version=1)
+        ChangeLogEntry.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=60))
+        self.assertEqual(changes.compact_changes(retention_days=30), {'expired': 1, 'superseded': 2})
+        self.assertEqual(list(ChangeLogEntry.objects.values_list('object_id', 'version')), [(listing.pk, 3)])
+
+    def test_api_ignores_wait_under_wsgi(self):
+        self.client.login(username='farmer', password='secret')
+        cursor = self.client.get('/api/changes/').json()['next']
+        started = time.monotonic()
+        response = self.client.get('/api/changes/', {'since': cursor, 'wait': 5})
+        self.assertEqual(response.json()['changes'], [])
+        self.assertLess(time.monotonic() - started, 2)
+
+    @override_settings(CHANGE_FEED_POLL_INTERVAL=0.1)
+    async def test_api_long_poll_under_asgi(self):
+        user = await User.objects.aget(username='farmer')
+        await sync_to_async(self.async_client.force_login)(user)
+        cursor = (await self.async_client.get('/api/changes/')).json()['next']
+        started = time.monotonic()
+        response = await self.async_client.get('/api/changes/', {'since': cursor, 'wait': 1})
+        self.assertEqual(response.json()['changes'], [])
+        self.assertGreaterEqual(time.monotonic() - started, 1)
@@ -0,0 +1,95 @@
+from unittest import mock
+from django.contrib.auth.models import User
+from django.contrib.messages import get_messages
+from django.test import TestCase, override_settings
+from core.concurrency import VersionConflict, expect_version, retry_on_conflict
+from core.models import FarmerProfile, NotificationEvent, PriceBargain, UserProfile, WasteProduct
+
+
+@override_settings(RATE_LIMIT_ENABLED=False)
+class VersionedModelTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user('farmer', password='secret')
+        profile = UserProfile.objects.create(user=user, role='farmer', phone='9876543210', address='Ludhiana')
+        farmer = FarmerProfile.objects.create(user_profile=profile, farm_size=12)
+        self.listing = WasteProduct.objects.create(
+            farmer=farmer, crop_name='rice', quantity=10, admin_price_per_ton=100, location='Ludhiana'
+        )
+        self.bargain = PriceBargain.objects.create(
+            waste_product=self.listing, farmer_proposed_price=120, farmer_message='Fair price'
+        )
+        User.objects.create_superuser('admin', password='secret')
+
+    def test_stale_save_conflicts(self):
+        first = WasteProduct.objects.get(pk=self.listing.pk)
+        second = WasteProduct.objects.get(pk=self.listing.pk)
+        first.status = 'reserved'
+        first.save(update_fields=['status'])
+        self.assertEqual(first.version, self.listing.version + 1)
+
+        second.quantity = 5
+        with self.assertRaises(VersionConflict) as caught:
+            second.save(update_fields=['quantity'])
+        self.assertIs(caught.exception.instance, second)
+        current = WasteProduct.objects.get(pk=self.listing.pk)
+        self.assertEqual((current.status, current.quantity), ('reserved', 10))
+
+    def test_expect_version(self):
+        listing = WasteProduct.objects.get(pk=self.listing.pk)
+        expect_version(listing, str(listing.version - 1))
+        listing.status = 'sold'
+        with self.assertRaises(VersionConflict):
+            listing.save(update_fields=['status'])
+        # Malformed versions keep the loaded one
+        listing = expect_version(WasteProduct.objects.get(pk=self.listing.pk), 'abc')
+        listing.status = 'sold'
+        listing.save(update_fields=['status'])
+
+    def test_retry_on_conflict(self):
+        calls = []
+
+        def flaky():
+            calls.append(1)
+            if len(calls) < 3:
+                raise VersionConflict(self.listing, 1)
+            return 'done'
+
+        self.assertEqual(retry_on_conflict(flaky, backoff=0), 'done')
+        self.assertEqual(len(calls), 3)
+        calls.clear()
+        with self.assertRaises(VersionConflict):
+            retry_on_conflict(flaky, attempts=2, backoff=0)
+        self.assertEqual(len(calls), 2)
+
+    def respond(self, **data):
+        self.client.login(username='admin', password='secret')
+        return self.client.post(f'/bargain/{self.bargain.pk}/respond/', {'version': self.bargain.version, **data})
+
+    def test_accept_bargain(self):
+        response = self.respond(action='accept', admin_message='Agreed')
+        self.assertRedirects(response, '/bargains/', fetch_redirect_response=False)
+        self.bargain.refresh_from_db()
+        self.listing.refresh_from_db()
+        self.assertEqual(self.bargain.status, 'accepted')
+        self.assertEqual(self.listing.admin_price_per_ton, 120)
+        self.assertTrue(NotificationEvent.objects.exists())
+
+    def test_stale_bargain_response_refused(self):
+        PriceBargain.objects.get(pk=self.bargain.pk).save(update_fields=['farmer_message'])
+        response = self.respond(action='accept')
+        self.assertRedirects(response, f'/bargain/{self.bargain.pk}/respond/', fetch_redirect_response=False)
+        self.assertIn('bargain was changed', str(list(get_messages(response.wsgi_request))[0]))
+        self.bargain.refresh_from_db()
+        self.assertEqual(self.bargain.status, 'pending')
+
+    def test_listing_conflict_rolls_back_bargain(self):
+        conflict = VersionConflict(self.listing, self.listing.version)
+        with mock.patch('core.views.set_listing_price', side_effect=conflict):
+            response = self.respond(action='accept')
+        self.assertRedirects(response, f'/bargain/{self.bargain.pk}/respond/', fetch_redirect_response=False)
+        self.assertIn('listing was changed', str(list(get_messages(response.wsgi_request))[0]))
+        self.bargain.refresh_from_db()
+        self.listing.refresh_from_db()
+        self.assertEqual(self.bargain.status, 'pending')
+        self.assertEqual(self.listing.admin_price_per_ton, 100)
+        self.assertFalse(NotificationEvent.objects.exists())
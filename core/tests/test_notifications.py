@@ -0,0 +1,70 @@
+from datetime import timedelta
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core import mail
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from core.models import Notification, NotificationEvent
+from core.notifications import dispatch_pending, queue_notification, send_pending_emails
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class NotificationDispatchTests(TestCase):
+    def setUp(self):
+        self.farmer = User.objects.create_user('farmer', email='farmer@example.com', password='x')
+        self.admin = User.objects.create_user('admin', email='', password='x')
+
+    def queue(self, *recipients):
+        return queue_notification('order_placed', recipients, 'New order', 'You have a new order.')
+
+    def test_dispatch_writes_feed_then_emails(self):
+        event = self.queue(self.farmer)
+        self.assertEqual(dispatch_pending(), 1)
+        self.assertEqual(Notification.objects.filter(recipient=self.farmer, event=event).count(), 1)
+        self.assertEqual(mail.outbox, [])
+
+        self.assertEqual(send_pending_emails(), 1)
+        self.assertEqual([message.to for message in mail.outbox], [['farmer@example.com']])
+        event.refresh_from_db()
+        self.assertIsNotNone(event.emailed_at)
+        self.assertEqual(event.email_attempts, 1)
+        self.assertEqual(send_pending_emails(), 0)
+
+    def test_event_without_email_recipients_is_not_emailed(self):
+        event = self.queue(self.admin)
+        dispatch_pending()
+        event.refresh_from_db()
+        self.assertIsNotNone(event.emailed_at)
+        self.assertEqual(send_pending_emails(), 0)
+        self.assertEqual(mail.outbox, [])
+
+    def test_failed_send_is_retried_after_backoff(self):
+        event = self.queue(self.farmer)
+        dispatch_pending()
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError('down')):
+            self.assertEqual(send_pending_emails(), 0)
+        event.refresh_from_db()
+        self.assertIsNone(event.emailed_at)
+        self.assertEqual(event.email_attempts, 1)
+        self.assertGreater(event.email_retry_at, timezone.now())
+        self.assertEqual(mail.outbox, [])
+
+        # Not due yet
+        self.assertEqual(send_pending_emails(), 0)
+        NotificationEvent.objects.filter(id=event.id).update(email_retry_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(send_pending_emails(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+        event.refresh_from_db()
+        self.assertIsNotNone(event.emailed_at)
+        self.assertEqual(event.email_attempts, 2)
+
+    @override_settings(NOTIFICATION_EMAIL_MAX_ATTEMPTS=1)
+    def test_gives_up_after_max_attempts(self):
+        event = self.queue(self.farmer)
+        dispatch_pending()
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError('down')):
+            send_pending_emails()
+        NotificationEvent.objects.filter(id=event.id).update(email_retry_at=None)
+        self.assertEqual(send_pending_emails(), 0)
+        self.assertEqual(mail.outbox, [])
+        self.assertTrue(Notification.objects.filter(event=event).exists())
@@ -0,0 +1,49 @@
+import asyncio
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, override_settings
+from core.models import WasteProduct
+from core.routers import ReplicaRouter, ShardRouter, read_alias, read_from_replica, replica_reads
+
+WITH_REPLICA = {**settings.DATABASES, 'replica': {**settings.DATABASES['default'], 'TEST': {'MIRROR': 'default'}}}
+WITHOUT_REPLICA = {alias: database for alias, database in settings.DATABASES.items() if alias != 'replica'}
+
+
+@override_settings(DATABASES=WITH_REPLICA)
+class ReplicaRoutingTests(SimpleTestCase):
+    def test_reads_go_to_replica_only_when_asked(self):
+        self.assertEqual(User.objects.all().db, 'default')
+        with replica_reads():
+            self.assertEqual(User.objects.all().db, 'replica')
+            self.assertEqual(ReplicaRouter().db_for_write(User), 'default')
+        self.assertEqual(User.objects.all().db, 'default')
+
+    def test_shard_reads(self):
+        stored = WasteProduct()
+        stored._state.db = 'default'
+        with replica_reads():
+            self.assertEqual(ShardRouter().db_for_read(WasteProduct, instance=stored), 'replica')
+            # The replica mirrors default only
+            self.assertEqual(read_alias('north'), 'north')
+        self.assertEqual(ShardRouter().db_for_read(WasteProduct, instance=stored), 'default')
+
+    def test_decorator_sync_and_async(self):
+        @read_from_replica
+        def view(request):
+            return User.objects.all().db
+
+        @read_from_replica
+        async def async_view(request):
+            return User.objects.all().db
+
+        self.assertEqual(view(None), 'replica')
+        self.assertEqual(asyncio.run(async_view(None)), 'replica')
+        self.assertEqual(User.objects.all().db, 'default')
+
+
+@override_settings(DATABASES=WITHOUT_REPLICA)
+class NoReplicaTests(SimpleTestCase):
+    def test_falls_back_to_default(self):
+        with replica_reads():
+            self.assertEqual(User.objects.all().db, 'default')
+            self.assertEqual(read_alias('default'), 'default')
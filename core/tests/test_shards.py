@@ -0,0 +1,101 @@
+import json
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from core import shards
+from core.models import CompanyProfile, FarmerProfile, Order, UserProfile, WasteProduct
+
+SHARD_ALIASES = ('north', 'south')
+
+# The runner imports test modules before it creates the test databases, so
+# shards added here get an in-memory SQLite test database each
+for _alias in SHARD_ALIASES:
+    settings.DATABASES.setdefault(_alias, {
+        **connections.settings[DEFAULT_DB_ALIAS],
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': str(settings.BASE_DIR / f'{_alias}.sqlite3'),
+        'TEST': {**connections.settings[DEFAULT_DB_ALIAS]['TEST'], 'NAME': None, 'MIRROR': None},
+    })
+
+LISTING = {'crop_name': 'rice', 'quantity': '10', 'location': 'Ludhiana', 'description': 'Paddy straw'}
+
+
+def make_profile(username, role):
+    user = User.objects.create_user(username, password='secret')
+    return UserProfile.objects.create(user=user, role=role, phone='9876543210', address='Ludhiana')
+
+
+def make_farmer(username, region):
+    return FarmerProfile.objects.create(user_profile=make_profile(username, 'farmer'), farm_size=12, region=region)
+
+
+class CreateListingMixin:
+    def setUp(self):
+        self.farmer = make_farmer('farmer', 'punjab')
+        self.client.login(username='farmer', password='secret')
+
+    def create_with_form(self):
+        response = self.client.post('/waste/add/', LISTING)
+        self.assertEqual(response.status_code, 302)
+        return shards.gather(WasteProduct.objects.filter(farmer=self.farmer).order_by('-id'), limit=1)[0]
+
+    def create_with_api(self):
+        response = self.client.post('/api/v1/waste-products/', json.dumps(LISTING), content_type='application/json')
+        self.assertEqual(response.status_code, 201, response.content)
+        return shards.find(WasteProduct.objects.filter(pk=response.json()['result']['id']))
+
+
+@override_settings(RATE_LIMIT_ENABLED=False)
+class CreateListingTests(CreateListingMixin, TestCase):
+    def test_form(self):
+        listing = self.create_with_form()
+        self.assertEqual((listing.farmer_id, listing._state.db), (self.farmer.id, 'default'))
+
+    def test_api(self):
+        listing = self.create_with_api()
+        self.assertEqual((listing.farmer_id, listing._state.db), (self.farmer.id, 'default'))
+
+
+@override_settings(
+    RATE_LIMIT_ENABLED=False,
+    SHARDS=[DEFAULT_DB_ALIAS, *SHARD_ALIASES],
+    SHARD_REGIONS={'punjab': 'north', 'kerala': 'south'},
+)
+class ShardedListingTests(CreateListingMixin, TransactionTestCase):
+    databases = {DEFAULT_DB_ALIAS, *SHARD_ALIASES}
+
+    def test_created_on_region_shard(self):
+        self.assertEqual(self.create_with_form()._state.db, 'north')
+        self.assertEqual(self.create_with_api()._state.db, 'north')
+        self.assertEqual(WasteProduct.objects.using('north').count(), 2)
+        self.assertFalse(WasteProduct.objects.using(DEFAULT_DB_ALIAS).exists())
+        self.assertEqual(shards.count(WasteProduct.objects.all()), 2)
+
+    def test_unmapped_region_stays_on_default(self):
+        farmer = make_farmer('goa_farmer', 'goa')
+        listing = WasteProduct.objects.create(farmer=farmer, admin_price_per_ton=100, **LISTING)
+        self.assertEqual(listing._state.db, DEFAULT_DB_ALIAS)
+
+    def test_rebalance_moves_listing_with_its_orders(self):
+        listing = self.create_with_form()
+        company = CompanyProfile.objects.create(
+            user_profile=make_profile('company', 'company'), company_name='Green Fuels', registration_number='GF1234'
+        )
+        self.assertTrue(CompanyProfile.objects.using('south').filter(pk=company.pk).exists())
+        order = Order.objects.create(
+            waste_product=listing, company=company, quantity_ordered=2, company_price_per_ton=100, total_price=200
+        )
+        self.assertEqual(order._state.db, 'north')
+
+        self.farmer.region = 'kerala'
+        self.farmer.save()
+        self.assertEqual(shards.rebalance(dry_run=True), {('north', 'south'): 1})
+        shards.rebalance()
+
+        self.assertFalse(WasteProduct.objects.using('north').exists())
+        self.assertFalse(Order.objects.using('north').exists())
+        moved = WasteProduct.objects.using('south').get(pk=listing.pk)
+        self.assertEqual(moved.version, listing.version)
+        self.assertEqual(Order.objects.using('south').get(pk=order.pk).waste_product_id, listing.pk)
+        self.assertEqual(shards.rebalance(dry_run=True), {})
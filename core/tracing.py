@@ -0,0 +1,431 @@
+"""
+Request tracing.
+
+``TracingMiddleware`` starts a trace for a sampled fraction of requests
+(``TRACE_SAMPLE_RATE``, or the sampled flag of an incoming W3C
+``traceparent`` header) and records nested spans for:
+
+* every middleware in ``settings.MIDDLEWARE`` below it, and the view
+* each template render
+* each SQL query, on every database alias
+* each cache call
+
+It works in both the WSGI and the ASGI stack (agroconnect/asgi.py); under
+ASGI the spans of ORM calls made through ``sync_to_async`` land in the same
+trace because the context variable follows the call into the worker thread.
+
+Finished traces are written to the ``core.traces`` logger. Its queue handler
+serializes them on the logging thread as OTLP/JSON lines, one
+``ExportTraceServiceRequest`` per request, which an OpenTelemetry collector's
+``filelog``/``otlpjsonfile`` receiver can read.
+
+Requests that are not sampled only pay for one context variable lookup per
+instrumented call. The trace id is also added to every log record (see
+core.log) so logs and spans can be joined.
+"""
+import contextvars
+import json
+import os
+import random
+import time
+import types
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from .log import request_context
+import logging
+
+logger = logging.getLogger('core.traces')
+
+current_trace = contextvars.ContextVar('current_trace', default=None)
+
+# OTLP SpanKind values
+INTERNAL, SERVER, CLIENT = 1, 2, 3
+STATUS_ERROR = 2
+
+CACHE_METHODS = (
+    'get', 'set', 'add', 'delete', 'touch', 'incr', 'decr', 'has_key',
+    'get_many', 'set_many', 'delete_many', 'clear',
+)
+MAX_STATEMENT_LENGTH = 2000
+MAX_SPANS = 2000
+
+
+class Span:
+    __slots__ = ('span_id', 'parent_id', 'name', 'kind', 'start', 'end', 'attributes', 'error')
+
+    def __init__(self, name, parent_id, kind, attributes):
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+        self.error = None
+        self.start = time.time_ns()
+        self.end = None
+
+    def to_otlp(self, trace_id):
+        span = {
+            'traceId': trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': self.kind,
+            'startTimeUnixNano': str(self.start),
+            'endTimeUnixNano': str(self.end or self.start),
+            'attributes': [_attribute(key, value) for key, value in self.attributes.items() if value is not None],
+        }
+        if self.parent_id:
+            span['parentSpanId'] = self.parent_id
+        if self.error:
+            span['status'] = {'code': STATUS_ERROR, 'message': self.error}
+        return span
+
+
+class Trace:
+    """The spans of one request. Only touched by the thread serving it."""
+
+    def __init__(self, trace_id=None, parent_id=None):
+        self.trace_id = trace_id or os.urandom(16).hex()
+        self.spans = []
+        self.stack = [parent_id] if parent_id else []
+        self.dropped = 0
+
+    def span(self, name, kind=INTERNAL, **attributes):
+        return _SpanScope(self, name, kind, attributes)
+
+    def export(self):
+        return OtlpPayload(self)
+
+
+class _SpanScope:
+    __slots__ = ('trace', 'span', 'name', 'kind', 'attributes')
+
+    def __init__(self, trace, name, kind, attributes):
+        self.trace, self.name, self.kind, self.attributes = trace, name, kind, attributes
+
+    def __enter__(self):
+        trace = self.trace
+        self.span = Span(self.name, trace.stack[-1] if trace.stack else None, self.kind, self.attributes)
+        if len(trace.spans) < MAX_SPANS:
+            trace.spans.append(self.span)
+        else:
+            trace.dropped += 1
+        trace.stack.append(self.span.span_id)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        self.span.end = time.time_ns()
+        if exc is not None:
+            self.span.error = f'{exc_type.__name__}: {exc}'
+        self.trace.stack.pop()
+        return False
+
+
+class OtlpPayload:
+    """Serialized lazily, on the logging thread, by ``str()``."""
+
+    def __init__(self, trace):
+        self.trace = trace
+
+    def __str__(self):
+        trace = self.trace
+        return json.dumps({'resourceSpans': [{
+            'resource': {'attributes': [
+                _attribute('service.name', getattr(settings, 'TRACE_SERVICE_NAME', 'agroconnect')),
+                _attribute('process.pid', os.getpid()),
+            ]},
+            'scopeSpans': [{
+                'scope': {'name': __name__},
+                'spans': [span.to_otlp(trace.trace_id) for span in trace.spans],
+            }],
+        }]}, separators=(',', ':'), default=str)
+
+
+def _attribute(key, value):
+    if isinstance(value, bool):
+        typed = {'boolValue': value}
+    elif isinstance(value, int):
+        typed = {'intValue': str(value)}
+    elif isinstance(value, float):
+        typed = {'doubleValue': value}
+    else:
+        typed = {'stringValue': str(value)}
+    return {'key': key, 'value': typed}
+
+
+def span(name, kind=INTERNAL, **attributes):
+    """
+    Context manager for an extra span inside the current trace. Does nothing
+    (and yields None) when the request is not sampled.
+    """
+    trace = current_trace.get()
+    if trace is None:
+        return _NOOP
+    return trace.span(name, kind, **attributes)
+
+
+class _NoopScope:
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopScope()
+
+
+def parse_traceparent(header):
+    """Return (trace_id, parent_span_id, sampled) from a W3C traceparent header, or None."""
+    parts = header.split('-')
+    if len(parts) < 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        flags = int(parts[3][:2], 16)
+        int(parts[1], 16), int(parts[2], 16)
+    except ValueError:
+        return None
+    if parts[1] == '0' * 32 or parts[2] == '0' * 16:
+        return None
+    return parts[1], parts[2], bool(flags & 1)
+
+
+def _traced_handler(get_response, name, kind=INTERNAL):
+    if iscoroutinefunction(get_response):
+        async def ahandler(request):
+            trace = current_trace.get()
+            if trace is None:
+                return await get_response(request)
+            with trace.span(name, kind) as current:
+                response = await get_response(request)
+                match = getattr(request, 'resolver_match', None)
+                if name == 'view' and match is not None:
+                    current.attributes['code.function'] = match.view_name
+                return response
+        return ahandler
+
+    def handler(request):
+        trace = current_trace.get()
+        if trace is None:
+            return get_response(request)
+        with trace.span(name, kind) as current:
+            response = get_response(request)
+            match = getattr(request, 'resolver_match', None)
+            if name == 'view' and match is not None:
+                current.attributes['code.function'] = match.view_name
+            return response
+    return handler
+
+
+def _instrument_chain(get_response):
+    """
+    Wrap each middleware's ``get_response`` so the next layer down runs in
+    its own span. Relies on ``convert_exception_to_response`` exposing the
+    middleware instance as ``__wrapped__``; layers Django had to adapt
+    between sync and async are left as they are.
+    """
+    top = _traced_handler(get_response, _layer_name(get_response))
+    layer = get_response
+    while True:
+        instance = getattr(layer, '__wrapped__', None)
+        inner = getattr(instance, 'get_response', None)
+        if inner is None or not callable(inner):
+            break
+        instance.get_response = _traced_handler(inner, _layer_name(inner))
+        layer = inner
+    return top
+
+
+def _layer_name(layer):
+    instance = getattr(layer, '__wrapped__', None)
+    if instance is None or isinstance(instance, (types.MethodType, types.FunctionType)):
+        # BaseHandler._get_response: URL resolution, process_view and the view
+        return 'view'
+    cls = type(instance)
+    return f'middleware {cls.__module__}.{cls.__qualname__}'
+
+
+def _sql_span(execute, sql, params, many, context):
+    trace = current_trace.get()
+    if trace is None:
+        return execute(sql, params, many, context)
+    connection = context['connection']
+    with trace.span(
+        'db.query', CLIENT,
+        **{
+            'db.system': connection.vendor,
+            'db.name': connection.alias,
+            'db.statement': sql[:MAX_STATEMENT_LENGTH],
+            'db.executemany': many or None,
+        }
+    ):
+        return execute(sql, params, many, context)
+
+
+def _add_sql_wrapper(connection, **kwargs):
+    # Installed for good rather than per request: under ASGI the ORM runs in
+    # worker threads, each with its own connection objects.
+    if _sql_span not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_sql_span)
+
+
+def _traced_cache_method(method, operation):
+    def wrapper(self, *args, **kwargs):
+        trace = current_trace.get()
+        if trace is None:
+            return method(self, *args, **kwargs)
+        key = args[0] if args and isinstance(args[0], str) else None
+        with trace.span(
+            f'cache.{operation}', CLIENT,
+            **{'cache.backend': type(self).__name__, 'cache.key': key}
+        ):
+            return method(self, *args, **kwargs)
+    wrapper.__name__ = method.__name__
+    wrapper.__qualname__ = method.__qualname__
+    wrapper.__doc__ = method.__doc__
+    wrapper._traced = True
+    return wrapper
+
+
+def _traced_render(render):
+    def wrapper(self, context):
+        trace = current_trace.get()
+        if trace is None:
+            return render(self, context)
+        name = self.origin.template_name if self.origin else None
+        with trace.span(f'render {name or "<string>"}', **{'template.name': name}):
+            return render(self, context)
+    wrapper._traced = True
+    return wrapper
+
+
+_installed = False
+
+
+def install():
+    """
+    Patch template rendering and the configured cache backends and hook SQL
+    execution on every connection. Idempotent.
+    """
+    global _installed
+    if _installed:
+        return
+    from django.template.base import Template
+    from django.utils.module_loading import import_string
+
+    if not getattr(Template.render, '_traced', False):
+        Template.render = _traced_render(Template.render)
+    for options in settings.CACHES.values():
+        backend = import_string(options['BACKEND'])
+        for operation in CACHE_METHODS:
+            method = getattr(backend, operation, None)
+            if method is not None and not getattr(method, '_traced', False):
+                setattr(backend, operation, _traced_cache_method(method, operation))
+    connection_created.connect(_add_sql_wrapper, dispatch_uid='core.tracing.sql')
+    for connection in connections.all(initialized_only=True):
+        _add_sql_wrapper(connection)
+    _installed = True
+
+
+def sample_rate():
+    return getattr(settings, 'TRACE_SAMPLE_RATE', 0.0)
+
+
+class TracingMiddleware:
+    """
+    Root span per sampled request. Place it directly below
+    core.log.RequestLogMiddleware so the request id is already assigned.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.rate = sample_rate()
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        if self.rate > 0:
+            self.get_response = _instrument_chain(get_response)
+            install()
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        trace = self.start(request)
+        if trace is None:
+            return self.get_response(request)
+        token = current_trace.set(trace)
+        try:
+            with self.root_span(trace, request) as root:
+                response = self.get_response(request)
+                self.finish(root, request, response)
+            response['X-Trace-ID'] = trace.trace_id
+            return response
+        finally:
+            current_trace.reset(token)
+            self.export(trace)
+
+    async def __acall__(self, request):
+        trace = self.start(request)
+        if trace is None:
+            return await self.get_response(request)
+        token = current_trace.set(trace)
+        try:
+            with self.root_span(trace, request) as root:
+                response = await self.get_response(request)
+                self.finish(root, request, response)
+            response['X-Trace-ID'] = trace.trace_id
+            return response
+        finally:
+            current_trace.reset(token)
+            self.export(trace)
+
+    def start(self, request):
+        """Return a new Trace if the request is sampled, else None."""
+        parent_id = None
+        trace_id = None
+        sampled = self.rate >= 1 or (self.rate > 0 and random.random() < self.rate)
+        incoming = request.META.get('HTTP_TRACEPARENT')
+        if incoming:
+            parsed = parse_traceparent(incoming)
+            if parsed:
+                trace_id, parent_id, sampled = parsed[0], parsed[1], parsed[2] and self.rate > 0
+
+        log_context = request_context.get()
+        if not sampled:
+            if log_context is not None and trace_id:
+                log_context['trace_id'] = trace_id
+            return None
+
+        trace = Trace(trace_id, parent_id)
+        if log_context is not None:
+            log_context['trace_id'] = trace.trace_id
+        return trace
+
+    def root_span(self, trace, request):
+        return trace.span(
+            f'{request.method} {request.path}', SERVER,
+            **{
+                'http.method': request.method,
+                'http.target': request.path,
+                'http.request_id': getattr(request, 'request_id', None),
+            }
+        )
+
+    def finish(self, root, request, response):
+        root.attributes['http.status_code'] = response.status_code
+        if response.status_code >= 500:
+            root.error = f'HTTP {response.status_code}'
+        match = getattr(request, 'resolver_match', None)
+        if match is not None:
+            root.attributes['http.route'] = match.route
+        # Only report a user that something below already loaded
+        user = getattr(request, '_cached_user', None)
+        if user is not None and user.is_authenticated:
+            root.attributes['enduser.id'] = user.pk
+
+    def export(self, trace):
+        if trace.dropped:
+            trace.spans[0].attributes['trace.dropped_spans'] = trace.dropped
+        logger.info(trace.export())
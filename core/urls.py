@@ -1,6 +1,6 @@
 from django.urls import path
 from django.contrib.auth import views as auth_views
-from . import views
+from . import views, api
 from .auth_views import ConcurrentLoginView
 from .middleware import get_active_sessions_api, terminate_session_api
 
@@ -12,7 +12,8 @@ urlpatterns = [
     path('logout/', auth_views.LogoutView.as_view(), name='logout'),
     path('dashboard/', views.dashboard, name='dashboard'),
     path('admin-dashboard/', views.admin_dashboard, name='admin_dashboard'),
-    path('waste/', views.WasteProductListView.as_view(), name='waste_list'),
+    path('waste/', views.waste_list, name='waste_list'),
+    path('waste/page/', views.waste_list_page, name='waste_list_page'),
     path('waste/<int:pk>/', views.WasteProductDetailView.as_view(), name='waste_detail'),
     path('waste/add/', views.WasteProductCreateView.as_view(), name='waste_add'),
     path('order/<int:waste_id>/', views.place_order, name='place_order'),
@@ -35,6 +36,29 @@ urlpatterns = [
     path('admin-order/<int:order_id>/approve/', views.admin_approve_order, name='admin_approve_order'),
     path('admin/orders/<int:order_id>/complete/', views.admin_complete_order, name='admin_complete_order'),
     path('order-summary/', views.order_summary, name='order_summary'),
+    path('admin-analytics/', views.admin_analytics, name='admin_analytics'),
+    path('admin-analytics/refresh/', views.admin_analytics_refresh, name='admin_analytics_refresh'),
+    
+    # Admin Data Export / Import
+    path('admin-export/<str:dataset>/', views.admin_export, name='admin_export'),
+    path('admin-import/<str:dataset>/', views.admin_import, name='admin_import'),
+    
+    # Notifications
+    path('notifications/', views.notifications, name='notifications'),
+    path('api/notifications/unread/', views.unread_notifications_api, name='api_unread_notifications'),
+    
+    # JSON API v1
+    path('api/v1/waste-products/', api.waste_products, name='api_v1_waste_products'),
+    path('api/v1/waste-products/<int:pk>/', api.waste_product_detail, name='api_v1_waste_product_detail'),
+    path('api/v1/orders/', api.orders, name='api_v1_orders'),
+    path('api/v1/orders/<int:pk>/', api.order_detail, name='api_v1_order_detail'),
+    path('api/v1/bargains/', api.bargains, name='api_v1_bargains'),
+    path('api/v1/bargains/<int:pk>/', api.bargain_detail, name='api_v1_bargain_detail'),
+    path('api/v1/market-summary/', api.market_summary, name='api_v1_market_summary'),
+    path('api/v1/price-suggestion/', api.price_suggestion, name='api_v1_price_suggestion'),
+    
+    # Change feed for partner integrations
+    path('api/changes/', api.change_feed, name='api_changes'),
     
     # Session Management APIs
     path('api/sessions/', get_active_sessions_api, name='api_active_sessions'),
@@ -0,0 +1,13 @@
+"""
+Validators shared by the models and the registration/profile forms.
+
+Each RegexValidator compiles its pattern once at import, so forms and model
+``full_clean`` reuse the same compiled expression.
+"""
+from django.core.validators import RegexValidator
+
+PHONE_MESSAGE = 'Phone number must be 10-15 digits, optionally starting with +'
+REGISTRATION_NUMBER_MESSAGE = 'Registration number must be 6-20 characters, alphanumeric uppercase only'
+
+validate_phone = RegexValidator(regex=r'^[+]?[0-9]{10,15}$', message=PHONE_MESSAGE)
+validate_registration_number = RegexValidator(regex=r'^[A-Z0-9]{6,20}$', message=REGISTRATION_NUMBER_MESSAGE)
@@ -1,23 +1,71 @@
-from django.shortcuts import render, redirect, get_object_or_404
+from django.shortcuts import render, redirect
+from django.template.loader import render_to_string
+from django.utils.http import urlencode
 from django.contrib.auth import login
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib import messages
 from django.views.generic import ListView, DetailView, CreateView
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.views.decorators.csrf import csrf_protect
 from django.views.decorators.http import require_http_methods
 from django.core.exceptions import PermissionDenied
 from django.contrib.auth.views import LoginView
-from django.db import transaction
+from django.db import IntegrityError, transaction
 from django.contrib.auth.models import User
-from django.http import JsonResponse
-from .models import UserProfile, FarmerProfile, CompanyProfile, WasteProduct, Order, PriceBargain
+from django.http import JsonResponse, StreamingHttpResponse, Http404
+from django.utils import timezone
+from asgiref.sync import sync_to_async
+from .async_utils import alogin_required, arequire_http_methods
+from .models import (
+    UserProfile, FarmerProfile, CompanyProfile, WasteProduct, Order, PriceBargain, ArchivedWasteProduct, crop_label
+)
 from .forms import UserRegistrationForm, WasteProductForm, OrderForm, ProfileUpdateForm
+from .notifications import queue_notification, admin_users, unread_count
+from .data_io import EXPORT_FIELDS, BulkImporter, read_rows, stream_export
+from .routers import read_from_replica, ReplicaReadMixin
+from .concurrency import VersionConflict, expect_version, retry_on_conflict
+from .api import encode_cursor, decode_cursor
+from .counters import read_counters, sum_stats, OPEN_ORDER_STATUSES
+from .archive import order_history
+from . import analytics, pricing, shards
+from .jobs import enqueue
+from .tasks import shrink_image, delete_file, refresh_analytics
+import io
 import logging
+import time
+from datetime import timedelta
+from decimal import Decimal
 
 logger = logging.getLogger(__name__)
 
+CONFLICT_MESSAGE = 'This %s was changed by someone else while you were working on it. Review the latest details and try again.'
+
+def notify_order_status(order, recipients):
+    queue_notification(
+        'order_status',
+        recipients,
+        subject=f'Order #{order.id} is now {order.get_status_display()}',
+        message=(
+            f'Order #{order.id} for {order.quantity_ordered} tons of '
+            f'{order.waste_product.get_crop_name_display()} is now {order.get_status_display()}.'
+        ),
+        link=reverse('dashboard')
+    )
+
+def notify_bargain_response(bargain, outcome):
+    queue_notification(
+        'bargain_response',
+        [bargain.waste_product.farmer.user_profile.user],
+        subject=f'Your bargain #{bargain.id} was {outcome}',
+        message=(
+            f'Your price proposal of ₹{bargain.farmer_proposed_price}/ton for '
+            f'{bargain.waste_product.get_crop_name_display()} was {outcome}.'
+            + (f'\n\nAdmin message: {bargain.admin_message}' if bargain.admin_message else '')
+        ),
+        link=reverse('dashboard')
+    )
+
 class CustomLoginView(LoginView):
     template_name = 'registration/login.html'
     
@@ -44,25 +92,30 @@ def register_farmer(request):
 
                     FarmerProfile.objects.create(
                         user_profile=profile,
-                        farm_size=form.cleaned_data['farm_size']
+                        farm_size=form.cleaned_data['farm_size'],
+                        region=form.cleaned_data['region']
                     )
 
                     # Enhanced login with session tracking
-                    user.backend = 'django.contrib.auth.backends.ModelBackend'
+                    user.backend = 'core.backends.ProfileModelBackend'
                     login(request, user)
                     
                     # Log successful registration
-                    logger.info(f"New farmer registered: {user.username}")
+                    logger.info("New farmer registered: %s", user.username)
                     
                     messages.success(request, "Farmer registered successfully!")
                     return redirect('dashboard')
 
+            except IntegrityError:
+                # Lost a race with a concurrent signup using the same username/email/registration number
+                form.check_taken()
+                messages.error(request, "Please correct the errors below.")
             except Exception as e:
-                logger.error(f"Farmer registration failed for {form.cleaned_data.get('username', 'unknown')}: {e}")
+                logger.error("Farmer registration failed for %s: %s", form.cleaned_data.get('username', 'unknown'), e)
                 messages.error(request, f"Registration failed: {e}")
 
         else:
-            logger.warning(f"Farmer registration form errors: {form.errors}")
+            logger.warning("Farmer registration form errors: %s", form.errors)
             messages.error(request, "Please correct the errors below.")
 
     else:
@@ -90,19 +143,23 @@ def register_company(request):
                     )
                     
                     # Enhanced login with session tracking
-                    user.backend = 'django.contrib.auth.backends.ModelBackend'
+                    user.backend = 'core.backends.ProfileModelBackend'
                     login(request, user)
                     
                     # Log successful registration
-                    logger.info(f"New company registered: {user.username} - {form.cleaned_data['company_name']}")
+                    logger.info("New company registered: %s - %s", user.username, form.cleaned_data['company_name'])
                     
                     messages.success(request, 'Registration successful! Welcome to AgroConnect.')
                     return redirect('dashboard')
+            except IntegrityError:
+                # Lost a race with a concurrent signup using the same username/email/registration number
+                form.check_taken()
+                messages.error(request, "Please correct the errors below.")
             except Exception as e:
-                logger.error(f"Company registration failed for {form.cleaned_data.get('username', 'unknown')}: {e}")
+                logger.error("Company registration failed for %s: %s", form.cleaned_data.get('username', 'unknown'), e)
                 messages.error(request, f'Registration failed: {str(e)}')
         else:
-            logger.warning(f"Company registration form errors: {form.errors}")
+            logger.warning("Company registration form errors: %s", form.errors)
             for field, errors in form.errors.items():
                 for error in errors:
                     messages.error(request, f'{field}: {error}')
@@ -126,22 +183,28 @@ def dashboard(request):
         if profile.role == 'farmer':
             try:
                 farmer_profile = profile.farmerprofile
-                waste_products = WasteProduct.objects.filter(farmer=farmer_profile)
-                orders = Order.objects.filter(waste_product__farmer=farmer_profile).order_by('-created_at')
-                bargains = PriceBargain.objects.filter(waste_product__farmer=farmer_profile)
+                waste_products = shards.gather(WasteProduct.objects.with_values().filter(farmer=farmer_profile))
+                orders = order_history(farmer=farmer_profile)
+                bargains = shards.gather(PriceBargain.objects.filter(waste_product__farmer=farmer_profile))
                 
                 # Get current market prices set by admin
                 from django.db.models import Max
-                market_prices = WasteProduct.objects.values('crop_name').annotate(
-                    latest_price=Max('admin_price_per_ton')
-                ).filter(latest_price__gt=0)
+                market_prices = [
+                    row for row in shards.grouped(
+                        WasteProduct.objects.annotate(crop_label=crop_label()), 'crop_name', 'crop_label',
+                        ordering=('crop_name',), latest_price=Max('admin_price_per_ton')
+                    ) if (row['latest_price'] or 0) > 0
+                ]
                 
+                stats = read_counters('farmer', farmer_profile.id)
                 return render(request, 'core/farmer_dashboard.html', {
                     'waste_products': waste_products,
                     'orders': orders,
                     'bargains': bargains,
                     'market_prices': market_prices,
-                    'crop_choices': WasteProduct.CROP_CHOICES
+                    'stats': stats,
+                    'available_listings': stats['listings:available'],
+                    'open_orders': sum_stats(stats, [f'orders:{status}' for status in OPEN_ORDER_STATUSES])
                 })
             except FarmerProfile.DoesNotExist:
                 messages.error(request, 'Farmer profile not found. Please contact admin.')
@@ -150,17 +213,22 @@ def dashboard(request):
             try:
                 from django.db.models import Sum, Avg, Count
                 company_profile = profile.companyprofile
-                orders = Order.objects.filter(company=company_profile)
+                orders = order_history(company=company_profile)
                 
                 # Get aggregated waste data for company dashboard
-                aggregated_waste = WasteProduct.objects.filter(status='available').exclude(crop_name='corn').values('crop_name').annotate(
+                aggregated_waste = shards.grouped(
+                    WasteProduct.objects.filter(status='available').exclude(crop_name='corn'), 'crop_name',
+                    ordering=('crop_name',),
                     total_quantity=Sum('quantity'),
                     avg_price=Avg('admin_price_per_ton')
-                ).order_by('crop_name')
+                )
                 
+                stats = read_counters('company', company_profile.id)
                 return render(request, 'core/company_dashboard.html', {
                     'orders': orders,
-                    'aggregated_waste': aggregated_waste
+                    'aggregated_waste': aggregated_waste,
+                    'stats': stats,
+                    'open_orders': sum_stats(stats, [f'orders:{status}' for status in OPEN_ORDER_STATUSES])
                 })
             except CompanyProfile.DoesNotExist:
                 messages.error(request, 'Company profile not found. Please contact admin.')
@@ -177,16 +245,19 @@ def admin_dashboard(request):
     if not request.user.is_superuser:
         raise PermissionDenied('Admin access required.')
     
+    counters = read_counters()
     stats = {
-        'total_users': User.objects.count(),
-        'total_farmers': FarmerProfile.objects.count(),
-        'total_companies': CompanyProfile.objects.count(),
-        'total_orders': Order.objects.count(),
+        'total_users': counters['users'].count,
+        'total_farmers': counters['farmers'].count,
+        'total_companies': counters['companies'].count,
+        'total_orders': counters['orders'].count,
     }
     
-    recent_orders = Order.objects.select_related('company__user_profile__user').order_by('-created_at')[:5]
-    recent_waste = WasteProduct.objects.select_related('farmer__user_profile__user').order_by('-created_at')[:5]
-    pending_bargains = PriceBargain.objects.filter(status='pending').select_related('waste_product__farmer__user_profile__user')[:5]
+    recent_orders = shards.gather(Order.objects.select_related('company__user_profile__user').order_by('-created_at'), limit=5)
+    recent_waste = shards.gather(WasteProduct.objects.select_related('farmer__user_profile__user').order_by('-created_at'), limit=5)
+    pending_bargains = shards.gather(
+        PriceBargain.objects.filter(status='pending').select_related('waste_product__farmer__user_profile__user'), limit=5
+    )
     
     return render(request, 'core/admin_dashboard.html', {
         'stats': stats,
@@ -195,49 +266,123 @@ def admin_dashboard(request):
         'pending_bargains': pending_bargains,
     })
 
-class WasteProductListView(LoginRequiredMixin, ListView):
+WASTE_PAGE_SIZE = 24
+
+def available_listing_page(crop_type, cursor=None, limit=WASTE_PAGE_SIZE):
+    """
+    One keyset page of available listings for a crop, newest first.
+    Returns (listings, next_cursor); next_cursor is None on the last page.
+    """
+    queryset = WasteProduct.objects.with_values().filter(status='available', crop_name=crop_type).order_by('-id')
+    if cursor:
+        queryset = queryset.filter(id__lt=decode_cursor(cursor))
+    rows = shards.gather(queryset, limit=limit + 1)
+    next_cursor = encode_cursor(rows[limit - 1].id) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+def aggregated_listings():
+    """Available tons, average admin price and value per crop type."""
+    from django.db.models import Sum, Avg
+    
+    queryset = WasteProduct.objects.filter(status='available').exclude(crop_name='corn')
+    rows = shards.grouped(
+        queryset, 'crop_name', ordering=('crop_name',),
+        total_quantity=Sum('quantity'),
+        avg_price=Avg('admin_price_per_ton')
+    )
+    for row in rows:
+        row['total_value'] = row['total_quantity'] * row['avg_price'] if row['avg_price'] is not None else None
+    return rows
+
+class WasteProductListView(LoginRequiredMixin, ReplicaReadMixin, ListView):
     model = WasteProduct
     template_name = 'core/waste_list.html'
     context_object_name = 'waste_products'
+    next_cursor = None
     
-    def get_queryset(self):
-        from django.db.models import Sum, Avg, Count
-        
-        crop_type = self.request.GET.get('crop_type')
-        
-        if crop_type == 'corn':
+    def get(self, request, *args, **kwargs):
+        if request.GET.get('crop_type') == 'corn':
             # Redirect corn requests to main page
-            from django.shortcuts import redirect
             return redirect('waste_list')
+        return super().get(request, *args, **kwargs)
+    
+    def get_queryset(self):
+        crop_type = self.request.GET.get('crop_type')
         
         if crop_type:
-            # Show individual products for specific crop type
-            queryset = WasteProduct.objects.filter(status='available', crop_name=crop_type).exclude(crop_name='corn')
-            return queryset
+            # Show individual products for specific crop type, one page at a time
+            try:
+                rows, self.next_cursor = available_listing_page(crop_type, self.request.GET.get('cursor'))
+            except (ValueError, TypeError):
+                rows, self.next_cursor = available_listing_page(crop_type)
+            return rows
         else:
             # Show aggregated data by crop type
-            queryset = WasteProduct.objects.filter(status='available').exclude(crop_name='corn')
-            
-            # Aggregate by crop type
-            aggregated_data = queryset.values('crop_name').annotate(
-                total_quantity=Sum('quantity'),
-                avg_price=Avg('admin_price_per_ton'),
-                total_value=Sum('quantity') * Avg('admin_price_per_ton')
-            ).order_by('crop_name')
-            
-            return aggregated_data
+            return aggregated_listings()
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         crop_type = self.request.GET.get('crop_type')
         context['is_aggregated'] = not crop_type
         context['selected_crop'] = crop_type
+        if self.next_cursor:
+            query = urlencode({'crop_type': crop_type, 'cursor': self.next_cursor})
+            context['next_page_url'] = f"{reverse('waste_list')}?{query}"
+            context['next_fragment_url'] = f"{reverse('waste_list_page')}?{query}"
         return context
 
+_waste_list_view = sync_to_async(WasteProductListView.as_view())
+
+@alogin_required
+@read_from_replica
+@arequire_http_methods(["GET"])
+async def waste_list(request):
+    """
+    Listing summary. The aggregated page is the most visited read, so it is
+    async; single-crop pages are served by WasteProductListView.
+    """
+    if request.GET.get('crop_type'):
+        return await _waste_list_view(request)
+    waste_products = await sync_to_async(aggregated_listings)()
+    # The base template reads the user's profile, so render off the event loop
+    return await sync_to_async(render)(request, 'core/waste_list.html', {
+        'waste_products': waste_products,
+        'is_aggregated': True,
+        'selected_crop': None,
+    })
+
+@login_required
+@read_from_replica
+@require_http_methods(["GET"])
+def waste_list_page(request):
+    """Next page of listing cards as an HTML fragment, for infinite scroll on waste_list."""
+    crop_type = request.GET.get('crop_type')
+    if not crop_type:
+        return JsonResponse({'success': False, 'error': 'crop_type required'}, status=400)
+    try:
+        rows, next_cursor = available_listing_page(crop_type, request.GET.get('cursor'))
+    except (ValueError, TypeError):
+        return JsonResponse({'success': False, 'error': 'Invalid cursor'}, status=400)
+    
+    html = render_to_string('core/waste_cards.html', {'waste_products': rows}, request=request)
+    next_url = next_page = None
+    if next_cursor:
+        query = urlencode({'crop_type': crop_type, 'cursor': next_cursor})
+        next_url = f"{reverse('waste_list_page')}?{query}"
+        next_page = f"{reverse('waste_list')}?{query}"
+    return JsonResponse({'success': True, 'html': html, 'count': len(rows), 'next': next_url, 'next_page': next_page})
+
 class WasteProductDetailView(LoginRequiredMixin, DetailView):
     model = WasteProduct
     template_name = 'core/waste_detail.html'
 
+    def get_object(self, queryset=None):
+        try:
+            return shards.get_object_or_404(WasteProduct.objects.with_values(), pk=self.kwargs['pk'])
+        except Http404:
+            # Sold listings move to the archive (core.archive) but keep their page
+            return shards.get_object_or_404(ArchivedWasteProduct, pk=self.kwargs['pk'])
+
 class WasteProductCreateView(LoginRequiredMixin, CreateView):
     model = WasteProduct
     form_class = WasteProductForm
@@ -251,9 +396,14 @@ class WasteProductCreateView(LoginRequiredMixin, CreateView):
     
     def form_valid(self, form):
         form.instance.farmer = self.request.user.userprofile.farmerprofile
-        # Admin will set the price later
-        form.instance.admin_price_per_ton = 0.01  # Default minimal price
-        return super().form_valid(form)
+        # Admin will set the price later, starting from the suggestion
+        form.instance.admin_price_per_ton = pricing.UNPRICED
+        form.instance.suggested_price_per_ton = pricing.suggested_price(form.instance)
+        with shards.atomic(shards.for_farmer(form.instance.farmer)):
+            response = super().form_valid(form)
+            if self.object.photo:
+                enqueue(shrink_image, name=self.object.photo.name)
+        return response
 
 @login_required
 @csrf_protect
@@ -268,21 +418,28 @@ def place_order(request, waste_id):
         messages.error(request, 'Invalid waste product ID.')
         return redirect('dashboard')
     
-    waste_product = get_object_or_404(WasteProduct, id=waste_id, status='available')
+    waste_product = shards.get_object_or_404(WasteProduct, id=waste_id, status='available')
     
     if request.method == 'POST':
         form = OrderForm(request.POST)
         if form.is_valid():
             quantity = form.cleaned_data['quantity_ordered']
             if quantity <= waste_product.quantity:
-                order = form.save(commit=False)
-                order.company = request.user.userprofile.companyprofile
-                order.waste_product = waste_product
-                order.total_price = quantity * form.cleaned_data['company_price_per_ton']
-                order.save()
-                
-                waste_product.status = 'reserved'
-                waste_product.save()
+                # Reserve the listing as the company saw it on the form
+                expect_version(waste_product, request.POST.get('version'))
+                try:
+                    with shards.atomic(waste_product._state.db):
+                        order = form.save(commit=False)
+                        order.company = request.user.userprofile.companyprofile
+                        order.waste_product = waste_product
+                        order.total_price = quantity * form.cleaned_data['company_price_per_ton']
+                        order.save()
+                        
+                        waste_product.status = 'reserved'
+                        waste_product.save(update_fields=['status'])
+                except VersionConflict:
+                    messages.error(request, CONFLICT_MESSAGE % 'listing')
+                    return redirect('place_order', waste_id=waste_product.id)
                 
                 messages.success(request, 'Order placed successfully!')
                 return redirect('dashboard')
@@ -305,7 +462,7 @@ def update_order_status(request, order_id, status):
         messages.error(request, 'Invalid order ID.')
         return redirect('dashboard')
     
-    order = get_object_or_404(Order, id=order_id)
+    order = shards.get_object_or_404(Order, id=order_id)
     
     if not hasattr(request.user, 'userprofile') or request.user.userprofile.role != 'farmer':
         raise PermissionDenied('Only farmers can update order status.')
@@ -313,22 +470,37 @@ def update_order_status(request, order_id, status):
     if order.waste_product.farmer.user_profile.user != request.user:
         raise PermissionDenied('You can only update orders for your own products.')
     
-    if order.status != 'sent_to_farmer':
-        messages.error(request, 'This order is not available for response.')
+    transitions = {
+        'accepted': ('accepted_by_farmer', 'reserved', 'Order accepted! Waiting for final admin approval.'),
+        'rejected': ('rejected_by_farmer', 'available', 'Order rejected!'),
+    }
+    if status not in transitions:
         return redirect('dashboard')
+    order_status, listing_status, success = transitions[status]
+    
+    def respond():
+        # Re-read on every attempt so a conflicting admin change is seen
+        current = Order.objects.using(order._state.db).select_related(
+            'waste_product', 'company__user_profile__user'
+        ).get(pk=order.pk)
+        if current.status != 'sent_to_farmer':
+            return False
+        with shards.atomic(order._state.db):
+            current.status = order_status
+            current.waste_product.status = listing_status
+            current.save(update_fields=['status'])
+            current.waste_product.save(update_fields=['status'])
+            notify_order_status(current, [current.company.user_profile.user, *admin_users()])
+        return True
     
-    if status == 'accepted':
-        order.status = 'accepted_by_farmer'
-        order.waste_product.status = 'reserved'
-        order.save()
-        order.waste_product.save()
-        messages.success(request, 'Order accepted! Waiting for final admin approval.')
-    elif status == 'rejected':
-        order.status = 'rejected_by_farmer'
-        order.waste_product.status = 'available'
-        order.save()
-        order.waste_product.save()
-        messages.success(request, 'Order rejected!')
+    try:
+        responded = retry_on_conflict(respond)
+    except VersionConflict:
+        responded = False
+    if responded:
+        messages.success(request, success)
+    else:
+        messages.error(request, 'This order is not available for response.')
     
     return redirect('dashboard')
 
@@ -364,6 +536,7 @@ def edit_profile(request):
         user_profile = request.user.userprofile
         
         if request.method == 'POST':
+            old_photo = user_profile.profile_photo.name
             form = ProfileUpdateForm(request.POST, request.FILES, instance=user_profile, user=request.user)
             if form.is_valid():
                 with transaction.atomic():
@@ -376,11 +549,18 @@ def edit_profile(request):
                     
                     # Update UserProfile
                     form.save()
+                    if 'profile_photo' in form.changed_data:
+                        # Resizing and removing the replaced file happen off the request thread
+                        if user_profile.profile_photo:
+                            enqueue(shrink_image, name=user_profile.profile_photo.name)
+                        if old_photo and old_photo != user_profile.profile_photo.name:
+                            enqueue(delete_file, name=old_photo)
                     
                     # Update role-specific profile
                     if user_profile.role == 'farmer' and hasattr(user_profile, 'farmerprofile'):
                         farmer_profile = user_profile.farmerprofile
                         farmer_profile.farm_size = form.cleaned_data['farm_size']
+                        farmer_profile.region = form.cleaned_data['region']
                         farmer_profile.save()
                     elif user_profile.role == 'company' and hasattr(user_profile, 'companyprofile'):
                         company_profile = user_profile.companyprofile
@@ -398,6 +578,7 @@ def edit_profile(request):
             
             if user_profile.role == 'farmer' and hasattr(user_profile, 'farmerprofile'):
                 initial_data['farm_size'] = user_profile.farmerprofile.farm_size
+                initial_data['region'] = user_profile.farmerprofile.region
             elif user_profile.role == 'company' and hasattr(user_profile, 'companyprofile'):
                 initial_data['company_name'] = user_profile.companyprofile.company_name
                 
@@ -409,11 +590,14 @@ def edit_profile(request):
         return redirect('dashboard')
 
 @login_required
+@read_from_replica
 def admin_view_prices(request):
     if not request.user.is_superuser:
         raise PermissionDenied('Admin access required.')
     
-    waste_products = WasteProduct.objects.select_related('farmer__user_profile__user').order_by('-created_at')
+    waste_products = WasteProduct.objects.with_values().select_related(
+        'farmer__user_profile__user'
+    ).order_by('-created_at')
     
     # Filter by crop type if specified
     crop_filter = request.GET.get('crop')
@@ -426,10 +610,11 @@ def admin_view_prices(request):
         waste_products = waste_products.filter(status=status_filter)
     
     # Calculate summary statistics
-    total_products = waste_products.count()
-    available_products = waste_products.filter(status='available').count()
-    total_quantity = sum(float(w.quantity) for w in waste_products)
-    total_value = sum(float(w.total_value) for w in waste_products)
+    waste_products = shards.gather(waste_products)
+    total_products = len(waste_products)
+    available_products = sum(1 for w in waste_products if w.status == 'available')
+    total_quantity = sum((w.quantity for w in waste_products), Decimal('0'))
+    total_value = sum((w.line_total for w in waste_products), Decimal('0'))
     
     context = {
         'waste_products': waste_products,
@@ -450,7 +635,7 @@ def create_bargain(request, waste_id):
     if not hasattr(request.user, 'userprofile') or request.user.userprofile.role != 'farmer':
         raise PermissionDenied('Only farmers can create bargains.')
     
-    waste_product = get_object_or_404(WasteProduct, id=waste_id, farmer__user_profile__user=request.user)
+    waste_product = shards.get_object_or_404(WasteProduct, id=waste_id, farmer__user_profile__user=request.user)
     
     if request.method == 'POST':
         proposed_price = request.POST.get('proposed_price')
@@ -472,7 +657,9 @@ def admin_bargains(request):
     if not request.user.is_superuser:
         raise PermissionDenied('Admin access required.')
     
-    bargains = PriceBargain.objects.select_related('waste_product__farmer__user_profile__user').order_by('-created_at')
+    bargains = shards.gather(
+        PriceBargain.objects.select_related('waste_product__farmer__user_profile__user').order_by('-created_at')
+    )
     return render(request, 'core/admin_bargains.html', {'bargains': bargains})
 
 @login_required
@@ -480,12 +667,8 @@ def admin_orders(request):
     if not request.user.is_superuser:
         raise PermissionDenied('Admin access required.')
     
-    orders = Order.objects.select_related('company__user_profile__user', 'waste_product__farmer__user_profile__user').order_by('-created_at')
-    
     # Filter by status if specified
-    status_filter = request.GET.get('status')
-    if status_filter:
-        orders = orders.filter(status=status_filter)
+    orders = order_history(status=request.GET.get('status'))
     
     return render(request, 'core/admin_orders.html', {'orders': orders})
 
@@ -494,62 +677,92 @@ def admin_approve_order(request, order_id):
     if not request.user.is_superuser:
         raise PermissionDenied('Admin access required.')
     
-    order = get_object_or_404(Order, id=order_id)
+    order = shards.get_object_or_404(Order, id=order_id)
     
     if request.method == 'POST':
         action = request.POST.get('action')
         admin_notes = request.POST.get('admin_notes', '')
         
-        if action == 'send_to_farmer' and order.status == 'pending_admin':
-            order.status = 'sent_to_farmer'
-            order.admin_notes = admin_notes
-            order.save()
-            messages.success(request, 'Order sent to farmer for review!')
-        elif action == 'final_approve' and order.status == 'accepted_by_farmer':
-            order.status = 'approved_by_admin'
-            order.admin_notes = admin_notes
-            order.save()
-            messages.success(request, 'Order finally approved for company!')
-        elif action == 'reject':
-            order.status = 'rejected_by_farmer'
-            order.admin_notes = admin_notes
-            order.save()
-            messages.success(request, 'Order rejected!')
+        farmer_user = order.waste_product.farmer.user_profile.user
+        company_user = order.company.user_profile.user
+        
+        decisions = {
+            'send_to_farmer': ('sent_to_farmer', 'Order sent to farmer for review!'),
+            'final_approve': ('approved_by_admin', 'Order finally approved for company!'),
+            'reject': ('rejected_by_farmer', 'Order rejected!'),
+        }
+        allowed = (
+            (action == 'send_to_farmer' and order.status == 'pending_admin')
+            or (action == 'final_approve' and order.status == 'accepted_by_farmer')
+            or action == 'reject'
+        )
+        if allowed:
+            new_status, success = decisions[action]
+            # Decide on the order as the admin saw it
+            expect_version(order, request.POST.get('version'))
+            try:
+                with shards.atomic(order._state.db):
+                    order.status = new_status
+                    order.admin_notes = admin_notes
+                    order.save(update_fields=['status', 'admin_notes'])
+                    notify_order_status(order, [farmer_user, company_user])
+            except VersionConflict:
+                messages.error(request, CONFLICT_MESSAGE % 'order')
+                return redirect('admin_approve_order', order_id=order.id)
+            messages.success(request, success)
         
         return redirect('admin_orders')
     
     return render(request, 'core/admin_approve_order.html', {'order': order})
 
+def set_listing_price(waste_id, price, using=None):
+    """Set a listing's admin price, writing only that column. Raises VersionConflict if it changes meanwhile."""
+    waste_product = WasteProduct.objects.using(using).get(pk=waste_id)
+    waste_product.admin_price_per_ton = price
+    waste_product.save(update_fields=['admin_price_per_ton'])
+
 @login_required
 def respond_bargain(request, bargain_id):
     if not request.user.is_superuser:
         raise PermissionDenied('Admin access required.')
     
-    bargain = get_object_or_404(PriceBargain, id=bargain_id)
+    bargain = shards.get_object_or_404(PriceBargain, id=bargain_id)
     
     if request.method == 'POST':
         action = request.POST.get('action')
         admin_message = request.POST.get('admin_message', '')
+        # Respond to the bargain as the admin saw it
+        expect_version(bargain, request.POST.get('version'))
         
-        if action == 'accept':
-            bargain.status = 'accepted'
-            bargain.admin_message = admin_message
-            bargain.waste_product.admin_price_per_ton = bargain.farmer_proposed_price
-            bargain.waste_product.save()
-            bargain.save()
-            messages.success(request, 'Bargain accepted and price updated!')
-        elif action == 'reject':
-            bargain.status = 'rejected'
-            bargain.admin_message = admin_message
-            bargain.save()
-            messages.success(request, 'Bargain rejected!')
-        elif action == 'counter':
-            counter_price = request.POST.get('counter_price')
-            if counter_price:
-                bargain.admin_counter_price = counter_price
-                bargain.admin_message = admin_message
-                bargain.save()
-                messages.success(request, 'Counter offer sent!')
+        try:
+            if action == 'accept':
+                # No retry: a conflict on the listing rolls the bargain back too, and the admin decides again
+                with shards.atomic(bargain._state.db):
+                    bargain.status = 'accepted'
+                    bargain.admin_message = admin_message
+                    bargain.save(update_fields=['status', 'admin_message'])
+                    set_listing_price(bargain.waste_product_id, bargain.farmer_proposed_price, bargain._state.db)
+                    notify_bargain_response(bargain, f'accepted at ₹{bargain.farmer_proposed_price}/ton')
+                messages.success(request, 'Bargain accepted and price updated!')
+            elif action == 'reject':
+                with shards.atomic(bargain._state.db):
+                    bargain.status = 'rejected'
+                    bargain.admin_message = admin_message
+                    bargain.save(update_fields=['status', 'admin_message'])
+                    notify_bargain_response(bargain, 'rejected')
+                messages.success(request, 'Bargain rejected!')
+            elif action == 'counter':
+                counter_price = request.POST.get('counter_price')
+                if counter_price:
+                    with shards.atomic(bargain._state.db):
+                        bargain.admin_counter_price = counter_price
+                        bargain.admin_message = admin_message
+                        bargain.save(update_fields=['admin_counter_price', 'admin_message'])
+                        notify_bargain_response(bargain, f'countered at ₹{counter_price}/ton')
+                    messages.success(request, 'Counter offer sent!')
+        except VersionConflict as e:
+            messages.error(request, CONFLICT_MESSAGE % ('listing' if isinstance(e.instance, WasteProduct) else 'bargain'))
+            return redirect('respond_bargain', bargain_id=bargain.id)
         
         return redirect('admin_bargains')
     
@@ -562,7 +775,7 @@ def admin_complete_order(request, order_id):
         raise PermissionDenied('Admin access required.')
     
     try:
-        order = get_object_or_404(Order, id=order_id)
+        order = shards.get_object_or_404(Order, id=order_id)
         if order.status == 'accepted':
             order.status = 'completed'
             order.save()
@@ -573,26 +786,26 @@ def admin_complete_order(request, order_id):
         return JsonResponse({'success': False, 'message': str(e)})
 
 @login_required
+@read_from_replica
 def order_summary(request):
     if not request.user.is_superuser:
         raise PermissionDenied('Admin access required.')
     
-    # Get order counts by status
-    pending_count = Order.objects.filter(status='pending_admin').count()
-    sent_to_farmer_count = Order.objects.filter(status='sent_to_farmer').count()
-    accepted_by_farmer_count = Order.objects.filter(status='accepted_by_farmer').count()
-    completed_count = Order.objects.filter(status='completed').count()
+    # Order counts and values by status come from the dashboard counters
+    stats = read_counters()
+    pending_count = stats['orders:pending_admin'].count
+    sent_to_farmer_count = stats['orders:sent_to_farmer'].count
+    accepted_by_farmer_count = stats['orders:accepted_by_farmer'].count
+    completed_count = stats['orders:completed'].count
     
     # Get pending orders for quick action
-    pending_orders = Order.objects.filter(status__in=['pending_admin', 'accepted_by_farmer']).select_related(
+    pending_orders = shards.gather(Order.objects.filter(status__in=['pending_admin', 'accepted_by_farmer']).select_related(
         'company__user_profile__user', 'waste_product'
-    ).order_by('-created_at')[:5]
+    ).order_by('-created_at'), limit=5)
     
-    # Calculate order values
-    from django.db.models import Sum
-    total_value = Order.objects.aggregate(Sum('total_price'))['total_price__sum'] or 0
-    completed_value = Order.objects.filter(status='completed').aggregate(Sum('total_price'))['total_price__sum'] or 0
-    pending_value = Order.objects.filter(status__in=['pending_admin', 'sent_to_farmer', 'accepted_by_farmer']).aggregate(Sum('total_price'))['total_price__sum'] or 0
+    total_value = stats['orders'].amount
+    completed_value = stats['orders:completed'].amount
+    pending_value = sum_stats(stats, [f'orders:{status}' for status in OPEN_ORDER_STATUSES]).amount
     
     context = {
         'pending_count': pending_count,
@@ -605,4 +818,108 @@ def order_summary(request):
         'pending_value': pending_value,
     }
     
-    return render(request, 'core/order_summary.html', context)
\ No newline at end of file
+    return render(request, 'core/order_summary.html', context)
+
+ANALYTICS_PERIODS = {'4': 4, '13': 13, '26': 26, '52': 52, '104': 104, '156': 156}
+
+
+@login_required
+@read_from_replica
+def admin_analytics(request):
+    if not request.user.is_superuser:
+        raise PermissionDenied('Admin access required.')
+    
+    # Every figure on this page comes from the daily fact tables (core.analytics)
+    weeks = ANALYTICS_PERIODS.get(request.GET.get('weeks'), 26)
+    since = timezone.localdate() - timedelta(weeks=weeks)
+    week_starts, tonnage_by_crop, weekly_totals = analytics.weekly_tonnage(since)
+    crops = dict(WasteProduct.CROP_CHOICES)
+    peak = max(weekly_totals, default=0) or 1
+    weekly_rows = [
+        {
+            'week': week,
+            'total': total,
+            'percent': round(total * 100 / peak),
+            'crops': [tonnage_by_crop.get(crop, [0] * len(week_starts))[i] for crop in crops],
+        }
+        for i, (week, total) in enumerate(zip(week_starts, weekly_totals))
+    ]
+    
+    return render(request, 'core/admin_analytics.html', {
+        'weeks': weeks,
+        'periods': ANALYTICS_PERIODS.values(),
+        'since': since,
+        'crop_labels': crops.values(),
+        'weekly_rows': reversed(weekly_rows),
+        'funnel': analytics.order_funnel(since),
+        'bargains': analytics.bargain_discounts(since),
+        'listings': analytics.listing_totals(since),
+        'last_loaded': analytics.last_loaded(),
+    })
+
+@login_required
+@require_http_methods(["POST"])
+def admin_analytics_refresh(request):
+    if not request.user.is_superuser:
+        raise PermissionDenied('Admin access required.')
+    
+    enqueue(refresh_analytics, idempotency_key=f"refresh_analytics_{int(time.time()) // 60}")
+    messages.success(request, 'Analytics refresh queued. Figures update once a worker has run it.')
+    return redirect('admin_analytics')
+
+@login_required
+def notifications(request):
+    feed = request.user.notifications.all()[:50]
+    
+    if request.method == 'POST':
+        request.user.notifications.filter(is_read=False).update(is_read=True)
+        return redirect('notifications')
+    
+    return render(request, 'core/notifications.html', {'notifications': feed})
+
+@login_required
+@require_http_methods(["GET"])
+def unread_notifications_api(request):
+    return JsonResponse({
+        'success': True,
+        'unread_count': unread_count(request.user)
+    })
+
+
+@login_required
+@require_http_methods(["GET"])
+def admin_export(request, dataset):
+    if not request.user.is_superuser:
+        raise PermissionDenied('Admin access required.')
+    if dataset not in EXPORT_FIELDS:
+        raise Http404('Unknown dataset.')
+    
+    fmt = 'jsonl' if request.GET.get('format') == 'jsonl' else 'csv'
+    content_type = 'application/x-ndjson' if fmt == 'jsonl' else 'text/csv'
+    response = StreamingHttpResponse(stream_export(dataset, fmt), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{dataset}.{fmt}"'
+    return response
+
+@login_required
+@require_http_methods(["POST"])
+def admin_import(request, dataset):
+    if not request.user.is_superuser:
+        raise PermissionDenied('Admin access required.')
+    if dataset not in EXPORT_FIELDS:
+        raise Http404('Unknown dataset.')
+    
+    upload = request.FILES.get('file')
+    if not upload:
+        return JsonResponse({'success': False, 'error': 'File required'}, status=400)
+    
+    fmt = 'jsonl' if request.POST.get('format') == 'jsonl' or upload.name.endswith('.jsonl') else 'csv'
+    source = io.TextIOWrapper(upload.file, encoding='utf-8', newline='')
+    importer = BulkImporter(dataset).run(read_rows(source, fmt))
+    logger.info("Admin %s imported %s %s rows with %s errors", request.user.username, importer.imported, dataset, len(importer.errors))
+    
+    return JsonResponse({
+        'success': not importer.errors,
+        'imported': importer.imported,
+        'errors': [{'line': line, 'error': message} for line, message in importer.errors[:1000]],
+        'total_errors': len(importer.errors)
+    })
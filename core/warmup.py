@@ -0,0 +1,93 @@
+"""
+Process warm-up, run by the gunicorn hooks in agroconnect/gunicorn.conf.py.
+
+With ``preload_app`` it runs once in the master after the app is loaded, so
+every worker is forked with the URL resolver built and the view modules
+imported. Workers also inherit the parsed page templates in the cached
+loader, the pre-rendered form fields (core.forms) and the pricing model
+(core.pricing). That includes workers started later to replace recycled
+ones. Without preloading, each worker warms itself before taking requests.
+"""
+import logging
+import time
+from pathlib import Path
+from django.db import DatabaseError, connections
+from django.template import TemplateSyntaxError, engines
+from django.urls import get_resolver
+
+logger = logging.getLogger(__name__)
+
+
+def warm_urls():
+    """Import every view module and build the reverse() lookup tables."""
+    resolver = get_resolver()
+    return len(resolver.reverse_dict)
+
+
+def warm_templates():
+    """Parse every template in the project template directories into the cached loader."""
+    loaded = 0
+    for engine in engines.all():
+        for directory in getattr(engine, 'engine', engine).dirs:
+            for path in sorted(Path(directory).rglob('*.html')):
+                name = path.relative_to(directory).as_posix()
+                try:
+                    engine.get_template(name)
+                except TemplateSyntaxError:
+                    logger.exception("Template %s failed to compile during warm-up", name)
+                    continue
+                loaded += 1
+    return loaded
+
+
+def warm_forms():
+    """Render the unbound forms once so their static fields are pre-rendered."""
+    from .forms import UserRegistrationForm, WasteProductForm, OrderForm
+    forms = [UserRegistrationForm(user_type='farmer'), UserRegistrationForm(user_type='company'),
+             WasteProductForm(), OrderForm()]
+    for form in forms:
+        for name in form.prerendered_fields:
+            str(form[name])
+    return len(forms)
+
+
+def warm_pricing():
+    """Load the price suggestion model into the cache and this process."""
+    from . import pricing
+    return pricing.get_model().samples
+
+
+WARMERS = [
+    ('urls', warm_urls),
+    ('templates', warm_templates),
+    ('forms', warm_forms),
+    ('pricing', warm_pricing),
+]
+
+
+def warm_caches():
+    """
+    Run every warmer and return {name: (result, milliseconds)}. A warmer that
+    needs an unavailable database is skipped. Connections opened here are
+    closed again so forked workers never share a socket.
+    """
+    results = {}
+    try:
+        for name, warm in WARMERS:
+            started = time.perf_counter()
+            try:
+                result = warm()
+            except DatabaseError as error:
+                logger.warning("Skipped %s warm-up: %s", name, error)
+                continue
+            results[name] = (result, (time.perf_counter() - started) * 1000)
+    finally:
+        connections.close_all()
+        # Forked workers start their own shard read threads
+        from . import shards
+        shards.shutdown()
+    logger.info(
+        "Warmed caches: %s",
+        ', '.join(f'{name} {result} in {ms:.0f} ms' for name, (result, ms) in results.items())
+    )
+    return results
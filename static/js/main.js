@@ -7,6 +7,7 @@ document.addEventListener('DOMContentLoaded', function () {
     initPriceCalculator();
     initFormEnhancements();
     initWasteProductFilters();
+    initInfiniteScroll();
 });
 
 // ================= INITIALIZATION =================
@@ -46,18 +47,87 @@ function initWasteProductFilters() {
     }
 
     // Card animation
-    const productCards = document.querySelectorAll('.card');
-    productCards.forEach((card, index) => {
+    const grid = document.getElementById('waste-grid');
+    if (grid) {
+        animateCards(grid.querySelectorAll('.card'));
+    }
+}
+
+function animateCards(cards) {
+    // Stagger at most the first few cards so long pages don't queue hundreds of timers
+    Array.from(cards).forEach((card, index) => {
         card.style.opacity = '0';
         card.style.transform = 'translateY(20px)';
         setTimeout(() => {
             card.style.transition = 'opacity 0.3s ease, transform 0.3s ease';
             card.style.opacity = '1';
             card.style.transform = 'translateY(0)';
-        }, index * 100);
+        }, Math.min(index, 8) * 60);
     });
 }
 
+// ================= INFINITE SCROLL =================
+
+function initInfiniteScroll() {
+    // waste_list renders one page of cards; later pages come from waste_list_page as HTML fragments.
+    // Without IntersectionObserver/fetch the "Load more" link still works as plain pagination.
+    const grid = document.getElementById('waste-grid');
+    const more = document.getElementById('waste-grid-more');
+    if (!grid || !more || !('IntersectionObserver' in window) || !window.fetch) return;
+
+    const link = more.querySelector('a');
+    let nextUrl = more.dataset.next;
+    let loading = false;
+
+    const observer = new IntersectionObserver(entries => {
+        if (entries.some(entry => entry.isIntersecting)) loadNext();
+    }, { rootMargin: '600px 0px' });
+
+    function loadNext() {
+        if (loading || !nextUrl) return;
+        loading = true;
+        fetch(nextUrl, { headers: { 'Accept': 'application/json' }, credentials: 'same-origin' })
+            .then(response => {
+                if (!response.ok) throw new Error(`HTTP ${response.status}`);
+                return response.json();
+            })
+            .then(data => {
+                const template = document.createElement('template');
+                template.innerHTML = data.html;
+                const cards = template.content.querySelectorAll('.card');
+                grid.appendChild(template.content);
+                animateCards(cards);
+
+                nextUrl = data.next;
+                if (!nextUrl) {
+                    observer.disconnect();
+                    more.remove();
+                    return;
+                }
+                if (link && data.next_page) link.href = data.next_page;
+                // Re-observe so a sentinel that is still on screen triggers the next page
+                observer.unobserve(more);
+                observer.observe(more);
+            })
+            .catch(error => {
+                // Leave the "Load more" link in place as a fallback
+                console.warn('Could not load more listings:', error);
+                observer.disconnect();
+            })
+            .finally(() => {
+                loading = false;
+            });
+    }
+
+    if (link) {
+        link.addEventListener('click', function (e) {
+            e.preventDefault();
+            loadNext();
+        });
+    }
+    observer.observe(more);
+}
+
 // ================= VALIDATION =================
 
 function validateForm(form) {
@@ -1,19 +1,152 @@
 /**
  * Session Management for Concurrent Login Support
  * Handles multiple active sessions for AgroConnect users
+ *
+ * However many tabs are open, only one visible tab polls /api/sessions/ and
+ * shares the result with the others.
  */
 
+/**
+ * Picks one tab per browser to do the polling. Tabs compete for a Web Lock
+ * (navigator.locks) where available, otherwise for a lease in localStorage
+ * that the leader renews. Only visible tabs compete, so hidden tabs never
+ * poll; when the leader is hidden or closed another visible tab takes over.
+ */
+class TabLeader {
+    constructor(name, onChange) {
+        this.name = name;
+        this.onChange = onChange;
+        this.id = `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+        this.isLeader = false;
+        this.started = false;
+        this.leaseMs = 15000;
+        this.abort = null;
+        this.release = null;
+        this.leaseTimer = null;
+    }
+
+    static storageAvailable() {
+        try {
+            localStorage.setItem('agroconnect:probe', '1');
+            localStorage.removeItem('agroconnect:probe');
+            return true;
+        } catch (error) {
+            return false;
+        }
+    }
+
+    start() {
+        if (this.started) return;
+        this.started = true;
+        if (navigator.locks) {
+            this.abort = new AbortController();
+            navigator.locks.request(this.name, { signal: this.abort.signal }, () => {
+                this.setLeader(true);
+                // Hold the lock until stop() or the tab goes away
+                return new Promise(resolve => { this.release = resolve; });
+            }).catch(() => {});
+        } else if (TabLeader.storageAvailable()) {
+            this.claimLease();
+            this.leaseTimer = setInterval(() => this.claimLease(), this.leaseMs / 3);
+        } else {
+            // Nothing to coordinate through: every tab polls for itself
+            this.setLeader(true);
+        }
+    }
+
+    stop() {
+        this.started = false;
+        if (this.abort) {
+            this.abort.abort();
+            this.abort = null;
+        }
+        if (this.release) {
+            this.release();
+            this.release = null;
+        }
+        if (this.leaseTimer) {
+            clearInterval(this.leaseTimer);
+            this.leaseTimer = null;
+            if (this.readLease().id === this.id) {
+                localStorage.removeItem(`${this.name}:leader`);
+            }
+        }
+        this.setLeader(false);
+    }
+
+    readLease() {
+        try {
+            return JSON.parse(localStorage.getItem(`${this.name}:leader`)) || {};
+        } catch (error) {
+            return {};
+        }
+    }
+
+    claimLease() {
+        const lease = this.readLease();
+        if (lease.id === this.id || !lease.expires || lease.expires < Date.now()) {
+            localStorage.setItem(`${this.name}:leader`, JSON.stringify({ id: this.id, expires: Date.now() + this.leaseMs }));
+        }
+        // Two tabs may write at once; the value read back decides, so at most one keeps polling
+        this.setLeader(this.readLease().id === this.id);
+    }
+
+    setLeader(isLeader) {
+        if (isLeader !== this.isLeader) {
+            this.isLeader = isLeader;
+            this.onChange(isLeader);
+        }
+    }
+}
+
+/**
+ * Messages between tabs of the same browser: BroadcastChannel, or storage
+ * events where that is missing.
+ */
+class TabChannel {
+    constructor(name, onMessage) {
+        this.key = `${name}:message`;
+        if (window.BroadcastChannel) {
+            this.channel = new BroadcastChannel(name);
+            this.channel.onmessage = event => onMessage(event.data);
+        } else if (TabLeader.storageAvailable()) {
+            window.addEventListener('storage', event => {
+                if (event.key === this.key && event.newValue) {
+                    onMessage(JSON.parse(event.newValue).message);
+                }
+            });
+        }
+    }
+
+    post(message) {
+        if (this.channel) {
+            this.channel.postMessage(message);
+        } else if (TabLeader.storageAvailable()) {
+            // The nonce makes repeated messages still change the value and fire the event
+            localStorage.setItem(this.key, JSON.stringify({ message, nonce: Math.random() }));
+        }
+    }
+}
+
 class SessionManager {
     constructor() {
         this.refreshInterval = 30000; // 30 seconds
-        this.intervalId = null;
+        this.maxBackoff = 300000; // 5 minutes
+        this.failures = 0;
+        this.timeoutId = null;
+        this.lastData = null;
         this.init();
     }
 
     init() {
         if (this.isUserLoggedIn()) {
-            this.startSessionMonitoring();
+            const name = `agroconnect-sessions-${document.body.dataset.userId || 'user'}`;
+            this.channel = new TabChannel(name, message => this.handleMessage(message));
+            this.leader = new TabLeader(name, isLeader => this.leadershipChanged(isLeader));
             this.bindEvents();
+            if (!document.hidden) {
+                this.startSessionMonitoring();
+            }
         }
     }
 
@@ -24,20 +157,54 @@ class SessionManager {
     }
 
     startSessionMonitoring() {
-        this.refreshSessions();
-        this.intervalId = setInterval(() => {
-            this.refreshSessions();
-        }, this.refreshInterval);
+        // Show what the leader last fetched right away instead of waiting for its next poll
+        this.channel.post({ type: 'request' });
+        this.leader.start();
     }
 
     stopSessionMonitoring() {
-        if (this.intervalId) {
-            clearInterval(this.intervalId);
-            this.intervalId = null;
+        this.leader.stop();
+    }
+
+    leadershipChanged(isLeader) {
+        if (isLeader) {
+            this.failures = 0;
+            this.refreshSessions();
+        } else {
+            this.cancelPoll();
         }
     }
 
+    handleMessage(message) {
+        if (message.type === 'sessions') {
+            this.lastData = message.data;
+            this.updateSessionDisplay(message.data);
+        } else if (message.type === 'request' && this.leader.isLeader && this.lastData) {
+            this.channel.post({ type: 'sessions', data: this.lastData });
+        } else if (message.type === 'refresh' && this.leader.isLeader) {
+            this.refreshSessions();
+        }
+    }
+
+    cancelPoll() {
+        if (this.timeoutId) {
+            clearTimeout(this.timeoutId);
+            this.timeoutId = null;
+        }
+    }
+
+    scheduleNextPoll(retryAfter) {
+        this.cancelPoll();
+        if (!this.leader.isLeader) return;
+        // Back off exponentially while requests fail; jitter keeps tabs of many users from polling in step
+        let delay = Math.min(this.refreshInterval * 2 ** this.failures, this.maxBackoff);
+        delay = Math.max(delay * (0.8 + Math.random() * 0.4), retryAfter || 0);
+        this.timeoutId = setTimeout(() => this.refreshSessions(), delay);
+    }
+
     async refreshSessions() {
+        this.cancelPoll();
+        let retryAfter = 0;
         try {
             const response = await fetch('/api/sessions/', {
                 method: 'GET',
@@ -50,11 +217,27 @@ class SessionManager {
 
             if (response.ok) {
                 const data = await response.json();
+                this.failures = 0;
+                this.lastData = data;
                 this.updateSessionDisplay(data);
+                this.channel.post({ type: 'sessions', data });
+            } else {
+                this.failures += 1;
+                retryAfter = (parseInt(response.headers.get('Retry-After'), 10) || 0) * 1000;
             }
         } catch (error) {
+            this.failures += 1;
             console.warn('Failed to refresh session data:', error);
         }
+        this.scheduleNextPoll(retryAfter);
+    }
+
+    requestRefresh() {
+        if (this.leader.isLeader) {
+            this.refreshSessions();
+        } else {
+            this.channel.post({ type: 'refresh' });
+        }
     }
 
     async terminateSession(sessionKey) {
@@ -73,7 +256,7 @@ class SessionManager {
             
             if (data.success) {
                 this.showMessage('Session terminated successfully', 'success');
-                this.refreshSessions();
+                this.requestRefresh();
             } else {
                 this.showMessage(data.error || 'Failed to terminate session', 'error');
             }
@@ -135,10 +318,15 @@ class SessionManager {
             }
         });
 
-        // Handle window beforeunload
-        window.addEventListener('beforeunload', () => {
+        // Hand leadership over before the tab goes away or into the back/forward cache
+        window.addEventListener('pagehide', () => {
             this.stopSessionMonitoring();
         });
+        window.addEventListener('pageshow', (event) => {
+            if (event.persisted && !document.hidden) {
+                this.startSessionMonitoring();
+            }
+        });
     }
 
     getCSRFToken() {